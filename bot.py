@@ -22,20 +22,49 @@ Telegram Bot для лідогенерації адвокатів (Розлуч
 ✅ Тексти в константах
 """
 
+import time
+_PROCESS_START = time.perf_counter()
+
 import os
 import logging
+import pickle
+import json
+import csv
+import sys
+import argparse
+import importlib
+import sqlite3
+import concurrent.futures
 import random
+import shutil
+import tempfile
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReactionTypeEmoji
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-import requests
-from flask import Flask
 import threading
+import signal
 import asyncio
-from telegram.constants import ChatAction
-import re
+
+# Час імпорту залежностей (звіт у режимі STARTUP_PROFILE=1)
+IMPORT_TIMINGS = {}
+
+@contextmanager
+def import_timer(name):
+    started = time.perf_counter()
+    yield
+    IMPORT_TIMINGS[name] = time.perf_counter() - started
+
+with import_timer('telegram'):
+    from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReactionTypeEmoji
+    from telegram.ext import Application, CallbackContext, CommandHandler, CallbackQueryHandler, MessageHandler, TypeHandler, filters, ContextTypes
+    from telegram.constants import ChatAction
+
+from phone import normalize_phone, extract_phone, PhoneIndex
+from journal import Journal
+from clock import RealClock
+from tenants import Tenant, CURRENT_TENANT, DEFAULT_TENANT, load_tenants, tenant_data_dir
+from shedding import LoadShedder
+from request_pools import TrafficPools, RoutedRequest, TRAFFIC_CLASS, traffic, POLLING, INTERACTIVE, BACKGROUND, ADMIN
 
 # =====================================================
 # НАЛАШТУВАННЯ ЛОГУВАННЯ
@@ -47,6 +76,48 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# =====================================================
+# ЛІНИВІ ІМПОРТИ ТА ПРОФІЛЬ СТАРТУ
+# =====================================================
+# httpx+oauth2client (Sheets) / requests / flask вантажаться лише тоді, коли
+# відповідна функція справді налаштована (Sheets, Make, polling-режим).
+
+STARTUP_PROFILE = os.environ.get('STARTUP_PROFILE') == '1'
+STARTUP_TIMINGS = {}  # етап старту -> секунди від запуску процесу
+_first_update_seen = False
+
+def lazy_import(name):
+    """Імпортує важку залежність при першому використанні"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with import_timer(name):
+        module = importlib.import_module(name)
+    return module
+
+def mark_startup(stage):
+    STARTUP_TIMINGS[stage] = time.perf_counter() - _PROCESS_START
+
+def startup_report():
+    """Текстовий звіт: імпорти за модулями та етапи старту"""
+    lines = ["⏱ Профіль старту:"]
+    for name, seconds in sorted(IMPORT_TIMINGS.items(), key=lambda item: item[1], reverse=True):
+        lines.append(f"  import {name:<40} {seconds * 1000:8.1f} ms")
+    for stage, seconds in sorted(STARTUP_TIMINGS.items(), key=lambda item: item[1]):
+        lines.append(f"  {stage:<47} {seconds * 1000:8.1f} ms")
+    return "\n".join(lines)
+
+async def track_first_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Група -2: фіксує час до першого обробленого апдейту"""
+    global _first_update_seen
+    if _first_update_seen:
+        return
+    _first_update_seen = True
+    mark_startup('first_update')
+    logger.info(f"⏱ Перший апдейт через {STARTUP_TIMINGS['first_update']:.2f} с після запуску")
+    if STARTUP_PROFILE:
+        logger.info(startup_report())
+
 # =====================================================
 # КОНСТАНТИ
 # =====================================================
@@ -56,163 +127,1220 @@ MAKE_WEBHOOK_URL = os.environ.get('MAKE_WEBHOOK_URL', '')
 GOOGLE_SHEET_URL = os.environ.get('GOOGLE_SHEET_URL')
 ADMIN_ID = os.environ.get('ADMIN_ID')
 
+# Кілька ботів в одному процесі (див. tenants.py); порожньо - один бот з env
+TENANTS_FILE = os.environ.get('TENANTS_FILE', '')
+
 # =====================================================
 # ПІДКЛЮЧЕННЯ ДО GOOGLE SHEETS
 # =====================================================
 
-def init_google_sheets():
-    """Ініціалізація підключення до Google Sheets"""
+# Заголовки листів (той самий порядок колонок, що й у рядках save_to_sheets / log_event)
+LEADS_HEADER = [
+    "Дата завершення", "Telegram ID", "Username", "Ім'я", "Телефон",
+    "Діти", "Згода супруга", "Майно", "Місце супруга", "Терміновість",
+    "Сегмент", "Назва сегменту", "Вартість", "Строки", "Статус"
+]
+ANALYTICS_HEADER = ["Timestamp", "Telegram ID", "Username", "Event", "Details"]
+ALL_USERS_HEADER = [
+    "Дата першого контакту", "Telegram ID", "Username",
+    "First Name", "Last Name", "Завершив квіз", "Статус"
+]
+
+# Leads та Analytics у таблиці мають ще одну, останню колонку - ключ запису
+# журналу ("<id журналу>:<seq>"). По ній повтор append-у після таймауту не
+# дублює рядок (див. replay_batch_to_sheets). All_Users дублікатів не боїться:
+# туди додаються лише ті, кого немає в колонці Telegram ID.
+JOURNAL_KEY_HEADER = "Journal key"
+JOURNAL_KEYED_SHEETS = {'Leads': LEADS_HEADER, 'Analytics': ANALYTICS_HEADER}
+
+GOOGLE_REQUIRED_VARS = [
+    'GOOGLE_PROJECT_ID', 
+    'GOOGLE_PRIVATE_KEY', 
+    'GOOGLE_CLIENT_EMAIL',
+    'GOOGLE_SHEET_URL'
+]
+
+def google_credentials():
+    """Словник сервісного акаунта зі змінних оточення (формат JSON-ключа)"""
+    return {
+        "type": "service_account",
+        "project_id": os.environ.get('GOOGLE_PROJECT_ID'),
+        "private_key_id": os.environ.get('GOOGLE_PRIVATE_KEY_ID'),
+        "private_key": os.environ.get('GOOGLE_PRIVATE_KEY', '').replace('\\n', '\n'),
+        "client_email": os.environ.get('GOOGLE_CLIENT_EMAIL'),
+        "client_id": os.environ.get('GOOGLE_CLIENT_ID'),
+        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+        "client_x509_cert_url": os.environ.get('GOOGLE_CERT_URL')
+    }
+
+# Лист -> (заголовок, рядків, колонок) при створенні.
+# Analytics та All_Users не створюються напряму - вони шардуються по місяцях (див. нижче)
+SHEET_SPECS = {
+    'Leads': (LEADS_HEADER + [JOURNAL_KEY_HEADER], 1000, 20),
+}
+
+# FAKE_BACKENDS=1: Sheets, Telegram і Make замінюються локальними фейками з fakes.py
+FAKE_BACKENDS = os.environ.get('FAKE_BACKENDS') == '1'
+
+# Один HTTP-пул до Sheets API на всі таблиці (тенанти) процесу
+SHEETS_TIMEOUT = float(os.environ.get('SHEETS_TIMEOUT', 10))
+SHEETS_POOL_SIZE = int(os.environ.get('SHEETS_POOL_SIZE', 10))
+SHEETS_HTTP = None
+
+def shared_sheets_http():
+    global SHEETS_HTTP
+    if SHEETS_HTTP is None:
+        SHEETS_HTTP = lazy_import('sheets_client').new_http_client(SHEETS_TIMEOUT, SHEETS_POOL_SIZE)
+    return SHEETS_HTTP
+
+def missing_sheets_vars(sheet_url):
+    missing_vars = [var for var in GOOGLE_REQUIRED_VARS if var != 'GOOGLE_SHEET_URL' and not os.environ.get(var)]
+    if not sheet_url:
+        missing_vars.append('GOOGLE_SHEET_URL')
+    return missing_vars
+
+def sheets_configured(t):
+    """Чи має тенант таблицю (на відміну від "таблиця зараз недоступна")"""
+    return FAKE_BACKENDS or not missing_sheets_vars(t.sheet_url)
+
+def create_sheets_client(sheet_url, http=None):
+    """Асинхронний клієнт Sheets (REST API) або фейковий; None, якщо не налаштовано"""
+    if FAKE_BACKENDS:
+        fakes = lazy_import('fakes')
+        logger.info("🧪 Google Sheets: фейкові листи в пам'яті")
+        return fakes.FakeSheetsClient(fakes.FakeSpreadsheet(fakes.FaultProfile.from_env('FAKE_SHEETS')))
+
+    missing_vars = missing_sheets_vars(sheet_url)
+    if missing_vars:
+        logger.warning(f"⚠️ Google Sheets не налаштовано (відсутні змінні: {', '.join(missing_vars)})")
+        return None
+
+    sheets_client = lazy_import('sheets_client')
+    return sheets_client.SheetsClient.from_service_account(
+        sheet_url,
+        google_credentials(),
+        timeout=SHEETS_TIMEOUT,
+        http=http
+    )
+
+async def init_google_sheets():
+    """Підключення до таблиці поточного тенанта: перевіряє / створює листи. Повертає клієнт або None"""
+    t = tenant()
+    try:
+        client = create_sheets_client(t.sheet_url, http=None if FAKE_BACKENDS else shared_sheets_http())
+    except Exception as e:
+        logger.error(f"❌ Помилка підключення до Google Sheets: {type(e).__name__}: {str(e)}")
+        return None
+    if client is None:
+        return None
+
     try:
-        required_vars = [
-            'GOOGLE_PROJECT_ID', 
-            'GOOGLE_PRIVATE_KEY', 
-            'GOOGLE_CLIENT_EMAIL',
-            'GOOGLE_SHEET_URL'
-        ]
-        missing_vars = [var for var in required_vars if not os.environ.get(var)]
-        
-        if missing_vars:
-            logger.warning(f"⚠️ Google Sheets не налаштовано (відсутні змінні: {', '.join(missing_vars)})")
-            return None, None, None
-        
-        scope = ['https://spreadsheets.google.com/feeds',
-                 'https://www.googleapis.com/auth/drive']
-        
-        creds_dict = {
-            "type": "service_account",
-            "project_id": os.environ.get('GOOGLE_PROJECT_ID'),
-            "private_key_id": os.environ.get('GOOGLE_PRIVATE_KEY_ID'),
-            "private_key": os.environ.get('GOOGLE_PRIVATE_KEY', '').replace('\\n', '\n'),
-            "client_email": os.environ.get('GOOGLE_CLIENT_EMAIL'),
-            "client_id": os.environ.get('GOOGLE_CLIENT_ID'),
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-            "client_x509_cert_url": os.environ.get('GOOGLE_CERT_URL')
-        }
-        
         logger.info("🔄 Підключення до Google Sheets...")
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        client = gspread.authorize(creds)
-        
-        logger.info(f"🔄 Відкриваю таблицю по URL...")
-        spreadsheet = client.open_by_url(GOOGLE_SHEET_URL)
-        
-        # Отримуємо або створюємо листи
-        try:
-            leads_sheet = spreadsheet.worksheet("Leads")
-        except gspread.WorksheetNotFound:
-            leads_sheet = spreadsheet.add_worksheet("Leads", rows=1000, cols=20)
-            # Додаємо заголовки (додали segment_name)
-            leads_sheet.append_row([
-                "Дата завершення", "Telegram ID", "Username", "Ім'я", "Телефон",
-                "Діти", "Згода супруга", "Майно", "Місце супруга", "Терміновість",
-                "Сегмент", "Назва сегменту", "Вартість", "Строки", "Статус"
-            ])
-        
-        try:
-            analytics_sheet = spreadsheet.worksheet("Analytics")
-        except gspread.WorksheetNotFound:
-            analytics_sheet = spreadsheet.add_worksheet("Analytics", rows=5000, cols=10)
-            analytics_sheet.append_row([
-                "Timestamp", "Telegram ID", "Username", "Event", "Details"
-            ])
-        
-        try:
-            all_users_sheet = spreadsheet.worksheet("All_Users")
-        except gspread.WorksheetNotFound:
-            all_users_sheet = spreadsheet.add_worksheet("All_Users", rows=5000, cols=10)
-            all_users_sheet.append_row([
-                "Дата першого контакту", "Telegram ID", "Username", 
-                "First Name", "Last Name", "Завершив квіз", "Статус"
-            ])
-        
-        logger.info(f"✅ Google Sheets підключено успішно")
-        logger.info(f"  📊 Leads: {leads_sheet.title}")
-        logger.info(f"  📈 Analytics: {analytics_sheet.title}")
-        logger.info(f"  👥 All Users: {all_users_sheet.title}")
+        existing = await client.sheet_titles()
+        for title, (header, rows, cols) in SHEET_SPECS.items():
+            if await client.ensure_sheet(title, header, rows=rows, cols=cols, existing=existing):
+                logger.info(f"  ➕ Створено лист {title}")
+
+        await t.shards.load(client)
+        await t.shards.ensure_ahead(client)
+
+        # Листи, створені до колонки ключа журналу: дописуємо її заголовок
+        headers = {title: header for title, (header, _, _) in SHEET_SPECS.items() if title in JOURNAL_KEYED_SHEETS}
+        for base in JOURNAL_KEYED_SHEETS:
+            if base in SHARDED_SHEETS:
+                headers.update((title, SHARDED_SHEETS[base]) for title in t.shards.readable(base))
+        migrated = await client.ensure_headers(headers)
+        if migrated:
+            logger.info(f"  🏷 Дописано заголовок «{JOURNAL_KEY_HEADER}»: {', '.join(migrated)}")
         
-        return leads_sheet, analytics_sheet, all_users_sheet
+        logger.info(f"✅ Google Sheets{tenant_label(t)} підключено успішно ({', '.join(SHEET_SPECS)}, шарди: {t.shards.describe()})")
+        return client
         
     except Exception as e:
         logger.error(f"❌ Помилка підключення до Google Sheets: {type(e).__name__}: {str(e)}")
-        return None, None, None
+        await client.close()
+        return None
+
+# Клієнт кожного тенанта (tenant.sheets) підключається на старті (потрібен запущений event loop).
+# Якщо таблиця налаштована, але на старті недоступна, реплеєр Sheets
+# перепідключається з наростаючою паузою, а записи чекають у журналі.
+SHEETS_RECONNECT_DELAY = 5
+SHEETS_RECONNECT_MAX_DELAY = 300
+
+async def reconnect_google_sheets(t):
+    """Повторне підключення таблиці тенанта (не частіше, ніж дозволяє пауза)"""
+    now = time.monotonic()
+    if now < t.sheets_retry_at:
+        return
+    t.sheets_retry_delay = min(SHEETS_RECONNECT_MAX_DELAY, max(SHEETS_RECONNECT_DELAY, t.sheets_retry_delay * 2))
+    t.sheets_retry_at = now + t.sheets_retry_delay
+    client = await init_google_sheets()
+    if client is None:
+        logger.warning(f"⚠️ Google Sheets{tenant_label(t)} недоступні, наступна спроба через {t.sheets_retry_delay} с")
+        return
+    t.sheets = client
+    t.sheets_retry_delay = 0
+    await load_phone_index(None)
+
+# =====================================================
+# ШАРДИ ЛИСТІВ (Analytics / All_Users по місяцях)
+# =====================================================
+# Один лист, що росте вічно, з часом гальмує кожен append. Тому події та
+# нові користувачі пишуться в лист свого місяця (Analytics_2026_10), а
+# список шардів веде лист-маніфест _Shards - по ньому читачі (кеш статусів,
+# пошук користувачів, звіти) збирають дані з усіх шардів.
+# Старі листи без суфікса (Analytics, All_Users) лишаються першим шардом.
+# Шарди створюються наперед (SHARDS_AHEAD місяців) з маленькою сіткою:
+# ліміт Google рахує клітинки сітки, а append сам додає рядки.
+#
+# Видаляти старі шарди (щоб не впертися в ліміт клітинок таблиці) можна
+# лише для Analytics: ті самі події лежать у локальному архіві events, і
+# `python bot.py export events` їх відновить. Шарди All_Users видаляти
+# НЕ можна - це реєстр користувачів: з нього перевіряється, чи людина вже
+# є в таблиці, і в ньому оновлюються статуси. Локального архіву для All_Users
+# немає, тож видалений шард втрачено назавжди.
+
+SHARDED_SHEETS = {'Analytics': ANALYTICS_HEADER + [JOURNAL_KEY_HEADER], 'All_Users': ALL_USERS_HEADER}
+SHARDS_AHEAD = int(os.environ.get('SHARDS_AHEAD', 1))
+SHARD_INITIAL_ROWS = int(os.environ.get('SHARD_INITIAL_ROWS', 200))
+MANIFEST_SHEET = '_Shards'
+MANIFEST_HEADER = ['Base', 'Shard', 'Period', 'Created']
+
+def shard_period(timestamp):
+    """'2026-10-19T12:00:00' / datetime -> '2026_10'"""
+    if isinstance(timestamp, datetime):
+        return timestamp.strftime('%Y_%m')
+    return f"{timestamp[:4]}_{timestamp[5:7]}"
+
+def _shift_period(period, months):
+    year, month = int(period[:4]), int(period[5:7])
+    index = year * 12 + (month - 1) + months
+    return f"{index // 12:04d}_{index % 12 + 1:02d}"
+
+class ShardManifest:
+    """Базовий лист -> шарди (від старих до нових) + створення нових"""
+
+    def __init__(self):
+        self.shards = {base: [] for base in SHARDED_SHEETS}
+        self.known = set()     # всі листи таблиці
+        self._lock = None
+
+    def title_for(self, base, period):
+        return f"{base}_{period}"
+
+    def readable(self, base):
+        """Всі шарди листа - для читання по всій історії"""
+        return list(self.shards.get(base, ()))
+
+    def describe(self):
+        return ', '.join(f"{base} x{len(titles)}" for base, titles in self.shards.items())
+
+    def _sort(self, base):
+        # Легасі-лист без суфікса - першим, далі по періодах
+        self.shards[base].sort(key=lambda title: (title != base, title))
+
+    async def load(self, sheets):
+        sheets_client = lazy_import('sheets_client')
+        self._lock = asyncio.Lock()
+        titles = await sheets.sheet_titles()
+        self.known = set(titles)
+        if await sheets.ensure_sheet(MANIFEST_SHEET, MANIFEST_HEADER, rows=100, cols=len(MANIFEST_HEADER), existing=titles):
+            self.known.add(MANIFEST_SHEET)
+
+        shards = {base: [base] if base in self.known else [] for base in SHARDED_SHEETS}
+        for row in await sheets.values_get(sheets_client.a1(MANIFEST_SHEET, 'A2:B')):
+            if len(row) >= 2 and row[0] in shards and row[1] in self.known and row[1] not in shards[row[0]]:
+                shards[row[0]].append(row[1])
+        self.shards = shards
+        for base in shards:
+            self._sort(base)
+
+    async def ensure(self, sheets, base, period):
+        """Назва шарда для періоду; створює лист і запис у маніфесті, якщо його ще немає"""
+        title = self.title_for(base, period)
+        if title in self.shards[base]:
+            return title
+        async with self._lock:
+            if title in self.shards[base]:
+                return title
+            header = SHARDED_SHEETS[base]
+            if await sheets.ensure_sheet(title, header, rows=SHARD_INITIAL_ROWS, cols=len(header), existing=self.known):
+                logger.info(f"🧩 Створено шард {title}")
+            await sheets.append_rows(MANIFEST_SHEET, [[base, title, period, datetime.now().isoformat()]])
+            self.known.add(title)
+            self.shards[base].append(title)
+            self._sort(base)
+        return title
+
+    async def ensure_ahead(self, sheets, now=None):
+        """Поточний місяць + SHARDS_AHEAD наступних, щоб на зламі місяця append не чекав створення"""
+        period = shard_period(now or datetime.now())
+        for base in SHARDED_SHEETS:
+            for months in range(SHARDS_AHEAD + 1):
+                await self.ensure(sheets, base, _shift_period(period, months))
+
+async def ensure_shards_ahead(context: ContextTypes.DEFAULT_TYPE):
+    """Job: заздалегідь створює шарди наступного місяця"""
+    t = tenant()
+    if t.sheets is None:
+        return
+    try:
+        await t.sheets_breaker.call(t.shards.ensure_ahead, t.sheets)
+    except Exception as e:
+        logger.error(f"❌ Не вдалося створити шарди наперед: {e}")
+
+# =====================================================
+# ЛОКАЛЬНИЙ АРХІВ (лідів та подій)
+# =====================================================
+# Кожен рядок, що йде в Leads / Analytics, також дописується в
+# DATA_DIR/<kind>.jsonl - з цих файлів працює `python bot.py export`.
+# All_Users сюди не потрапляє (див. ШАРДИ ЛИСТІВ).
+
+DATA_DIR = os.environ.get('DATA_DIR', 'data')
+
+# Вид архіву -> лист із тими самими рядками. Рядок архіву має вигляд рядка
+# листа, включно з ключем журналу, тож експорт відтворює живі листи
+ARCHIVE_SHEETS = {
+    'leads': 'Leads',
+    'events': 'Analytics',
+}
+ARCHIVE_HEADERS = {kind: JOURNAL_KEYED_SHEETS[base] + [JOURNAL_KEY_HEADER] for kind, base in ARCHIVE_SHEETS.items()}
+
+def archive_path(kind, data_dir=None):
+    return os.path.join(data_dir or tenant().data_dir, f"{kind}.jsonl")
+
+def archive_row(kind, row, data_dir=None):
+    """Дописує рядок у локальний архів (один JSON-масив на рядок)"""
+    data_dir = data_dir or tenant().data_dir
+    try:
+        os.makedirs(data_dir, exist_ok=True)
+        with open(archive_path(kind, data_dir), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    except Exception as e:
+        logger.error(f"❌ Помилка запису в локальний архів ({kind}): {e}")
+
+# =====================================================
+# ЗАПОБІЖНИКИ (CIRCUIT BREAKER) ДЛЯ SHEETS ТА MAKE
+# =====================================================
+# Якщо сервіс падає FAILURE_THRESHOLD разів поспіль, запобіжник "розмикається":
+# наступні RESET_TIMEOUT секунд виклики одразу отримують CircuitOpenError, не
+# чекаючи таймаутів (записи лишаються в журналі). Потім один пробний виклик
+# (half-open) вирішує - замкнути запобіжник чи почекати ще.
+
+class CircuitOpenError(Exception):
+    """Запобіжник розімкнено - виклик не виконувався"""
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, call_timeout=10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.call_timeout = call_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self.stats = {'calls': 0, 'failures': 0, 'timeouts': 0, 'rejected': 0, 'opened': 0}
+
+    def allow(self):
+        """Чи можна зараз робити виклик (у half-open - лише один пробний)"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.stats['rejected'] += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+            logger.info(f"🟡 Запобіжник {self.name}: пробний виклик (half-open)")
+
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                self.stats['rejected'] += 1
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"🟢 Запобіжник {self.name} замкнено - сервіс відновився")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.stats['failures'] += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.stats['opened'] += 1
+                logger.warning(f"🔴 Запобіжник {self.name} розімкнено на {self.reset_timeout:.0f} с")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    async def call(self, fn, *args):
+        """
+        Виконує fn з таймаутом: корутину - напряму, синхронну - в executor.
+        Таймаут не означає, що сервіс запит не виконав: append у Sheets чи POST
+        у Make міг пройти, а журнал його повторить. Рядки Sheets мають ключ
+        журналу і при повторі не дублюються; Make отримує той самий
+        Idempotency-Key, і дублікат має відсіяти сценарій. Скільки таких
+        викликів було - stats['timeouts'] у /metrics.
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        self.stats['calls'] += 1
+        if asyncio.iscoroutinefunction(fn):
+            awaitable = fn(*args)
+        else:
+            awaitable = asyncio.get_running_loop().run_in_executor(None, fn, *args)
+        try:
+            result = await asyncio.wait_for(awaitable, self.call_timeout)
+        except Exception as e:
+            if isinstance(e, TimeoutError) or 'Timeout' in type(e).__name__:
+                self.stats['timeouts'] += 1  # httpx / requests ReadTimeout тощо
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self):
+        return {'state': self.state, 'consecutive_failures': self.failures, **self.stats}
+
+SHEETS_BREAKER = CircuitBreaker(
+    'sheets',
+    failure_threshold=int(os.environ.get('SHEETS_BREAKER_THRESHOLD', 5)),
+    reset_timeout=float(os.environ.get('SHEETS_BREAKER_RESET', 60)),
+    call_timeout=SHEETS_TIMEOUT
+)
+MAKE_BREAKER = CircuitBreaker(
+    'make',
+    failure_threshold=int(os.environ.get('MAKE_BREAKER_THRESHOLD', 3)),
+    reset_timeout=float(os.environ.get('MAKE_BREAKER_RESET', 60)),
+    call_timeout=6
+)
+BREAKERS = {'sheets': SHEETS_BREAKER, 'make': MAKE_BREAKER}
+
+# =====================================================
+# ТЕНАНТИ (КІЛЬКА БОТІВ В ОДНОМУ ПРОЦЕСІ)
+# =====================================================
+# Без TENANTS_FILE - один тенант "default" з env, як і раніше. З ним кожен
+# тенант має свій токен, таблицю, адміна та каталог, а журнал, HTTP-пули,
+# процесор апдейтів і load shedding спільні (див. tenants.py).
+
+CATALOG_PATH = os.environ.get('CATALOG_PATH', os.path.join(DATA_DIR, 'catalog.json'))
 
-# Ініціалізуємо sheets
-SHEETS_LEADS, SHEETS_ANALYTICS, SHEETS_ALL_USERS = init_google_sheets()
+def load_tenant_config():
+    defaults = {
+        'token': BOT_TOKEN,
+        'sheet_url': GOOGLE_SHEET_URL,
+        'admin_id': ADMIN_ID,
+        'catalog': CATALOG_PATH,
+    }
+    if not TENANTS_FILE:
+        return [Tenant(DEFAULT_TENANT, BOT_TOKEN, GOOGLE_SHEET_URL, ADMIN_ID, CATALOG_PATH, data_dir=DATA_DIR)]
+    return load_tenants(TENANTS_FILE, DATA_DIR, defaults)
+
+TENANTS = load_tenant_config()
+
+def tenant():
+    """Тенант поточного апдейту / задачі (поза ними - перший з TENANTS)"""
+    return CURRENT_TENANT.get() or TENANTS[0]
+
+def tenant_label(t):
+    """' [lviv]' для логів; у тенанта default - порожньо"""
+    return '' if t.is_default else f" [{t.name}]"
+
+def find_tenant(name):
+    return next((t for t in TENANTS if t.name == name), None)
+
+def record_tenant(record):
+    """Тенант запису журналу (None - тенанта вже немає в конфігурації)"""
+    return find_tenant(record.get('tenant', DEFAULT_TENANT))
+
+def sheets_consumer_tenant(consumer):
+    return next((t for t in TENANTS if t.sheets_consumer == consumer), None)
+
+# =====================================================
+# ЖУРНАЛ (WRITE-AHEAD LOG) ТА РЕПЛЕЄРИ
+# =====================================================
+# Обробники лише фіксують ліда / статус / подію в локальному журналі
+# (fsync пакетами) - це і є підтвердження. У Sheets, Make та локальний
+# архів записи доносять фонові реплеєри, кожен зі своїм курсором.
+# Поки запобіжник розімкнено, записи просто чекають у журналі.
+
+JOURNAL = Journal(
+    os.path.join(DATA_DIR, 'journal'),
+    consumers=tuple(t.sheets_consumer for t in TENANTS) + ('make', 'archive'),
+    commit_interval=float(os.environ.get('JOURNAL_COMMIT_INTERVAL', 0.02))
+)
+JOURNAL_TASKS = []
+
+async def journal_write(kind, data):
+    """Фіксує запис у журналі. True - запис на диску"""
+    try:
+        await JOURNAL.append(kind, data, tenant=tenant().journal_name)
+        return True
+    except Exception as e:
+        logger.error(f"❌ Журнал: не вдалося записати {kind}: {e}")
+        return False
+
+def journal_sheets_op(record):
+    """Запис журналу -> операція з Sheets (або None, якщо це не для Sheets)"""
+    kind, data = record['kind'], record['data']
+    if kind == 'event':
+        return {'op': 'append', 'sheet': 'Analytics', 'period': shard_period(data[0]), 'row': data}
+    if kind == 'lead':
+        return {'op': 'append', 'sheet': 'Leads', 'row': data}
+    if kind == 'user':
+        return {'op': 'append_unique', 'sheet': 'All_Users', 'row': data}
+    if kind == 'status':
+        return {'op': 'update_user_cell', 'sheet': 'All_Users', **data}
+    return None
+
+# Споживач -> seq записів, уже застосованих до Sheets, але ще не закомічених
+# у курсорі: при повторі пачки після збою вони не дублюються
+SHEETS_APPLIED = {}
+# Споживач -> seq записів, append яких міг пройти, хоч відповіді й не було
+# (таймаут, обрив, 5xx, або пачка, яку обробляли в момент падіння процесу).
+# Перед їх повтором читається колонка ключів журналу листа
+SHEETS_UNCERTAIN = {}
+JOURNAL_KEY_STATS = {'checks': 0, 'skipped': 0}
+
+def journal_keyed_row(base, record, row):
+    """Рядок Leads / Analytics + ключ журналу в колонці після заголовка"""
+    width = len(JOURNAL_KEYED_SHEETS[base])
+    return list(row[:width]) + [''] * (width - len(row)) + [JOURNAL.key(record)]
+
+async def skip_present_rows(t, title, base, items):
+    """Прибирає з [(запис, рядок)] ті, чий ключ журналу вже є в листі title"""
+    sheets_client = lazy_import('sheets_client')
+    column = sheets_client.column_letter(len(JOURNAL_KEYED_SHEETS[base]) + 1)
+    values = await t.sheets_breaker.call(t.sheets.values_get, sheets_client.a1(title, f"{column}:{column}"))
+    present = {cells[0] for cells in values if cells}
+    JOURNAL_KEY_STATS['checks'] += 1
+    kept = [(record, row) for record, row in items if JOURNAL.key(record) not in present]
+    if len(kept) < len(items):
+        JOURNAL_KEY_STATS['skipped'] += len(items) - len(kept)
+        logger.info(f"🔁 {title}: {len(items) - len(kept)} рядків уже в таблиці (повтор після таймауту) - пропущено")
+    return kept
+
+def forget_sheets_seqs(consumer, seqs):
+    """Записи закомічено в курсорі - їх стан повтору більше не потрібен"""
+    seqs = set(seqs)
+    for state in (SHEETS_APPLIED, SHEETS_UNCERTAIN):
+        if consumer in state:
+            state[consumer] -= seqs
+
+async def append_new_users(rows):
+    """Додає в All_Users лише тих, кого там ще немає: 1 читання (всі шарди) + 1 запис на шард"""
+    sheets_client = lazy_import('sheets_client')
+    t = tenant()
+    unique = {}
+    for row in rows:
+        unique.setdefault(row[1], row)
+    unknown = [key for key in unique if key not in t.status_cache.all_users]
+    if unknown and t.shards.readable('All_Users'):
+        columns = await t.sheets.values_batch_get([sheets_client.a1(title, 'B:B') for title in t.shards.readable('All_Users')])
+        existing = {cells[0] for column in columns for cells in column if cells}
+        unknown = [key for key in unknown if key not in existing]
+    if not unknown:
+        return
+
+    # Користувач живе в шарді місяця першого контакту
+    by_shard = {}
+    for key in unknown:
+        title = await t.shards.ensure(t.sheets, 'All_Users', shard_period(unique[key][0]))
+        by_shard.setdefault(title, []).append(key)
+
+    for title, keys in by_shard.items():
+        first_row = await t.sheets.append_rows(title, [unique[key] for key in keys])
+        if first_row:
+            # Номери рядків одразу в кеш - оновленням статусу цих користувачів не треба їх шукати
+            for offset, key in enumerate(keys):
+                t.status_cache.all_users[key] = [first_row + offset, unique[key][5], unique[key][6], title]
+    logger.info(f"👥 Нових користувачів в базі: {len(unknown)}")
+
+async def replay_batch_to_sheets(records):
+    """
+    Пачка записів журналу -> мінімум запитів до Sheets:
+    один append_rows на лист, один прохід по новим користувачам,
+    всі зміни статусів - одним batch_update (StatusCoalescer).
+    Записи інших тенантів пропускає - їх доносять їхні споживачі.
+    """
+    t = tenant()
+    if t.sheets is None:
+        if not sheets_configured(t):
+            return
+        # Таблиця налаштована, але не підключена: пачка лишається в журналі
+        raise CircuitOpenError(f"Google Sheets{tenant_label(t)} не підключено")
+    applied = SHEETS_APPLIED.setdefault(t.sheets_consumer, set())
+    uncertain = SHEETS_UNCERTAIN.setdefault(t.sheets_consumer, set())
+    appends = {}   # лист -> (базовий лист, [(запис, рядок)])
+    users = []     # [(seq, рядок)]
+    for record, _ in records:
+        if record['seq'] in applied or record.get('tenant', DEFAULT_TENANT) != t.name:
+            continue
+        op = journal_sheets_op(record)
+        if op is None:
+            continue
+        if op['op'] == 'append':
+            sheet = op['sheet']
+            if 'period' in op:
+                sheet = await t.shards.ensure(t.sheets, sheet, op['period'])
+            appends.setdefault(sheet, (op['sheet'], []))[1].append((record, op['row']))
+        elif op['op'] == 'append_unique':
+            users.append((record['seq'], op['row']))
+        elif op['op'] == 'update_user_cell':
+            # Ідемпотентно: при повторі пачки та сама клітинка просто перезапишеться
+            t.status_coalescer.add(op['sheet'], op['telegram_id'], op['col'], op['value'])
+
+    for sheet, (base, items) in appends.items():
+        if any(record['seq'] in uncertain for record, _ in items):
+            items = await skip_present_rows(t, sheet, base, items)
+        if items:
+            try:
+                await t.sheets_breaker.call(t.sheets.append_rows, sheet, [journal_keyed_row(base, record, row) for record, row in items])
+            except CircuitOpenError:
+                raise
+            except Exception:
+                # Відповіді немає - рядки могли записатися
+                uncertain.update(record['seq'] for record, _ in items)
+                raise
+        applied.update(record['seq'] for record, _ in items)
+
+    if users:
+        await t.sheets_breaker.call(append_new_users, [row for _, row in users])
+        applied.update(seq for seq, _ in users)
+
+    if t.status_coalescer.pending:
+        await t.sheets_breaker.call(t.status_coalescer.flush, t.sheets)
+
+async def replay_to_make(record):
+    url = make_url(record_tenant(record))
+    if record['kind'] != 'make' or not url:
+        return
+    await MAKE_BREAKER.call(post_to_make, url, record['data'], JOURNAL.key(record))
+
+async def replay_to_archive(record):
+    t = record_tenant(record)
+    data_dir = t.data_dir if t else tenant_data_dir(DATA_DIR, record.get('tenant', DEFAULT_TENANT))
+    if record['kind'] == 'event':
+        archive_row('events', journal_keyed_row('Analytics', record, record['data']), data_dir)
+    elif record['kind'] == 'lead':
+        archive_row('leads', journal_keyed_row('Leads', record, record['data']), data_dir)
+
+JOURNAL_REPLAYERS = {
+    'make': replay_to_make,
+    'archive': replay_to_archive,
+}
+
+# Тимчасові збої (таймаути, мережа, 429, 5xx) повторюються з наростаючою
+# паузою, але не більше JOURNAL_MAX_ATTEMPTS разів; постійні (інші 4xx,
+# зіпсований запис) - одразу в dead-letter журналу. Поки запобіжник
+# розімкнено, спроби не рахуються - запис просто чекає.
+JOURNAL_MAX_ATTEMPTS = int(os.environ.get('JOURNAL_MAX_ATTEMPTS', 20))
+JOURNAL_RETRY_DELAY = 5
+JOURNAL_RETRY_MAX_DELAY = 300
+
+# Споживач -> {seq: невдалих спроб} для записів, які ще повторюються
+REPLAY_ATTEMPTS = {}
+
+def is_permanent_failure(e):
+    """Помилка, яку повтор не виправить: 4xx (крім 408/429) або некоректний запис"""
+    status = getattr(e, 'status', None)
+    if status is None:
+        # requests.HTTPError (Make), httpx.HTTPStatusError
+        status = getattr(getattr(e, 'response', None), 'status_code', None)
+    if isinstance(status, int):
+        return 400 <= status < 500 and status not in (408, 429)
+    return isinstance(e, (ValueError, KeyError, TypeError, IndexError))
+
+def replay_retry_delay(consumer, seq):
+    failures = REPLAY_ATTEMPTS.get(consumer, {}).get(seq, 0)
+    return min(JOURNAL_RETRY_DELAY * 2 ** max(failures - 1, 0), JOURNAL_RETRY_MAX_DELAY)
+
+async def replay_record(consumer, handle, record):
+    """
+    Один запис -> споживач. True - запис оброблено або відкладено в dead-letter
+    (курсор можна зсувати), False - повторити пізніше.
+    """
+    attempts = REPLAY_ATTEMPTS.setdefault(consumer, {})
+    seq = record['seq']
+    try:
+        await handle(record)
+    except CircuitOpenError:
+        return False
+    except Exception as e:
+        failures = attempts.get(seq, 0) + 1
+        error = f"{type(e).__name__}: {e}"
+        if is_permanent_failure(e) or failures >= JOURNAL_MAX_ATTEMPTS:
+            attempts.pop(seq, None)
+            JOURNAL.dead_letter(consumer, record, error, failures)
+            logger.error(f"☠️ Реплеєр {consumer} (seq {seq}): {error} - запис відкладено в dead-letter після {failures} спроб")
+            return True
+        attempts[seq] = failures
+        logger.error(f"❌ Реплеєр {consumer} (seq {seq}, спроба {failures}/{JOURNAL_MAX_ATTEMPTS}): {error}")
+        return False
+    attempts.pop(seq, None)
+    return True
+
+def replay_snapshot():
+    return {
+        'max_attempts': JOURNAL_MAX_ATTEMPTS,
+        'retrying': {consumer: dict(attempts) for consumer, attempts in REPLAY_ATTEMPTS.items() if attempts},
+        'sheets_key_checks': JOURNAL_KEY_STATS['checks'],
+        'sheets_rows_already_present': JOURNAL_KEY_STATS['skipped'],
+    }
+
+async def replay_sheets_record(record):
+    """Один запис у Sheets - щоб знайти в пачці запис, через який вона не проходить"""
+    await replay_batch_to_sheets([(record, None)])
+
+async def replay_records(consumer, handle, records):
+    """По одному запису; курсор зсувається до першого, який треба повторити"""
+    position = None
+    blocked = None
+    for record, end in records:
+        if not await replay_record(consumer, handle, record):
+            blocked = record['seq']
+            break
+        position = end
+
+    if position:
+        JOURNAL.commit(consumer, position)
+        forget_sheets_seqs(consumer, (record['seq'] for record, end in records if end <= position))
+    if blocked is not None:
+        await asyncio.sleep(replay_retry_delay(consumer, blocked))
+
+async def run_journal_replayer(consumer):
+    """Фонова задача: доносить записи журналу до свого споживача (at-least-once)"""
+    handle = JOURNAL_REPLAYERS.get(consumer)
+    handle_batch = None
+    owner = sheets_consumer_tenant(consumer)
+    if owner is not None:
+        # Споживач Sheets тенанта обробляє пачку цілком (пачка комітиться лише повністю)
+        CURRENT_TENANT.set(owner)
+        handle = replay_sheets_record
+        handle_batch = replay_batch_to_sheets
+    # Пачку, яку доносили в момент падіння процесу, могло бути частково записано
+    first_read = owner is not None
+    while True:
+        if owner is not None and owner.sheets is None and sheets_configured(owner):
+            await reconnect_google_sheets(owner)
+        try:
+            records = JOURNAL.read(consumer, limit=200)
+        except Exception as e:
+            # Напр. сегмент тимчасово не читається - реплеєр не має вмирати
+            logger.error(f"❌ Реплеєр {consumer}: не вдалося прочитати журнал: {type(e).__name__}: {e}")
+            await asyncio.sleep(JOURNAL_RETRY_DELAY)
+            continue
+        if first_read:
+            SHEETS_UNCERTAIN[consumer] = {record['seq'] for record, _ in records}
+            first_read = False
+        if not records:
+            await JOURNAL.wait_for_new(consumer, timeout=5)
+            continue
+
+        if not handle_batch:
+            await replay_records(consumer, handle, records)
+            continue
+
+        head = records[0][0]['seq']
+        attempts = REPLAY_ATTEMPTS.setdefault(consumer, {})
+        try:
+            await handle_batch(records)
+        except CircuitOpenError:
+            await asyncio.sleep(JOURNAL_RETRY_DELAY)
+            continue
+        except Exception as e:
+            failures = attempts.get(head, 0) + 1
+            logger.error(f"❌ Реплеєр {consumer} (seq {head}-{records[-1][0]['seq']}): {type(e).__name__}: {e}")
+            if not is_permanent_failure(e) and failures < JOURNAL_MAX_ATTEMPTS:
+                attempts[head] = failures
+                await asyncio.sleep(replay_retry_delay(consumer, head))
+                continue
+            # Пачка не пройде в такому вигляді: доносимо по одному, щоб відкласти
+            # в dead-letter лише винний запис. Статуси пачки додадуться знову по одному
+            logger.warning(f"🔎 Реплеєр {consumer}: пачка seq {head}-{records[-1][0]['seq']} - по одному запису")
+            owner.status_coalescer.pending.clear()
+            await replay_records(consumer, handle, records)
+            continue
+        attempts.pop(head, None)
+        JOURNAL.commit(consumer, records[-1][1])
+        forget_sheets_seqs(consumer, (record['seq'] for record, _ in records))
+
+async def start_journal():
+    await JOURNAL.start()
+    JOURNAL_TASKS.extend(asyncio.create_task(run_journal_replayer(consumer)) for consumer in JOURNAL.consumers)
+
+async def stop_journal():
+    for task in JOURNAL_TASKS:
+        task.cancel()
+    await asyncio.gather(*JOURNAL_TASKS, return_exceptions=True)
+    JOURNAL_TASKS.clear()
+    await JOURNAL.close()
 
 # =====================================================
 # АНАЛІТИКА - ЛОГУВАННЯ ПОДІЙ
 # =====================================================
 
+def build_event_row(telegram_id, username, event, details=""):
+    """Рядок для листа Analytics"""
+    return [
+        datetime.now().isoformat(),
+        str(telegram_id),
+        username or "",
+        event,
+        details
+    ]
+
 async def log_event(telegram_id, username, event, details=""):
     """Логує кожну подію користувача для аналітики конверсії"""
     
-    if SHEETS_ANALYTICS is None:
+    if shedding(SHED_SAMPLE_ANALYTICS) and event not in ESSENTIAL_EVENTS and random.random() >= SHED_EVENT_SAMPLE:
+        SHEDDER.count('events')
         return
+
+    row = build_event_row(telegram_id, username, event, details)
     
-    try:
-        row = [
-            datetime.now().isoformat(),
-            str(telegram_id),
-            username or "",
-            event,
-            details
-        ]
-        
-        SHEETS_ANALYTICS.append_row(row)
+    if await journal_write('event', row):
         logger.info(f"📊 Analytics: {telegram_id} → {event}")
-        
-    except Exception as e:
-        logger.error(f"❌ Помилка логування події: {e}")
 
 async def save_all_user(telegram_id, username, first_name, last_name):
     """Зберігає ВСІХ користувачів, хто натиснув /start"""
     
-    if SHEETS_ALL_USERS is None:
-        return
+    row = [
+        datetime.now().isoformat(),
+        str(telegram_id),
+        username or "",
+        first_name or "",
+        last_name or "",
+        "Ні",  # Завершив квіз
+        "new"   # Статус
+    ]
     
-    try:
-        # Перевіряємо чи вже є такий користувач
-        existing = SHEETS_ALL_USERS.find(str(telegram_id), in_column=2)
-        if existing:
-            logger.info(f"👥 Користувач {telegram_id} вже в базі")
-            return
-        
-        row = [
-            datetime.now().isoformat(),
-            str(telegram_id),
-            username or "",
-            first_name or "",
-            last_name or "",
-            "Ні",  # Завершив квіз
-            "new"   # Статус
+    # Реплеєр додасть рядок, лише якщо такого користувача ще немає
+    await journal_write('user', row)
+
+# =====================================================
+# КЕШ СТАТУСІВ З SHEETS (Leads + All_Users)
+# =====================================================
+# Менеджер змінює "Статус" прямо в таблиці. Щоб нагадування це бачили
+# без запиту до Sheets на кожне нагадування, колонки статусів вантажимо
+# пакетно раз на STATUS_CACHE_REFRESH секунд.
+
+STATUS_CACHE_REFRESH = int(os.environ.get('STATUS_CACHE_REFRESH', 300))
+
+# Статуси, які не зупиняють нагадування
+OPEN_STATUSES = ('', 'new')
+
+def _column_cells(value_range, row_index):
+    """Значення першої колонки діапазону в рядку row_index (0 = заголовок)"""
+    if row_index < len(value_range) and value_range[row_index]:
+        return value_range[row_index]
+    return []
+
+class SheetsStatusCache:
+    """Telegram ID -> (номер рядка, статус) для Leads та All_Users однієї таблиці"""
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.leads = {}       # id -> [row, status, segment]
+        self.all_users = {}   # id -> [row, completed, status, shard]
+        self.version = 0
+        self.refreshed_at = None
+        self._fingerprint = None
+
+    async def load(self, sheets):
+        """Leads та всі шарди All_Users одним batchGet. True, якщо дані змінилися"""
+        sheets_client = lazy_import('sheets_client')
+        user_shards = self.shards.readable('All_Users')
+        ranges = [
+            sheets_client.a1('Leads', 'B:B'),
+            sheets_client.a1('Leads', 'K:K'),
+            sheets_client.a1('Leads', 'O:O'),
         ]
-        
-        SHEETS_ALL_USERS.append_row(row)
-        logger.info(f"👥 Новий користувач в базі: {username or telegram_id}")
-        
+        for title in user_shards:
+            ranges += [sheets_client.a1(title, 'B:B'), sheets_client.a1(title, 'F:G')]
+        values = await sheets.values_batch_get(ranges)
+        leads_ids, leads_segments, leads_status = values[:3]
+        users_ranges = values[3:]
+
+        self.refreshed_at = datetime.now()
+
+        fingerprint = hash((tuple(user_shards), repr(values)))
+        if fingerprint == self._fingerprint:
+            return False
+
+        leads = {}
+        for i in range(1, len(leads_ids)):
+            cells = _column_cells(leads_ids, i)
+            if cells:
+                status = _column_cells(leads_status, i)
+                segment = _column_cells(leads_segments, i)
+                leads[cells[0]] = [i + 1, status[0] if status else '', segment[0] if segment else '']  # останній рядок ліда перемагає
+
+        all_users = {}
+        for index, title in enumerate(user_shards):
+            users_ids, users_flags = users_ranges[2 * index], users_ranges[2 * index + 1]
+            for i in range(1, len(users_ids)):
+                cells = _column_cells(users_ids, i)
+                if cells:
+                    flags = _column_cells(users_flags, i)
+                    completed = flags[0] if len(flags) > 0 else ''
+                    status = flags[1] if len(flags) > 1 else ''
+                    all_users[cells[0]] = [i + 1, completed, status, title]
+
+        self.leads = leads
+        self.all_users = all_users
+        self._fingerprint = fingerprint
+        self.version += 1
+        return True
+
+    def status(self, telegram_id):
+        """Статус, виставлений у таблиці (Leads має пріоритет над All_Users)"""
+        key = str(telegram_id)
+        lead = self.leads.get(key)
+        if lead and lead[1] not in OPEN_STATUSES:
+            return lead[1]
+        user = self.all_users.get(key)
+        if user:
+            return user[2]
+        return lead[1] if lead else None
+
+    def note_status(self, telegram_id, status):
+        """Write-through: ми самі змінили статус, не чекаючи наступного оновлення"""
+        key = str(telegram_id)
+        if key in self.leads:
+            self.leads[key][1] = status
+        if key in self.all_users:
+            self.all_users[key][2] = status
+
+async def refresh_status_cache(context: ContextTypes.DEFAULT_TYPE):
+    """Job: оновлює кеш статусів, не блокуючи event loop"""
+    t = tenant()
+    if t.sheets is None:
+        return
+    cache = t.status_cache
+    try:
+        changed = await t.sheets_breaker.call(cache.load, t.sheets)
+        if changed:
+            logger.info(f"🗂 Кеш статусів{tenant_label(t)} оновлено (v{cache.version}: "
+                        f"{len(cache.leads)} лідів, {len(cache.all_users)} користувачів)")
+    except Exception as e:
+        logger.error(f"❌ Помилка оновлення кешу статусів: {e}")
+
+def effective_status(telegram_id, lead):
+    """Статус для нагадувань: ручний статус менеджера з таблиці важливіший за локальний"""
+    local = lead.status if lead else 'new'
+    remote = tenant().status_cache.status(telegram_id)
+    if remote and remote not in OPEN_STATUSES:
+        return remote
+    return local
+
+# =====================================================
+# ОБ'ЄДНАННЯ ОНОВЛЕНЬ СТАТУСІВ (BATCH UPDATE)
+# =====================================================
+# Замість find + update_cell на кожну зміну (finalize: "Так" у колонці 6,
+# book_consultation: "scheduled" у колонці 7) зміни накопичуються, повтори
+# тієї ж клітинки зливаються, а сусідні клітинки рядка стають одним діапазоном.
+# Рядки беруться з кешу статусів і звіряються одним batchGet по колонці B.
+
+STATUS_VERIFY_MAX_CELLS = 100  # більше - дешевше прочитати колонку B цілком
+
+class StatusCoalescer:
+    """Накопичує зміни клітинок All_Users / Leads і пише їх одним batch_update"""
+
+    def __init__(self, status_cache, shards):
+        self.status_cache = status_cache
+        self.shards = shards
+        self.pending = OrderedDict()   # (лист, telegram_id, колонка) -> значення
+        self.stats = {'cells': 0, 'merged': 0, 'ranges': 0, 'flushes': 0, 'unresolved': 0}
+
+    def add(self, sheet, telegram_id, col, value):
+        key = (sheet, str(telegram_id), col)
+        if key in self.pending:
+            self.stats['merged'] += 1
+            self.pending.move_to_end(key)
+        self.pending[key] = value
+
+    def _cached_location(self, sheet, key):
+        """(назва листа/шарда, рядок) з кешу статусів або None"""
+        if sheet == 'Leads':
+            cached = self.status_cache.leads.get(key)
+            return ('Leads', cached[0]) if cached else None
+        cached = self.status_cache.all_users.get(key)
+        return (cached[3], cached[0]) if cached else None
+
+    def _titles(self, sheet):
+        return self.shards.readable(sheet) if sheet in SHARDED_SHEETS else [sheet]
+
+    def _column_plan(self, sheet, ids):
+        sheets_client = lazy_import('sheets_client')
+        return [(sheets_client.a1(title, 'B:B'), ('column', sheet, title, ids)) for title in self._titles(sheet)]
+
+    async def _resolve_rows(self, sheets):
+        """(лист, telegram_id) -> (шард, рядок): кеш + одна перевірка батчем"""
+        sheets_client = lazy_import('sheets_client')
+        wanted = {}
+        for sheet, telegram_id, _ in self.pending:
+            wanted.setdefault(sheet, set()).add(telegram_id)
+
+        plans = []
+        for sheet, ids in wanted.items():
+            locations = {key: self._cached_location(sheet, key) for key in ids}
+            if all(locations.values()) and len(locations) <= STATUS_VERIFY_MAX_CELLS:
+                # Звіряємо клітинки B<рядок>: менеджер міг посортувати чи видалити рядки
+                for key, (title, row) in locations.items():
+                    plans.append((sheets_client.a1(title, f"B{row}"), ('verify', sheet, (title, row), key)))
+            else:
+                plans += self._column_plan(sheet, ids)
+
+        resolved = {}
+        stale = set()
+        values = await sheets.values_batch_get([range_a1 for range_a1, _ in plans])
+        for column, (_, (kind, sheet, where, ids)) in zip(values, plans):
+            if kind == 'verify':
+                if column and column[0] and column[0][0] == ids:
+                    resolved[(sheet, ids)] = where
+                else:
+                    stale.add(sheet)
+            else:
+                for number, cells in enumerate(column, start=1):
+                    if cells and cells[0] in ids:
+                        resolved[(sheet, cells[0])] = (where, number)
+
+        if stale:
+            # Кеш застарів - перечитуємо колонки всіх шардів цих листів
+            plans = []
+            for sheet in stale:
+                plans += self._column_plan(sheet, wanted[sheet])
+            values = await sheets.values_batch_get([range_a1 for range_a1, _ in plans])
+            for column, (_, (_, sheet, title, ids)) in zip(values, plans):
+                for number, cells in enumerate(column, start=1):
+                    if cells and cells[0] in ids:
+                        resolved[(sheet, cells[0])] = (title, number)
+        return resolved
+
+    async def flush(self, sheets):
+        """Всі накопичені зміни - одним values.batchUpdate"""
+        if not self.pending:
+            return 0
+        sheets_client = lazy_import('sheets_client')
+        pending = OrderedDict(self.pending)
+        rows = await self._resolve_rows(sheets)
+
+        cells = {}  # (шард, рядок) -> {колонка: значення}
+        for (sheet, telegram_id, col), value in pending.items():
+            location = rows.get((sheet, telegram_id))
+            if location is None:
+                self.stats['unresolved'] += 1
+                logger.warning(f"⚠️ {sheet}: користувача {telegram_id} немає в таблиці, статус не записано")
+                continue
+            cells.setdefault(location, {})[col] = value
+
+        data = []
+        for (sheet, row), columns in cells.items():
+            # Сусідні колонки рядка -> один діапазон (F12:G12)
+            ordered = sorted(columns)
+            start = ordered[0]
+            for index, col in enumerate(ordered):
+                last = index == len(ordered) - 1
+                if last or ordered[index + 1] != col + 1:
+                    cells_range = f"{sheets_client.column_letter(start)}{row}:{sheets_client.column_letter(col)}{row}"
+                    data.append({
+                        'range': sheets_client.a1(sheet, cells_range),
+                        'values': [[columns[c] for c in range(start, col + 1)]],
+                    })
+                    if not last:
+                        start = ordered[index + 1]
+
+        await sheets.batch_update(data)
+
+        # Записане прибираємо (нові зміни, що прийшли під час запиту, лишаються)
+        for key, value in pending.items():
+            if self.pending.get(key) == value:
+                del self.pending[key]
+        self.stats['cells'] += len(pending)
+        self.stats['ranges'] += len(data)
+        self.stats['flushes'] += 1
+        return len(data)
+
+    def snapshot(self):
+        return {'pending': len(self.pending), **self.stats}
+
+# =====================================================
+# ІНДЕКС ТЕЛЕФОНІВ (ДУБЛІКАТИ ЛІДІВ)
+# =====================================================
+
+async def _read_lead_phones(sheets):
+    sheets_client = lazy_import('sheets_client')
+    ids, phones = await sheets.values_batch_get([sheets_client.a1('Leads', 'B2:B'), sheets_client.a1('Leads', 'E2:E')])
+    return [
+        (row_ids[0], row_phones[0])
+        for row_ids, row_phones in zip(ids, phones)
+        if row_ids and row_phones
+    ]
+
+async def load_phone_index(context: ContextTypes.DEFAULT_TYPE):
+    """Job (один раз при старті): завантажує телефони з Leads в індекс"""
+    t = tenant()
+    if t.sheets is None:
+        return
+    try:
+        pairs = await t.sheets_breaker.call(_read_lead_phones, t.sheets)
+        loaded = t.phone_index.bulk_load(pairs)
+        logger.info(f"📱 Індекс телефонів{tenant_label(t)}: {loaded} номерів")
     except Exception as e:
-        logger.error(f"❌ Помилка збереження користувача: {e}")
+        logger.error(f"❌ Помилка завантаження індексу телефонів: {e}")
 
 # =====================================================
 # WEB-СЕРВЕР ДЛЯ RENDER (ЩОБ НЕ ЗАСИНАВ)
 # =====================================================
 
-app = Flask(__name__)
+# Службові маршрути (/, /health, /metrics, /debug/memory) однакові в обох
+# режимах: у polling їх віддає Flask у окремому потоці, у webhook - tornado
+# (залежність PTB[webhooks]) на тому ж порту, що й /telegram, без Flask
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET') or None
+DEBUG_TOKEN = os.environ.get('DEBUG_TOKEN', '')  # без нього /debug/* вимкнені
+PORT = int(os.environ.get('PORT', 10000))
 
-@app.route('/')
-def home():
+def http_home():
     return "✅ Divorce Bot v3.1 is running!", 200
 
-@app.route('/health')
-def health():
-    return {"status": "ok", "bot": "running", "version": "3.1"}, 200
+def http_health():
+    breakers = {name: breaker.state for name, breaker in BREAKERS.items()}
+    status = "ok" if all(state == CircuitBreaker.CLOSED for state in breakers.values()) else "degraded"
+    return {"status": status, "bot": "running", "version": "3.1", "breakers": breakers}, 200
+
+def http_metrics():
+    # Ключі sheets / status_updates / catalog - першого тенанта (як до тенантів), решта - в "tenants"
+    primary = tenant_snapshot(TENANTS[0])
+    return {
+        "breakers": {name: breaker.snapshot() for name, breaker in BREAKERS.items()},
+        "journal": {**JOURNAL.snapshot(), "replay": replay_snapshot()},
+        "sheets": primary['sheets'],
+        "status_updates": primary['status_updates'],
+        "updates": UPDATE_PROCESSOR.snapshot() if UPDATE_PROCESSOR else None,
+        "throttle": {name: limiter.snapshot() for name, limiter in LIMITERS.items()},
+        "catalog": primary['catalog'],
+        "user_state": {**USER_STATE_STATS, 'in_memory': sum(len(t.user_last_seen) for t in TENANTS)},
+        "trace": TRACE_RECORDER.snapshot() if TRACE_RECORDER else None,
+        "shedding": SHEDDER.snapshot(),
+        "telegram_pools": TELEGRAM_POOLS.snapshot() if TELEGRAM_POOLS else None,
+        "tenants": {t.name: tenant_snapshot(t) for t in TENANTS} if len(TENANTS) > 1 else None,
+    }, 200
+
+def debug_allowed(token):
+    return bool(DEBUG_TOKEN) and token == DEBUG_TOKEN
+
+def create_flask_app():
+    """Flask-додаток для health-check (polling-режим)"""
+    flask = lazy_import('flask')
+    app = flask.Flask(__name__)
+
+    @app.route('/')
+    def home():
+        return http_home()
+
+    @app.route('/health')
+    def health():
+        return http_health()
+
+    @app.route('/metrics')
+    def metrics():
+        return http_metrics()
+
+    @app.route('/debug/memory')
+    def debug_memory():
+        request = flask.request
+        if not debug_allowed(request.args.get('token')):
+            return {"error": "not found"}, 404
+        if APPLICATION is None:
+            return {"error": "bot is starting"}, 503
+        # Обхід структур виконується в потоці event loop-а
+        future = asyncio.run_coroutine_threadsafe(
+            build_memory_report(APPLICATION, diff=request.args.get('diff') == '1'), MAIN_LOOP
+        )
+        return future.result(timeout=30), 200
+
+    return app
 
 def run_flask():
     """Запуск Flask в окремому потоці"""
-    port = int(os.environ.get('PORT', 10000))
-    app.run(host='0.0.0.0', port=port, debug=False, use_reloader=False)
+    app = create_flask_app()
+    app.run(host='0.0.0.0', port=PORT, debug=False, use_reloader=False)
+
+def create_webhook_app(application):
+    """tornado-додаток webhook-режиму: /telegram (апдейти в чергу PTB) + службові маршрути"""
+    tornado_web = lazy_import('tornado.web')
+
+    class Handler(tornado_web.RequestHandler):
+        def reply(self, body, status):
+            self.set_status(status)
+            if isinstance(body, dict):
+                self.set_header('Content-Type', 'application/json')
+                body = json.dumps(body, ensure_ascii=False, default=str)
+            self.finish(body)
+
+        def log_exception(self, typ, value, tb):
+            logger.error(f"❌ HTTP {self.request.path}: {typ.__name__}: {value}")
+
+    class RouteHandler(Handler):
+        def initialize(self, route):
+            self.route = route
+
+        def get(self):
+            self.reply(*self.route())
+
+    class MemoryHandler(Handler):
+        async def get(self):
+            if not debug_allowed(self.get_query_argument('token', None)):
+                return self.reply({"error": "not found"}, 404)
+            # Той самий event loop - обхід структур без run_coroutine_threadsafe
+            self.reply(await build_memory_report(application, diff=self.get_query_argument('diff', None) == '1'), 200)
+
+    class TelegramHandler(Handler):
+        async def post(self):
+            if WEBHOOK_SECRET and self.request.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+                return self.reply({"error": "forbidden"}, 403)
+            try:
+                update = Update.de_json(json.loads(self.request.body), application.bot)
+            except ValueError:
+                return self.reply({"error": "bad request"}, 400)
+            await application.update_queue.put(update)
+            self.reply("", 200)
+
+    return tornado_web.Application([
+        (r"/telegram/?", TelegramHandler),
+        (r"/", RouteHandler, {'route': http_home}),
+        (r"/health", RouteHandler, {'route': http_health}),
+        (r"/metrics", RouteHandler, {'route': http_metrics}),
+        (r"/debug/memory", MemoryHandler),
+    ], log_function=lambda handler: None)
+
+# Сегменти: ключ каталогу -> код, назва, бюджет, строки.
+# Ціни та назви можна перевизначити у файлі каталогу (CATALOG_PATH) без рестарту.
+SEGMENTS = {
+    'D1': {'code': 'D1', 'name': '🌍 Міжнародне розлучення (VIP)', 'cost': '18 000 — 26 000 грн', 'time': '4-5 місяців'},
+    'D2': {'code': 'D2', 'name': '🌍 Міжнародне розлучення (Стандарт)', 'cost': '14 000 — 20 000 грн', 'time': '4-6 місяців'},
+    'E2': {'code': 'E2', 'name': '🔍 Розлучення з розшуком', 'cost': '16 000 — 24 000 грн', 'time': '6-9 місяців'},
+    'E1': {'code': 'E1', 'name': '🔍 Розлучення без адреси', 'cost': '12 000 — 16 000 грн', 'time': '5-7 місяців'},
+    'C1_CHILDREN': {'code': 'C1', 'name': '💼 Комплексний майновий спір', 'cost': '25 000 — 50 000+ грн', 'time': '8-16 місяців'},
+    'C1': {'code': 'C1', 'name': '💰 Судовий поділ майна', 'cost': '18 000 — 30 000 грн', 'time': '6-10 місяців'},
+    'C2_PEACE': {'code': 'C2_PEACE', 'name': '🤝 Оформлення поділу майна', 'cost': '10 000 — 16 000 грн', 'time': '3-5 місяців'},
+    'B1': {'code': 'B1', 'name': '🛡 Судовий спір за дітей', 'cost': '14 000 — 22 000 грн', 'time': '5-8 місяців'},
+    'B2': {'code': 'B2', 'name': '👨‍👩‍👧 Мирне розлучення з дітьми', 'cost': '8 000 — 12 000 грн', 'time': '3-4 місяці'},
+    'A1': {'code': 'A1', 'name': '⚡️ Експрес-розлучення', 'cost': '5 500 — 7 500 грн', 'time': '2-3 місяці'},
+    'A2': {'code': 'A2', 'name': '✅ Стандартне розлучення', 'cost': '4 500 — 6 500 грн', 'time': '3-4 місяці'},
+}
 
 def determine_segment(user_data):
     """
@@ -227,45 +1355,46 @@ def determine_segment(user_data):
     spouse_location = user_data.get('spouse_location')
     urgency = user_data.get('urgency')
     spouse_consent = user_data.get('spouse_consent')
+    catalog = tenant().catalog
 
     # 1. ЗА КОРДОНОМ (D)
     if spouse_location == 'abroad':
         if urgency == 'high':
-            return ('D1', '🌍 Міжнародне розлучення (VIP)', '18 000 — 26 000 грн', '4-5 місяців')
-        return ('D2', '🌍 Міжнародне розлучення (Стандарт)', '14 000 — 20 000 грн', '4-6 місяців')
+            return catalog.segment('D1')
+        return catalog.segment('D2')
     
     # 2. НЕВІДОМЕ МІСЦЕ (E) - ✅ ВИПРАВЛЕНО ТУТ
     if spouse_location == 'unknown':
         # Якщо немає згоди — це саботаж (E2)
         if spouse_consent == 'no':
-            return ('E2', '🔍 Розлучення з розшуком', '16 000 — 24 000 грн', '6-9 місяців')
+            return catalog.segment('E2')
         # Якщо згода є або невідома — це просто суд без адреси (E1, дешевше)
-        return ('E1', '🔍 Розлучення без адреси', '12 000 — 16 000 грн', '5-7 місяців')
+        return catalog.segment('E1')
 
     # 3. МАЙНО (C) - ТЕПЕР РОЗУМНЕ!
     if property_dispute:
         if conflict_property:
             # Є конфлікт -> Дорого
             if has_children:
-                return ('C1', '💼 Комплексний майновий спір', '25 000 — 50 000+ грн', '8-16 місяців')
+                return catalog.segment('C1_CHILDREN')
             else:
-                return ('C1', '💰 Судовий поділ майна', '18 000 — 30 000 грн', '6-10 місяців')
+                return catalog.segment('C1')
         else:
             # Майно є, але конфлікту немає -> Дешевше (Твій випадок!)
-            return ('C2_PEACE', '🤝 Оформлення поділу майна', '10 000 — 16 000 грн', '3-5 місяців')
+            return catalog.segment('C2_PEACE')
 
     # 4. ДІТИ (B)
     if has_children:
         if conflict_children:
-            return ('B1', '🛡 Судовий спір за дітей', '14 000 — 22 000 грн', '5-8 місяців')
+            return catalog.segment('B1')
         else:
-            return ('B2', '👨‍👩‍👧 Мирне розлучення з дітьми', '8 000 — 12 000 грн', '3-4 місяці')
+            return catalog.segment('B2')
 
     # 5. ПРОСТІ (A)
     if urgency == 'high':
-        return ('A1', '⚡️ Експрес-розлучення', '5 500 — 7 500 грн', '2-3 місяці')
+        return catalog.segment('A1')
     
-    return ('A2', '✅ Стандартне розлучення', '4 500 — 6 500 грн', '3-4 місяці')
+    return catalog.segment('A2')
 
 # =====================================================
 # 📝 ПОКРАЩЕНІ ТЕКСТИ ДЛЯ КОРИСТУВАЧА
@@ -455,29 +1584,29 @@ def get_mini_case(user_data):
     
     # Пріоритет 1: За кордоном
     if spouse_location == 'abroad':
-        cases = MINI_CASES['abroad']
+        key = 'abroad'
         
     # Пріоритет 2: Невідоме місце
     elif spouse_location == 'unknown':
-        cases = MINI_CASES['unknown_location']
+        key = 'unknown_location'
         
     # Пріоритет 3: Є майно
     elif property_dispute == 'yes':
-        cases = MINI_CASES['yes_property']
+        key = 'yes_property'
         
     # Пріоритет 4: Є діти + немає згоди
     elif has_children and spouse_consent == 'no':
-        cases = MINI_CASES['yes_children_no_consent']
+        key = 'yes_children_no_consent'
         
     # Пріоритет 5: Немає дітей + є згода
     elif not has_children and spouse_consent == 'yes':
-        cases = MINI_CASES['no_children_yes_consent']
+        key = 'no_children_yes_consent'
         
     # Дефолтний
     else:
-        cases = MINI_CASES['default']
+        key = 'default'
     
-    return random.choice(cases)
+    return tenant().catalog.mini_case(key)
 
 DISCLAIMER_TEXT = "\n\n⚠️ <i>Це середньоринковий орієнтир. Точна вартість залежить від кваліфікації конкретного адвоката.</i>"
 
@@ -499,7 +1628,7 @@ SEGMENT_MESSAGES = {
 <b>Що входить у цей бюджет:</b>
 • Сплата судового збору
 • Контроль справи (щоб не "загубилася" в канцелярії)
-• Отримання рішення суду""" + DISCLAIMER_TEXT,
+• Отримання рішення суду{disclaimer}""",
 
     'A2': """✅ <b>Тип справи: {segment_name}</b>
 
@@ -514,7 +1643,7 @@ SEGMENT_MESSAGES = {
 
 <b>Критерії вибору:</b>
 • Фіксована ціна (без доплат за кожне засідання)
-• Робота без вашої присутності""" + DISCLAIMER_TEXT,
+• Робота без вашої присутності{disclaimer}""",
 
     'B1': """🛡 <b>Тип справи: {segment_name}</b>
 
@@ -530,7 +1659,7 @@ SEGMENT_MESSAGES = {
 <b>На що піде бюджет:</b>
 • Органи опіки (підготовка висновків)
 • Участь у 3-5 судових засіданнях
-• Аліментна стратегія""" + DISCLAIMER_TEXT,
+• Аліментна стратегія{disclaimer}""",
 
     'B2': """👨‍👩‍👧 <b>Тип справи: {segment_name}</b>
 
@@ -546,7 +1675,7 @@ SEGMENT_MESSAGES = {
 
 <b>Перевага:</b>
 • Гарантовані аліменти
-• Швидший розгляд""" + DISCLAIMER_TEXT,
+• Швидший розгляд{disclaimer}""",
 
     'C1': """💼 <b>Тип справи: {segment_name}</b>
 
@@ -562,7 +1691,7 @@ SEGMENT_MESSAGES = {
 
 <b>Вимоги до адвоката:</b>
 • Досвід у справах від 1 млн грн
-• Стратегія захисту активів""" + DISCLAIMER_TEXT,
+• Стратегія захисту активів{disclaimer}""",
 
     'C2': """💰 <b>Тип справи: {segment_name}</b>
 
@@ -577,15 +1706,15 @@ SEGMENT_MESSAGES = {
 
 <b>Стратегія:</b>
 • Оцінка активів
-• Мінімізація податків""" + DISCLAIMER_TEXT,
+• Мінімізація податків{disclaimer}""",
 
 
     'C2_PEACE': """🤝 <b>Тип справи: Юридичне оформлення поділу майна</b>
 
 Ви домовилися — це супер. Залишилося обрати найдешевший шлях оформлення, щоб потім ніхто не "передумав".
 
-💰 <b>Бюджет:</b> 10 000 — 16 000 грн
-⏱ <b>Строки:</b> 3-5 місяців
+💰 <b>Бюджет:</b> {cost}
+⏱ <b>Строки:</b> {time}
 
 <b>💡 Аналітика OPORA:</b>
 Є два шляхи: Нотаріус або "Мирний суд".
@@ -610,7 +1739,7 @@ SEGMENT_MESSAGES = {
 <b>Що входить:</b>
 • Консульські нюанси
 • Апостиль документів
-• Суд без візиту в Україну""" + DISCLAIMER_TEXT,
+• Суд без візиту в Україну{disclaimer}""",
 
     'D2': """🌍 <b>Тип справи: {segment_name}</b>
 
@@ -625,7 +1754,7 @@ SEGMENT_MESSAGES = {
 
 <b>Перевага:</b>
 • Вам не треба приїжджати
-• Все контролюється через Telegram""" + DISCLAIMER_TEXT,
+• Все контролюється через Telegram{disclaimer}""",
 
     'E1': """🔍 <b>Тип справи: {segment_name}</b>
 
@@ -640,7 +1769,7 @@ SEGMENT_MESSAGES = {
 
 <b>Результат:</b>
 • Офіційне рішення суду
-• Без розшуку поліцією""" + DISCLAIMER_TEXT,
+• Без розшуку поліцією{disclaimer}""",
 
     'E2': """🔍 <b>Тип справи: {segment_name}</b>
 
@@ -655,11 +1784,10 @@ SEGMENT_MESSAGES = {
 
 <b>Вимоги:</b>
 • Наполегливість
-• Контроль кожного засідання""" + DISCLAIMER_TEXT
+• Контроль кожного засідання{disclaimer}"""
 }
 
-def get_consultation_booked_text(first_name, phone):
-    return f"""
+CONSULTATION_BOOKED_TEXT = """
 ✅ <b>Замовлення прийнято, {first_name}!</b>
 
 Ми зафіксували за вами акційну ціну — <b>199 грн</b>.
@@ -682,13 +1810,549 @@ TEXT_PHONE_REMINDER = """
 Це абсолютно безпечно і потрібно лише для того, щоб відправити вам результат.
 """
 
+# Новий текст: Сервісний, допомагаючий (після нього нагадування повторює питання кроку)
 TEXT_QUIZ_REMINDER = """
-👋 Здається, ви відволіклися...
+👋 <b>Ви не завершили діагностику...</b>
+
+Ми зупинилися на важливому етапі. Без відповідей на останні питання ми не зможемо розрахувати точний бюджет та підібрати стратегію.
+
+👇 <b>Дайте відповідь на питання нижче, щоб продовжити з місця зупинки.
+Або натисніть /start, щоб почати спочатку</b>
+"""
+
+# =====================================================
+# КАТАЛОГ КОНТЕНТУ ТА ЦІН
+# =====================================================
+# Тексти та ціни вище - вбудовані дефолти. Файл каталогу тенанта (JSON;
+# у default - CATALOG_PATH) може перевизначити будь-яку їх частину, і зміна
+# підхоплюється без рестарту: user_data та нагадування в JobQueue не губляться.
+
+CATALOG_POLL = int(os.environ.get('CATALOG_POLL', 30))  # секунд між перевірками файлу
+
+CATALOG_DEFAULTS = {
+    'segments': SEGMENTS,
+    'results': SEGMENT_MESSAGES,
+    'fallback_result': 'B2',
+    'disclaimer': DISCLAIMER_TEXT,
+    'mini_cases': MINI_CASES,
+    'texts': {
+        'TEXT_WELCOME': TEXT_WELCOME,
+        'TEXT_Q1': TEXT_Q1,
+        'TEXT_Q1_CLARIFY': TEXT_Q1_CLARIFY,
+        'TEXT_Q2': TEXT_Q2,
+        'TEXT_Q3': TEXT_Q3,
+        'TEXT_Q3_CLARIFY': TEXT_Q3_CLARIFY,
+        'TEXT_Q4': TEXT_Q4,
+        'TEXT_Q5': TEXT_Q5,
+        'TEXT_Q6_PHONE': TEXT_Q6_PHONE,
+        'TEXT_PHONE_REMINDER': TEXT_PHONE_REMINDER,
+        'TEXT_QUIZ_REMINDER': TEXT_QUIZ_REMINDER,
+    },
+    'booked': CONSULTATION_BOOKED_TEXT,
+}
+
+# Скомпільований каталог - tenant.catalog. Замінюється лише цілком (одним
+# присвоєнням), тому обробник, що вже взяв каталог, дочитує тексти з тієї ж версії
+CATALOG_LOCK = asyncio.Lock()
+
+async def reload_catalog(force=False):
+    """
+    Перечитує файл каталогу поточного тенанта, якщо він змінився (force - завжди).
+    Перевірка і компіляція - в executor-і. True - каталог замінено.
+    Помилка в файлі - CatalogError, у роботі лишається попередній каталог.
+    """
+    t = tenant()
+    catalog = lazy_import('catalog')
+    async with CATALOG_LOCK:
+        stamp = catalog.file_stamp(t.catalog_path)
+        if not force and t.catalog is not None and stamp == t.catalog_stamp:
+            return False
+        loop = asyncio.get_running_loop()
+        try:
+            compiled = await loop.run_in_executor(None, catalog.load_catalog, t.catalog_path, CATALOG_DEFAULTS)
+        except Exception as e:
+            t.catalog_stamp = stamp  # той самий зламаний файл не перечитуємо кожні CATALOG_POLL секунд
+            logger.error(f"❌ Каталог {t.catalog_path}: {e}")
+            if t.catalog is None:
+                t.catalog = catalog.load_catalog(None, CATALOG_DEFAULTS)
+                logger.warning(f"⚠️ Каталог{tenant_label(t)}: працюємо на вбудованих текстах")
+            if isinstance(e, catalog.CatalogError):
+                raise
+            raise catalog.CatalogError(str(e)) from e
+        t.catalog, t.catalog_stamp = compiled, stamp
+    logger.info(f"📚 Каталог{tenant_label(t)} v{compiled.version} ({compiled.source}): {len(compiled.segments)} сегментів")
+    return True
+
+async def watch_catalog(context: ContextTypes.DEFAULT_TYPE):
+    """Job: підхоплює зміну файлу каталогу"""
+    try:
+        await reload_catalog()
+    except lazy_import('catalog').CatalogError:
+        pass  # вже в логах
+
+# =====================================================
+# СТАН КВІЗУ (FSM)
+# =====================================================
+# Весь стан квізу користувача - одне ціле число в user_data['quiz']:
+#   біти 0-13  - відповіді (по 2 біти на поле, 0 = ще немає відповіді)
+#   біти 14-17 - id поточного кроку
+
+QS_IDLE = 0
+QS_Q1 = 1
+QS_Q1_CLARIFY = 2
+QS_Q2 = 3
+QS_Q3 = 4
+QS_Q3_CLARIFY = 5
+QS_Q4 = 6
+QS_Q5 = 7
+QS_PHONE = 8
+QS_DONE = 9
+
+QUIZ_STATE_SHIFT = 14
+QUIZ_ANSWERS_MASK = (1 << QUIZ_STATE_SHIFT) - 1
+
+# Поле -> (зсув у бітовому полі, можливі значення; код = індекс + 1)
+QUIZ_FIELDS = {
+    'has_children': (0, ('yes', 'no')),
+    'conflict_children': (2, ('yes', 'no')),
+    'spouse_consent': (4, ('yes', 'no', 'unknown')),
+    'property_dispute': (6, ('yes', 'no')),
+    'conflict_property': (8, ('yes', 'no')),
+    'spouse_location': (10, ('ukraine', 'abroad', 'unknown')),
+    'urgency': (12, ('high', 'medium', 'low')),
+}
+
+def _quiz_bits(field, value):
+    shift, values = QUIZ_FIELDS[field]
+    return (values.index(value) + 1) << shift
+
+def _quiz_transition(next_state, *answers):
+    """(наступний крок, OR-маска відповідей) - рахується один раз при імпорті"""
+    bits = 0
+    for field, value in answers:
+        bits |= _quiz_bits(field, value)
+    return next_state, bits
+
+# callback_data кнопок - "крок:відповідь" (до 64 байт, ліміт Telegram).
+# Крок визначає обробник, відповідь передається обробнику вже розібраною.
+CB_START_QUIZ = 'quiz:start'
+CB_RESTART_QUIZ = 'quiz:restart'  # кнопка з розсилки: квіз заново з будь-якого кроку
+CB_BOOK = 'lead:book'
+CB_SUPPORT = 'lead:support'
+
+# (поточний крок, callback_data) -> (наступний крок, біти відповідей)
+QUIZ_TRANSITIONS = {
+    (QS_IDLE, CB_START_QUIZ): _quiz_transition(QS_Q1),
+    (QS_Q1, 'q1:yes'): _quiz_transition(QS_Q1_CLARIFY, ('has_children', 'yes')),
+    (QS_Q1, 'q1:no'): _quiz_transition(QS_Q2, ('has_children', 'no'), ('conflict_children', 'no')),
+    (QS_Q1_CLARIFY, 'q1c:peace'): _quiz_transition(QS_Q2, ('conflict_children', 'no')),
+    (QS_Q1_CLARIFY, 'q1c:conflict'): _quiz_transition(QS_Q2, ('conflict_children', 'yes')),
+    (QS_Q2, 'q2:yes'): _quiz_transition(QS_Q3, ('spouse_consent', 'yes')),
+    (QS_Q2, 'q2:no'): _quiz_transition(QS_Q3, ('spouse_consent', 'no')),
+    (QS_Q2, 'q2:unknown'): _quiz_transition(QS_Q3, ('spouse_consent', 'unknown')),
+    (QS_Q3, 'q3:yes'): _quiz_transition(QS_Q3_CLARIFY, ('property_dispute', 'yes')),
+    (QS_Q3, 'q3:no'): _quiz_transition(QS_Q4, ('property_dispute', 'no'), ('conflict_property', 'no')),
+    (QS_Q3_CLARIFY, 'q3c:peace'): _quiz_transition(QS_Q4, ('conflict_property', 'no')),
+    (QS_Q3_CLARIFY, 'q3c:conflict'): _quiz_transition(QS_Q4, ('conflict_property', 'yes')),
+    (QS_Q4, 'q4:ukraine'): _quiz_transition(QS_Q5, ('spouse_location', 'ukraine')),
+    (QS_Q4, 'q4:abroad'): _quiz_transition(QS_Q5, ('spouse_location', 'abroad')),
+    (QS_Q4, 'q4:unknown'): _quiz_transition(QS_Q5, ('spouse_location', 'unknown')),
+    (QS_Q5, 'q5:high'): _quiz_transition(QS_PHONE, ('urgency', 'high')),
+    (QS_Q5, 'q5:medium'): _quiz_transition(QS_PHONE, ('urgency', 'medium')),
+    (QS_Q5, 'q5:low'): _quiz_transition(QS_PHONE, ('urgency', 'low')),
+}
+
+# Кнопки кожного кроку: по ним же квіз відновлюється після нагадування
+QUIZ_BUTTONS = {
+    QS_Q1: (("👶 Так, є діти", 'q1:yes'), ("❌ Немає дітей", 'q1:no')),
+    QS_Q1_CLARIFY: (("🤝 Домовилися (Мирно)", 'q1c:peace'), ("⚔️ Є суперечки", 'q1c:conflict')),
+    QS_Q2: (("✅ Так, згоден/на", 'q2:yes'), ("❌ Ні, проти", 'q2:no'), ("🤷 Не знаю", 'q2:unknown')),
+    QS_Q3: (("🏠 Так, є майно", 'q3:yes'), ("❌ Немає майна", 'q3:no')),
+    QS_Q3_CLARIFY: (("🤝 Вже поділили / Домовилися", 'q3c:peace'), ("⚔️ Є конфлікт / Не ділиться", 'q3c:conflict')),
+    QS_Q4: (("🇺🇦 Ми обоє в Україні", 'q4:ukraine'), ("✈️ Хтось із нас за кордоном", 'q4:abroad'), ("❓ Не знаю де чоловік/дружина", 'q4:unknown')),
+    QS_Q5: (("⚡️ Дуже терміново (2-3 міс)", 'q5:high'), ("⏳ Можу почекати (4-6 міс)", 'q5:medium'), ("🤷 Не критично", 'q5:low')),
+}
+
+# Старі callback_data (кнопки в уже надісланих повідомленнях) -> нові
+LEGACY_CALLBACKS = {
+    'start_quiz': CB_START_QUIZ,
+    'restart_quiz': CB_RESTART_QUIZ,
+    'book_consultation': CB_BOOK,
+    'contact_support': CB_SUPPORT,
+    'q1_yes': 'q1:yes',
+    'q1_no': 'q1:no',
+    'q1_sub_peace': 'q1c:peace',
+    'q1_sub_conflict': 'q1c:conflict',
+    'q2_yes': 'q2:yes',
+    'q2_no': 'q2:no',
+    'q2_unknown': 'q2:unknown',
+    'q3_yes': 'q3:yes',
+    'q3_no': 'q3:no',
+    'q3_sub_peace': 'q3c:peace',
+    'q3_sub_conflict': 'q3c:conflict',
+    'q4_ukraine': 'q4:ukraine',
+    'q4_abroad': 'q4:abroad',
+    'q4_unknown': 'q4:unknown',
+    'q5_high': 'q5:high',
+    'q5_medium': 'q5:medium',
+    'q5_low': 'q5:low',
+}
 
-Ми зупинилися на півдорозі до розрахунку вартості. Бажаєте продовжити?
+def canonical_callback(data):
+    return LEGACY_CALLBACKS.get(data, data)
+
+# Крок квізу -> назва його тексту в каталозі
+QUIZ_TEXTS = {
+    QS_Q1: 'TEXT_Q1',
+    QS_Q1_CLARIFY: 'TEXT_Q1_CLARIFY',
+    QS_Q2: 'TEXT_Q2',
+    QS_Q3: 'TEXT_Q3',
+    QS_Q3_CLARIFY: 'TEXT_Q3_CLARIFY',
+    QS_Q4: 'TEXT_Q4',
+    QS_Q5: 'TEXT_Q5',
+}
+
+def quiz_state(user_data):
+    """Поточний крок квізу (None, якщо стан втрачено, напр. після рестарту)"""
+    packed = user_data.get('quiz')
+    if packed is None:
+        return None
+    return packed >> QUIZ_STATE_SHIFT
+
+def quiz_reset(user_data):
+    user_data['quiz'] = QS_IDLE << QUIZ_STATE_SHIFT
+
+def quiz_set_state(user_data, state):
+    packed = user_data.get('quiz', 0)
+    user_data['quiz'] = (state << QUIZ_STATE_SHIFT) | (packed & QUIZ_ANSWERS_MASK)
+
+def quiz_apply(user_data, data):
+    """
+    Перевіряє та застосовує перехід по натиснутій кнопці за O(1).
+    Повертає False для недопустимого переходу (подвійний тап, стара кнопка).
+    Без стану квіз не почато: приймається лише кнопка старту.
+    """
+    packed = user_data.get('quiz', QS_IDLE << QUIZ_STATE_SHIFT)
+    transition = QUIZ_TRANSITIONS.get((packed >> QUIZ_STATE_SHIFT, data))
+    if transition is None:
+        return False
+
+    next_state, bits = transition
+    answers = (packed & QUIZ_ANSWERS_MASK) | bits
+    user_data['quiz'] = (next_state << QUIZ_STATE_SHIFT) | answers
+    return True
+
+def quiz_answers(user_data):
+    """Розпаковує відповіді у звичний dict ('has_children': 'yes', ...)"""
+    packed = user_data.get('quiz', 0)
+    answers = {}
+    for field, (shift, values) in QUIZ_FIELDS.items():
+        code = (packed >> shift) & 0b11
+        if code:
+            answers[field] = values[code - 1]
+    return answers
+
+def quiz_keyboard(state):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(text, callback_data=data)] for text, data in QUIZ_BUTTONS[state]
+    ])
+
+# =====================================================
+# ЛІД (ЄДИНА СХЕМА ДЛЯ SHEETS / MAKE / АДМІНА)
+# =====================================================
+
+class Lead:
+    """Дані ліда. Створюється один раз при отриманні номера і живе в user_data['lead']"""
+
+    __slots__ = (
+        'telegram_id', 'username', 'first_name', 'last_name', 'phone_number',
+        'has_children', 'spouse_consent', 'property_dispute', 'spouse_location', 'urgency',
+        'segment', 'segment_name', 'cost_estimate', 'time_estimate', 'completed_at',
+        'repeat_of', '_status', '_row', '_payload', '_card',
+    )
+
+    def __init__(self, telegram_id, username='', first_name='Клієнт', last_name='', phone_number='',
+                 answers=None, segment='', segment_name='', cost_estimate='', time_estimate='',
+                 completed_at='', status='new'):
+        answers = answers or {}
+        self.telegram_id = telegram_id
+        self.username = username or ''
+        self.first_name = first_name
+        self.last_name = last_name
+        self.phone_number = phone_number
+        self.has_children = answers.get('has_children', '')
+        self.spouse_consent = answers.get('spouse_consent', '')
+        self.property_dispute = answers.get('property_dispute', '')
+        self.spouse_location = answers.get('spouse_location', '')
+        self.urgency = answers.get('urgency', '')
+        self.segment = segment
+        self.segment_name = segment_name
+        self.cost_estimate = cost_estimate
+        self.time_estimate = time_estimate
+        self.completed_at = completed_at
+        self.repeat_of = None  # Telegram ID першого ліда з цим же номером
+        self._status = status
+        self._row = None
+        self._payload = None
+        self._card = None
+
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, value):
+        self._status = value
+        self._row = None  # Статус є лише в рядку Sheets
+
+    def sheets_row(self):
+        """Рядок для листа Leads (порядок колонок = заголовки в init_google_sheets)"""
+        if self._row is None:
+            self._row = [
+                self.completed_at,
+                str(self.telegram_id),
+                self.username,
+                self.first_name,
+                self.phone_number,
+                self.has_children,
+                self.spouse_consent,
+                self.property_dispute,
+                self.spouse_location,
+                self.urgency,
+                self.segment,
+                self.segment_name,
+                self.cost_estimate,
+                self.time_estimate,
+                self._status,
+            ]
+        return self._row
+
+    def make_payload(self):
+        """JSON для Make.com (подія new_lead)"""
+        if self._payload is None:
+            self._payload = {
+                'event': 'new_lead',
+                'telegram_id': self.telegram_id,
+                'first_name': self.first_name,
+                'phone_number': self.phone_number,
+                'segment': self.segment,
+                'segment_name': self.segment_name,
+                'cost_estimate': self.cost_estimate,
+                'time_estimate': self.time_estimate,
+                'completed_at': self.completed_at,
+            }
+        return self._payload
+
+    def consultation_payload(self):
+        """JSON для Make.com (подія consultation_request)"""
+        return {
+            'event': 'consultation_request',
+            'telegram_id': self.telegram_id,
+            'first_name': self.first_name,
+            'phone_number': self.phone_number,
+            'segment': self.segment,
+            'segment_name': self.segment_name,
+        }
 
-Просто натисніть /start, щоб почати заново (це швидко!), або дайте відповідь на останнє запитання, якщо воно ще на екрані.
+    def admin_card(self):
+        """Карточка замовлення для адміна"""
+        if self._card is None:
+            repeat = f"\n🔁 <b>Повторний лід</b> (номер вже був від ID <code>{self.repeat_of}</code>)\n" if self.repeat_of else ""
+            self._card = f"""
+💰 <b>ЗАМОВЛЕННЯ (199 грн)!</b>
+{repeat}
+👤 <b>{self.first_name} {self.last_name}</b>
+📱 <code>{self.phone_number}</code>
+🔗 @{self.username or 'немає'}
+
+📊 <b>Сегмент: {self.segment}</b>
+└ {self.segment_name}
+
+💰 <b>Орієнтир:</b> {self.cost_estimate}
+⏱ <b>Строки:</b> {self.time_estimate}
+
+📝 <b>Відповіді:</b>
+• Діти: {self.has_children}
+• Згода: {self.spouse_consent}
+• Майно: {self.property_dispute}
+• Локація: {self.spouse_location}
+• Терміновість: {self.urgency}
+
+<i>Дзвони швидше! 🚀</i>
 """
+        return self._card
+
+def get_lead(user_data):
+    """Лід користувача або None, якщо номер ще не отримано"""
+    return user_data.get('lead')
+
+# =====================================================
+# ЗАХИСТ ВІД СПАМУ (ЛІМІТИ НА КОРИСТУВАЧА)
+# =====================================================
+# Кожен /start - це запис в All_Users та Analytics, кожен текст - повідомлення
+# адміну. Повтори понад ліміт у ковзному вікні обслуговуються локально (без
+# Sheets і без адміна), а порушники запам'ятовуються в обмеженій LRU-таблиці.
+
+START_LIMIT = int(os.environ.get('START_LIMIT', 2))              # /start із записом у Sheets
+START_WINDOW = int(os.environ.get('START_WINDOW', 600))
+TEXT_LIMIT = int(os.environ.get('TEXT_LIMIT', 5))                # повідомлень адміну
+TEXT_WINDOW = int(os.environ.get('TEXT_WINDOW', 600))
+THROTTLE_MAX_USERS = int(os.environ.get('THROTTLE_MAX_USERS', 20000))
+THROTTLE_MAX_OFFENDERS = int(os.environ.get('THROTTLE_MAX_OFFENDERS', 1000))
+
+class SlidingWindowLimiter:
+    """Не більше limit подій на ключ за window секунд; пам'ять обмежена LRU"""
+
+    def __init__(self, name, limit, window, max_keys=THROTTLE_MAX_USERS, max_offenders=THROTTLE_MAX_OFFENDERS):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.max_offenders = max_offenders
+        self._hits = OrderedDict()       # ключ -> deque(моменти подій)
+        self.offenders = OrderedDict()   # ключ -> {'throttled', 'first', 'last'}
+        self.throttled_total = 0
+
+    def allow(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        hits = self._hits.get(key)
+        if hits is None:
+            hits = self._hits[key] = deque()
+        else:
+            self._hits.move_to_end(key)
+        while hits and now - hits[0] >= self.window:
+            hits.popleft()
+
+        if len(hits) >= self.limit:
+            self._offend(key, now)
+            return False
+
+        hits.append(now)
+        if len(self._hits) > self.max_keys:
+            self._hits.popitem(last=False)
+        return True
+
+    def _offend(self, key, now):
+        self.throttled_total += 1
+        record = self.offenders.get(key)
+        if record is None or now - record['last'] >= self.window:
+            # Новий епізод спаму
+            if record is None:
+                logger.warning(f"🛑 Ліміт {self.name}: користувач {key} понад {self.limit}/{self.window} с")
+            record = self.offenders[key] = {'throttled': 0, 'first': now, 'last': now}
+        self.offenders.move_to_end(key)
+        record['throttled'] += 1
+        record['last'] = now
+        if len(self.offenders) > self.max_offenders:
+            self.offenders.popitem(last=False)
+
+    def first_throttle(self, key):
+        """True, якщо це перша відмова в поточному епізоді (щоб попередити один раз)"""
+        record = self.offenders.get(key)
+        return record is not None and record['throttled'] == 1
+
+    def snapshot(self, top=10):
+        worst = sorted(self.offenders.items(), key=lambda item: item[1]['throttled'], reverse=True)[:top]
+        return {
+            'limit': f"{self.limit}/{self.window}s",
+            'tracked_users': len(self._hits),
+            'offenders': len(self.offenders),
+            'throttled_total': self.throttled_total,
+            'top_offenders': {str(key): record['throttled'] for key, record in worst},
+        }
+
+START_LIMITER = SlidingWindowLimiter('/start', START_LIMIT, START_WINDOW)
+TEXT_LIMITER = SlidingWindowLimiter('text', TEXT_LIMIT, TEXT_WINDOW)
+LIMITERS = {'start': START_LIMITER, 'text': TEXT_LIMITER}
+
+# =====================================================
+# ГОДИННИК (ПАУЗИ СЦЕНАРІЮ)
+# =====================================================
+# Паузи між повідомленнями, нагадування та TTL користувачів ідуть через
+# CLOCK. У проді це звичайний час, у симуляції (python bot.py simulate) -
+# віртуальний, тож доба нагадувань проганяється за секунди.
+
+CLOCK = RealClock()
+
+def paced(seconds):
+    """Тривалість паузи сценарію з урахуванням рівня shedding"""
+    scale = PACE_SCALE[SHEDDER.tier]
+    if scale < 1:
+        SHEDDER.count('pace_seconds_saved', seconds * (1 - scale))
+    return seconds * scale
+
+async def pace(seconds):
+    """
+    Пауза в сценарії (час на читання, "друкує..."); під навантаженням коротша.
+    Обробник апдейту весь цей час тримає слот PriorityUpdateProcessor, тож
+    повідомлення після довгих пауз шлються окремою задачею
+    (application.create_task) або задачею JobQueue.
+    """
+    await CLOCK.sleep(paced(seconds))
+
+# =====================================================
+# ЗАХИСТ ВІД ПЕРЕВАНТАЖЕННЯ (LOAD SHEDDING)
+# =====================================================
+# Під час піку бот спершу відкидає те, без чого лід однаково збирається:
+#   1 - аналітика: другорядні події log_event пишуться вибірково
+#   2 - + без "друкує..." (send_chat_action)
+#   3 - + паузи сценарію в 10 разів коротші (чек-лист після запису - 6 с
+#       замість 60) і без інсайту перед Q4
+# Рівень тримає LoadShedder за чергою апдейтів, хвостом журналу до Sheets і
+# затримкою event loop-а; коли тиск спадає, поведінка повертається сама.
+
+SHED_SAMPLE_ANALYTICS, SHED_CHAT_ACTIONS, SHED_LEAN = 1, 2, 3
+SHED_TIER_NAMES = ('normal', 'sample_analytics', 'no_chat_actions', 'lean')
+PACE_SCALE = (1.0, 1.0, 1.0, 0.1)
+
+def _env_levels(name, default):
+    """'20,50,100' -> (20.0, 50.0, 100.0) - пороги рівнів 1..3"""
+    return tuple(float(level) for level in os.environ.get(name, default).split(','))
+
+SHED_THRESHOLDS = {
+    'updates_waiting': _env_levels('SHED_UPDATES', '20,50,150'),         # апдейтів чекають на слот
+    'sheets_backlog': _env_levels('SHED_SHEETS_BACKLOG', '65536,262144,1048576'),  # байт журналу
+    'loop_lag': _env_levels('SHED_LOOP_LAG', '0.1,0.25,0.5'),             # секунд
+}
+SHED_EVENT_SAMPLE = float(os.environ.get('SHED_EVENT_SAMPLE', 0.2))
+
+# Події, що описують гроші, пишуться завжди
+ESSENTIAL_EVENTS = {'phone_shared', 'repeat_lead', 'consultation_booked', 'broadcast_finished'}
+
+def updates_waiting():
+    waiting = sum(UPDATE_PROCESSOR.gate.waiting().values()) if UPDATE_PROCESSOR else 0
+    return waiting + sum(t.application.update_queue.qsize() for t in TENANTS if t.application)
+
+def on_shed_tier_change(old, new, values):
+    readings = ", ".join(f"{name}={value:g}" for name, value in values.items())
+    if new > old:
+        logger.warning(f"🪫 Перевантаження: рівень {old} → {new} ({SHED_TIER_NAMES[new]}); {readings}")
+    else:
+        logger.info(f"🔋 Навантаження спало: рівень {old} → {new} ({SHED_TIER_NAMES[new]}); {readings}")
+
+SHEDDER = LoadShedder(
+    signals={
+        'updates_waiting': updates_waiting,
+        'sheets_backlog': lambda: max(JOURNAL.backlog(t.sheets_consumer) for t in TENANTS),
+    },
+    thresholds=SHED_THRESHOLDS,
+    tier_names=SHED_TIER_NAMES,
+    exit_ratio=float(os.environ.get('SHED_EXIT_RATIO', 0.5)),
+    cooldown=float(os.environ.get('SHED_COOLDOWN', 30)),
+    interval=float(os.environ.get('SHED_INTERVAL', 1.0)),
+    on_change=on_shed_tier_change,
+)
+
+def shedding(tier):
+    """True - зараз рівень tier або вищий (цю необов'язкову роботу пропускаємо)"""
+    return SHEDDER.tier >= tier
+
+async def send_typing(bot, chat_id):
+    """'друкує...' - суто косметика, під навантаженням не відправляється"""
+    if shedding(SHED_CHAT_ACTIONS):
+        SHEDDER.count('chat_actions')
+        return
+    await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
 
 # =====================================================
 # ОБРОБНИКИ КОМАНД
@@ -701,27 +2365,32 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await remove_quiz_reminder(context, user.id)
     
-    # Зберігаємо користувача в базу "All Users"
-    await save_all_user(
-        telegram_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
-        last_name=user.last_name
-    )
-    
-    await log_event(user.id, user.username, "/start", "Користувач почав взаємодію")
+    # Повтори понад ліміт - лише локальний стан, без Sheets
+    if START_LIMITER.allow(user.id):
+        # Зберігаємо користувача в базу "All Users" (якщо його там ще немає)
+        known = 'telegram_id' in context.user_data or str(user.id) in tenant().status_cache.all_users
+        if not known:
+            await save_all_user(
+                telegram_id=user.id,
+                username=user.username,
+                first_name=user.first_name,
+                last_name=user.last_name
+            )
+        
+        await log_event(user.id, user.username, "/start", "Користувач почав взаємодію")
     
     # Ініціалізуємо дані
     context.user_data.clear()
     context.user_data['telegram_id'] = user.id
     context.user_data['username'] = user.username or ''
     context.user_data['started_at'] = datetime.now().isoformat()
+    quiz_reset(context.user_data)
     
-    keyboard = [[InlineKeyboardButton("✅ Почнімо!", callback_data='start_quiz')]]
+    keyboard = [[InlineKeyboardButton("✅ Почнімо!", callback_data=CB_START_QUIZ)]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await update.message.reply_text(
-        TEXT_WELCOME,
+        tenant().catalog.texts['TEXT_WELCOME'],
         parse_mode='HTML',
         reply_markup=reply_markup
     )
@@ -731,160 +2400,116 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # =====================================================
 
 
-async def question_1(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def question_1(update: Update, context: ContextTypes.DEFAULT_TYPE, answer):
     """Q1: Чи є діти?"""
     query = update.callback_query
     await query.answer()
+    from_broadcast = answer == 'restart'
+    if from_broadcast:
+        # Кнопка з розсилки: квіз починається заново, де б користувач не зупинився
+        quiz_reset(context.user_data)
+        quiz_apply(context.user_data, CB_START_QUIZ)
     
     user_id = update.effective_user.id
     username = update.effective_user.username
-    await log_event(user_id, username, "quiz_started", "Користувач почав квіз")
+    await log_event(user_id, username, "quiz_started", "Повернувся з розсилки" if from_broadcast else "Користувач почав квіз")
     
-    keyboard = [
-        [InlineKeyboardButton("👶 Так, є діти", callback_data='q1_yes')],
-        [InlineKeyboardButton("❌ Немає дітей", callback_data='q1_no')]
-    ]
-    await query.edit_message_text(TEXT_Q1, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
+    await query.edit_message_text(tenant().catalog.texts['TEXT_Q1'], parse_mode='HTML', reply_markup=quiz_keyboard(QS_Q1))
     await schedule_quiz_reminder(context, user_id, query.message.chat_id)
 
-async def question_1_clarify(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def question_1_clarify(update: Update, context: ContextTypes.DEFAULT_TYPE, answer):
     """Уточнення: Конфлікт по дітях"""
     query = update.callback_query
     await query.answer()
-    context.user_data['has_children'] = 'yes' # Фіксуємо факт
-    
-    keyboard = [
-        [InlineKeyboardButton("🤝 Домовилися (Мирно)", callback_data='q1_sub_peace')],
-        [InlineKeyboardButton("⚔️ Є суперечки", callback_data='q1_sub_conflict')]
-    ]
-    await query.edit_message_text(TEXT_Q1_CLARIFY, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
+    await query.edit_message_text(tenant().catalog.texts['TEXT_Q1_CLARIFY'], parse_mode='HTML', reply_markup=quiz_keyboard(QS_Q1_CLARIFY))
 
-async def question_2_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def question_2_entry(update: Update, context: ContextTypes.DEFAULT_TYPE, answer):
     """Вхід у Q2 (Згода). Обробляє переходи з різних гілок."""
     query = update.callback_query
     await query.answer()
-    data = query.data
-    
-    # Логіка збереження стану конфлікту
-    if data == 'q1_no':
-        context.user_data['has_children'] = 'no'
-        context.user_data['conflict_children'] = 'no'
+
+    if answer == 'no':
         microcommit = "✅ Зрозуміло, дітей немає.\n\n"
-    elif data == 'q1_sub_peace':
-        context.user_data['conflict_children'] = 'no'
+    elif answer == 'peace':
         microcommit = "✅ Чудово, що домовилися про дітей.\n\n"
-    elif data == 'q1_sub_conflict':
-        context.user_data['conflict_children'] = 'yes'
+    elif answer == 'conflict':
         microcommit = "⚠️ Зрозуміло, питання дітей захистимо.\n\n"
     else:
         microcommit = ""
 
-    keyboard = [
-        [InlineKeyboardButton("✅ Так, згоден/на", callback_data='q2_yes')],
-        [InlineKeyboardButton("❌ Ні, проти", callback_data='q2_no')],
-        [InlineKeyboardButton("🤷 Не знаю", callback_data='q2_unknown')]
-    ]
-    await query.edit_message_text(microcommit + TEXT_Q2, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
+    await query.edit_message_text(microcommit + tenant().catalog.texts['TEXT_Q2'], parse_mode='HTML', reply_markup=quiz_keyboard(QS_Q2))
 
-async def question_3(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def question_3(update: Update, context: ContextTypes.DEFAULT_TYPE, answer):
     """Q3: Майно"""
     query = update.callback_query
     await query.answer()
-    
-    consent = query.data.replace('q2_', '')
-    context.user_data['spouse_consent'] = consent
-    
     # Мікрокоміт залежно від згоди
-    if consent == 'yes': m = MICROCOMMIT_Q2_YES
-    elif consent == 'no': m = MICROCOMMIT_Q2_NO
+    if answer == 'yes': m = MICROCOMMIT_Q2_YES
+    elif answer == 'no': m = MICROCOMMIT_Q2_NO
     else: m = MICROCOMMIT_Q2_UNKNOWN
 
-    keyboard = [
-        [InlineKeyboardButton("🏠 Так, є майно", callback_data='q3_yes')],
-        [InlineKeyboardButton("❌ Немає майна", callback_data='q3_no')]
-    ]
-    await query.edit_message_text(m + TEXT_Q3, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
+    await query.edit_message_text(m + tenant().catalog.texts['TEXT_Q3'], parse_mode='HTML', reply_markup=quiz_keyboard(QS_Q3))
 
-async def question_3_clarify(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def question_3_clarify(update: Update, context: ContextTypes.DEFAULT_TYPE, answer):
     """Уточнення: Конфлікт по майну"""
     query = update.callback_query
     await query.answer()
-    context.user_data['property_dispute'] = 'yes' # Фіксуємо факт
-    
-    keyboard = [
-        [InlineKeyboardButton("🤝 Вже поділили / Домовилися", callback_data='q3_sub_peace')],
-        [InlineKeyboardButton("⚔️ Є конфлікт / Не ділиться", callback_data='q3_sub_conflict')]
-    ]
-    await query.edit_message_text(TEXT_Q3_CLARIFY, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
+    await query.edit_message_text(tenant().catalog.texts['TEXT_Q3_CLARIFY'], parse_mode='HTML', reply_markup=quiz_keyboard(QS_Q3_CLARIFY))
 
-async def question_4_entry(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def question_4_entry(update: Update, context: ContextTypes.DEFAULT_TYPE, answer):
     """Вхід у Q4 (Локація) + ПРОГРІВ (INSIGHTS)"""
     query = update.callback_query
     await query.answer()
     chat_id = query.message.chat_id
-    data = query.data
-    
-    # 1. Логіка збереження стану майна
-    if data == 'q3_no':
-        context.user_data['property_dispute'] = 'no'
-        context.user_data['conflict_property'] = 'no'
+
+    # 1. Мікрокоміт залежно від майна
+    if answer == 'no':
         microcommit = "✅ Зрозуміло, без майна.\n\n"
-    elif data == 'q3_sub_peace':
-        context.user_data['conflict_property'] = 'no'
+    elif answer == 'peace':
         microcommit = "✅ Добре, що є згода по майну.\n\n"
-    elif data == 'q3_sub_conflict':
-        context.user_data['conflict_property'] = 'yes'
+    elif answer == 'conflict':
         microcommit = "⚠️ Зрозуміло, майновий спір.\n\n"
     else:
         microcommit = ""
 
     # 2. Відправляємо мікрокоміт
     await query.edit_message_text(microcommit, parse_mode='HTML')
-    
-    # 3. 🔥 ПРОГРІВ: Вибираємо та відправляємо Інсайт (Mini Case)
-    trust_text = get_mini_case(context.user_data)
-    
-    await asyncio.sleep(1)
-    await context.bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
-    await context.bot.send_message(chat_id=chat_id, text=trust_text, parse_mode='HTML')
-    
-    # Пауза на читання
-    await asyncio.sleep(4)
+
+    # 3-4. Інсайт і Q4 - з паузами, тож окремою задачею (слот обробки звільняється одразу)
+    context.application.create_task(send_insight_and_q4(context, chat_id), update=update)
+
+async def send_insight_and_q4(context: ContextTypes.DEFAULT_TYPE, chat_id):
+    """🔥 ПРОГРІВ: Інсайт (Mini Case) з паузою на читання, потім питання Q4"""
+    # (під сильним навантаженням - одразу до Q4)
+    if shedding(SHED_LEAN):
+        SHEDDER.count('insights')
+    else:
+        trust_text = get_mini_case(quiz_answers(context.user_data))
+
+        await pace(1)
+        await send_typing(context.bot, chat_id)
+        await context.bot.send_message(chat_id=chat_id, text=trust_text, parse_mode='HTML')
+
+        # Пауза на читання
+        await pace(4)
     
     # 4. Показуємо питання Q4
-    keyboard = [
-        [InlineKeyboardButton("🇺🇦 Ми обоє в Україні", callback_data='q4_ukraine')],
-        [InlineKeyboardButton("✈️ Хтось із нас за кордоном", callback_data='q4_abroad')],
-        [InlineKeyboardButton("❓ Не знаю де чоловік/дружина", callback_data='q4_unknown')]
-    ]
-    await context.bot.send_message(chat_id=chat_id, text=TEXT_Q4, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
+    await context.bot.send_message(chat_id=chat_id, text=tenant().catalog.texts['TEXT_Q4'], parse_mode='HTML', reply_markup=quiz_keyboard(QS_Q4))
 
-async def question_5(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def question_5(update: Update, context: ContextTypes.DEFAULT_TYPE, answer):
     """Q5: Терміновість"""
     query = update.callback_query
     await query.answer()
-    
-    location = query.data.replace('q4_', '')
-    context.user_data['spouse_location'] = location
-    
-    if location == 'ukraine': m = MICROCOMMIT_Q4_UKRAINE
-    elif location == 'abroad': m = MICROCOMMIT_Q4_ABROAD
+    if answer == 'ukraine': m = MICROCOMMIT_Q4_UKRAINE
+    elif answer == 'abroad': m = MICROCOMMIT_Q4_ABROAD
     else: m = MICROCOMMIT_Q4_UNKNOWN
     
-    keyboard = [
-        [InlineKeyboardButton("⚡️ Дуже терміново (2-3 міс)", callback_data='q5_high')],
-        [InlineKeyboardButton("⏳ Можу почекати (4-6 міс)", callback_data='q5_medium')],
-        [InlineKeyboardButton("🤷 Не критично", callback_data='q5_low')]
-    ]
-    await query.edit_message_text(m + TEXT_Q5, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
+    await query.edit_message_text(m + tenant().catalog.texts['TEXT_Q5'], parse_mode='HTML', reply_markup=quiz_keyboard(QS_Q5))
 
-async def question_6_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def question_6_phone(update: Update, context: ContextTypes.DEFAULT_TYPE, answer):
     """Q6: Запит телефону"""
     query = update.callback_query
     await query.answer()
-    
-    urgency = query.data.replace('q5_', '')
-    context.user_data['urgency'] = urgency
     user_id = update.effective_user.id
     
     await remove_quiz_reminder(context, user_id)
@@ -894,7 +2519,7 @@ async def question_6_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [[KeyboardButton("📱 Поділитися номером", request_contact=True)]]
     reply_markup = ReplyKeyboardMarkup(keyboard, one_time_keyboard=True, resize_keyboard=True)
     
-    await query.edit_message_text(TEXT_Q6_PHONE, parse_mode='HTML')
+    await query.edit_message_text(tenant().catalog.texts['TEXT_Q6_PHONE'], parse_mode='HTML')
     await context.bot.send_message(chat_id=query.message.chat_id, text="👇 Натисніть кнопку нижче:", reply_markup=reply_markup)
 
     context.job_queue.run_once(phone_reminder_callback, 60, chat_id=query.message.chat_id, user_id=user_id, name=f"phone_reminder_{user_id}")
@@ -905,13 +2530,11 @@ async def finalize_lead_processing(update: Update, context: ContextTypes.DEFAULT
     user = update.effective_user
     chat_id = update.effective_chat.id
     
-    first_name = context.user_data.get('first_name') or user.first_name or "Клієнт"
-    last_name = context.user_data.get('last_name') or user.last_name or ""
+    first_name = user.first_name or "Клієнт"
+    last_name = user.last_name or ""
+    phone_number = normalize_phone(phone_number) or phone_number
     
-    context.user_data['first_name'] = first_name
-    context.user_data['last_name'] = last_name
-    context.user_data['phone_number'] = phone_number
-    context.user_data['completed_at'] = datetime.now().isoformat()
+    quiz_set_state(context.user_data, QS_DONE)
     
     try:
         job_name = f"phone_reminder_{user.id}"
@@ -926,27 +2549,42 @@ async def finalize_lead_processing(update: Update, context: ContextTypes.DEFAULT
     
     await log_event(user_id, username, "phone_shared", f"{first_name} - {phone_number}")
     
-    if SHEETS_ALL_USERS:
-        try:
-            cell = SHEETS_ALL_USERS.find(str(user_id), in_column=2)
-            if cell:
-                SHEETS_ALL_USERS.update_cell(cell.row, 6, "Так")
-        except:
-            pass
+    await journal_write('status', {'telegram_id': user_id, 'col': 6, 'value': "Так"})
     
     # Сегментація (вже з діапазонами цін)
-    segment, segment_name, cost, time = determine_segment(context.user_data)
-    context.user_data['segment'] = segment
-    context.user_data['segment_name'] = segment_name
-    context.user_data['cost_estimate'] = cost
-    context.user_data['time_estimate'] = time
-    context.user_data['status'] = 'new'
+    answers = quiz_answers(context.user_data)
+    segment, segment_name, cost, time = determine_segment(answers)
+    lead = Lead(
+        telegram_id=user_id,
+        username=username,
+        first_name=first_name,
+        last_name=last_name,
+        phone_number=phone_number,
+        answers=answers,
+        segment=segment,
+        segment_name=segment_name,
+        cost_estimate=cost,
+        time_estimate=time,
+        completed_at=datetime.now().isoformat()
+    )
+    context.user_data['lead'] = lead
     
-    logger.info(f"📊 Новий лід: {first_name} ({segment} - {segment_name})")
+    # Дублікат за номером (з іншого акаунта) - не створюємо ще один лід у таблиці.
+    # Той самий користувач, що пройшов квіз знову, - це новий лід з новими відповідями
+    phone_index = tenant().phone_index
+    owner = phone_index.lookup(phone_number)
+    lead.repeat_of = owner if owner != str(user_id) else None
     
-    # 1. Зберігаємо (Sheets + Make)
-    await save_to_sheets(context.user_data)
-    await send_to_make(context.user_data)
+    if lead.repeat_of:
+        logger.info(f"🔁 Повторний лід: {first_name} ({phone_number}, вперше від {lead.repeat_of})")
+        await log_event(user_id, username, "repeat_lead", f"{phone_number} → {lead.repeat_of}")
+    else:
+        logger.info(f"📊 Новий лід: {first_name} ({segment} - {segment_name})")
+        phone_index.add(phone_number, user_id)
+        
+        # 1. Зберігаємо (Sheets + Make)
+        await save_to_sheets(lead)
+        await send_to_make(lead)
     
     # Подяка
     thanks_text = f"""
@@ -963,17 +2601,30 @@ async def finalize_lead_processing(update: Update, context: ContextTypes.DEFAULT
         reply_markup=ReplyKeyboardRemove()
     )
     
+    # Результат і оффер - ~20 с пауз, тож окремою задачею (слот обробки звільняється одразу)
+    context.application.create_task(send_result_and_offer(update, context, lead), update=update)
+
+async def send_result_and_offer(update: Update, context: ContextTypes.DEFAULT_TYPE, lead):
+    """Розрахунок, чек-лист і оффер з паузами на читання + нагадування про оффер"""
+    chat_id = update.effective_chat.id
+    user_id = lead.telegram_id
+    first_name = lead.first_name
+
     # Пауза
-    await asyncio.sleep(2)
+    await pace(2)
     
     # Результат (вже з дисклеймером)
-    await send_result(update, context, segment, segment_name, cost, time)
+    await send_result(update, context, lead.segment, lead.segment_name, lead.cost_estimate, lead.time_estimate)
     
     # Пауза (трохи довша, бо тексту більше)
-    await asyncio.sleep(8)
+    await pace(8)
     
     # Оффер (Tripwire 199)
     await send_first_offer(update, context)
+
+    # Клієнт міг записатися (кнопкою зі старого оффера), поки йшли паузи
+    if effective_status(user_id, lead) not in OPEN_STATUSES:
+        return
     
     # Нагадування про оффер
     job_name = f"offer_reminder_{user_id}"
@@ -993,105 +2644,48 @@ async def process_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Викликаємо спільну функцію
     await finalize_lead_processing(update, context, contact.phone_number)
 
-async def save_to_sheets(user_data):
+async def save_to_sheets(lead):
     """Зберігає дані ліда в Google Sheets"""
     
-    if SHEETS_LEADS is None:
-        logger.warning("⚠️ Google Sheets не підключено")
-        return
-    
-    try:
-        row = [
-            user_data.get('completed_at', ''),
-            str(user_data.get('telegram_id', '')),
-            user_data.get('username', ''),
-            user_data.get('first_name', ''),
-            user_data.get('phone_number', ''),
-            user_data.get('has_children', ''),
-            user_data.get('spouse_consent', ''),
-            user_data.get('property_dispute', ''),
-            user_data.get('spouse_location', ''),
-            user_data.get('urgency', ''),
-            user_data.get('segment', ''),
-            user_data.get('segment_name', ''),  # ДОДАНО
-            user_data.get('cost_estimate', ''),
-            user_data.get('time_estimate', ''),
-            user_data.get('status', 'new')
-        ]
-        
-        SHEETS_LEADS.append_row(row)
-        logger.info(f"✅ Лід збережено: {user_data.get('first_name')}")
-        
-    except Exception as e:
-        logger.error(f"❌ Помилка збереження: {e}")
-
-async def send_to_make(user_data):
-    """Відправляє webhook в Make.com (ЯКЩО НАЛАШТОВАНО)"""
+    # Лід на диску (журнал) = лід збережено; у Sheets його донесе реплеєр
+    if await journal_write('lead', lead.sheets_row()):
+        logger.info(f"✅ Лід збережено: {lead.first_name}")
+
+def make_url(t):
+    """Make webhook тенанта (без власного - спільний MAKE_WEBHOOK_URL)"""
+    return (t.make_webhook_url if t else None) or MAKE_WEBHOOK_URL
+
+def post_to_make(url, payload, idempotency_key=None):
+    """Синхронний POST у Make (викликати через run_in_executor)"""
+    requests = lazy_import('requests')
+    headers = {'Idempotency-Key': idempotency_key} if idempotency_key else None
+    response = requests.post(url, json=payload, headers=headers, timeout=5)
+    response.raise_for_status()
+    return response
+
+async def send_to_make(lead):
+    """Відправляє webhook в Make.com (ЯКЩО НАЛАШТОВАНО)"""
     
     # 👇 ПРЕДОХРАНИТЕЛЬ: Если ссылки нет, просто выходим
-    if not MAKE_WEBHOOK_URL:
+    if not make_url(tenant()):
         return 
     
-    try:
-        payload = {
-            'event': 'new_lead',
-            'telegram_id': user_data.get('telegram_id'),
-            'first_name': user_data.get('first_name'),
-            'phone_number': user_data.get('phone_number'),
-            'segment': user_data.get('segment'),
-            'segment_name': user_data.get('segment_name'),
-            'cost_estimate': user_data.get('cost_estimate'),
-            'time_estimate': user_data.get('time_estimate'),
-            'completed_at': user_data.get('completed_at')
-        }
-        
-        # Використовуємо run_in_executor, щоб requests не блокував бота
-        loop = asyncio.get_running_loop()
-        await loop.run_in_executor(None, lambda: requests.post(MAKE_WEBHOOK_URL, json=payload, timeout=5))
-        logger.info("✅ Дані відправлено в Make")
-            
-    except Exception as e:
-        logger.error(f"⚠️ Make Error (не критично): {e}")
+    # POST робить реплеєр журналу (requests в executor, через запобіжник)
+    if await journal_write('make', lead.make_payload()):
+        logger.info("✅ Дані для Make записано в журнал")
 
-async def send_lead_to_admin(context: ContextTypes.DEFAULT_TYPE, user_data):
+async def send_lead_to_admin(context: ContextTypes.DEFAULT_TYPE, lead):
     """Відправляє красиву карточку ліда адмінистратору в Telegram"""
     
-    if not ADMIN_ID:
+    admin_id = tenant().admin_id
+    if not admin_id:
         logger.warning("⚠️ ADMIN_ID не встановлено!")
         return
 
-    text = f"""
-💰 <b>ЗАМОВЛЕННЯ (199 грн)!</b>
-
-👤 <b>{user_data.get('first_name')} {user_data.get('last_name')}</b>
-📱 <code>{user_data.get('phone_number')}</code>
-🔗 @{user_data.get('username', 'немає')}
-
-📊 <b>Сегмент: {user_data.get('segment')}</b>
-└ {user_data.get('segment_name')}
-
-💰 <b>Орієнтир:</b> {user_data.get('cost_estimate')}
-⏱ <b>Строки:</b> {user_data.get('time_estimate')}
-
-📝 <b>Відповіді:</b>
-• Діти: {user_data.get('has_children')}
-• Згода: {user_data.get('spouse_consent')}
-• Майно: {user_data.get('property_dispute')}
-• Локація: {user_data.get('spouse_location')}
-• Терміновість: {user_data.get('urgency')}
-
-<i>Дзвони швидше! 🚀</i>
-"""
-
     try:
-        await context.bot.send_message(chat_id=ADMIN_ID, text=text, parse_mode='HTML')
-        logger.info(f"✅ Лід відправлено адміну ({ADMIN_ID})")
-    except Exception as e:
-        logger.error(f"❌ Не вдалося відправити ліда адміну: {e}")
-    try:
-        # Відправляємо повідомлення адміну
-        await context.bot.send_message(chat_id=ADMIN_ID, text=text, parse_mode='HTML')
-        logger.info(f"✅ Лід відправлено адміну ({ADMIN_ID})")
+        with traffic(ADMIN):
+            await context.bot.send_message(chat_id=admin_id, text=lead.admin_card(), parse_mode='HTML')
+        logger.info(f"✅ Лід відправлено адміну ({admin_id})")
     except Exception as e:
         logger.error(f"❌ Не вдалося відправити ліда адміну: {e}")
 
@@ -1099,17 +2693,12 @@ async def send_result(update: Update, context: ContextTypes.DEFAULT_TYPE, segmen
     """Відправляє результат + ЛЕГКУ Дорожню карту (Hook)"""
     
     # 1. Основний розрахунок
-    message_template = SEGMENT_MESSAGES.get(segment, SEGMENT_MESSAGES['B2'])
-    result_text = message_template.format(
-        segment_name=segment_name,
-        cost=cost, 
-        time=time
-    )
+    result_text = tenant().catalog.result_text(segment, segment_name, cost, time)
     
     await update.message.reply_text(result_text, parse_mode='HTML')
     
     # Пауза для читання
-    await asyncio.sleep(4)
+    await pace(4)
     
     # 2. ЛЕГКА Дорожня карта (Hook на основі досліджень)
     roadmap_text = ""
@@ -1186,9 +2775,10 @@ async def send_result(update: Update, context: ContextTypes.DEFAULT_TYPE, segmen
         )
 
 async def send_first_offer(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id if update.effective_chat else context.user_data.get('telegram_id')
-    user_id = context.user_data.get('telegram_id') # Отримуємо ID коректно
-    first_name = context.user_data.get('first_name', 'Клієнт')
+    lead = get_lead(context.user_data)
+    chat_id = update.effective_chat.id if update.effective_chat else lead.telegram_id
+    user_id = lead.telegram_id # Отримуємо ID коректно
+    first_name = lead.first_name
     
    # 👇 НОВИЙ ТЕКСТ З М'ЯКИМ ПЕРЕХОДОМ 👇
     text_part_1 = f"""
@@ -1207,7 +2797,7 @@ async def send_first_offer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await context.bot.send_message(chat_id=chat_id, text=text_part_1, parse_mode='HTML')
     
     # Далі код без змін...
-    await asyncio.sleep(7) # Трохи збільшимо паузу, бо тексту стало більше
+    await pace(7) # Трохи збільшимо паузу, бо тексту стало більше
     
     text_part_2 = """
 💎 <b>ПОСЛУГА "ПЕРСОНАЛЬНИЙ ПІДБІР"</b>
@@ -1223,7 +2813,7 @@ async def send_first_offer(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 👇 <b>Натисніть кнопку, щоб замовити:</b>
 """
-    keyboard = [[InlineKeyboardButton("✅ Замовити за 199 грн", callback_data='book_consultation')]]
+    keyboard = [[InlineKeyboardButton("✅ Замовити за 199 грн", callback_data=CB_BOOK)]]
     await context.bot.send_message(chat_id=chat_id, text=text_part_2, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
 
     # 👇 НОВЕ: Плануємо кнопку "Залишились питання?" через 2 хвилини
@@ -1233,22 +2823,24 @@ async def send_first_offer(update: Update, context: ContextTypes.DEFAULT_TYPE):
         chat_id=chat_id,
         user_id=user_id,
         name=f"contact_btn_{user_id}",
-        data=context.user_data.get('first_name')
+        data=first_name
     )
     
     # Старе нагадування на 2 години можна залишити або прибрати, на ваш розсуд.
     # Я б радив залишити його як "останній шанс", але збільшити час до 3 годин.
 
-async def book_consultation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def book_consultation(update: Update, context: ContextTypes.DEFAULT_TYPE, answer):
     """Обробка запису на консультацію (З КОНФЕТІ та бонусом)"""
     
     query = update.callback_query
     await query.answer()
     
-    user_data = context.user_data
-    user_id = update.effective_user.id
-    username = update.effective_user.username
-    first_name = user_data.get('first_name', 'Клієнт')
+    user = update.effective_user
+    user_id = user.id
+    username = user.username
+    # Якщо стан втрачено (рестарт) - збираємо лід з того, що знаємо про користувача
+    lead = get_lead(context.user_data) or Lead(telegram_id=user_id, username=username, first_name=user.first_name or 'Клієнт')
+    first_name = lead.first_name
 
     # Скасовуємо нагадування про оффер
     job_name = f"offer_reminder_{user_id}"
@@ -1258,49 +2850,44 @@ async def book_consultation(update: Update, context: ContextTypes.DEFAULT_TYPE):
             job.schedule_removal()
         logger.info(f"⏰ Видалено нагадування про оффер для {user_id} (юзер записався)")
     
-    context.user_data['status'] = 'scheduled'
+    lead.status = 'scheduled'
+    tenant().status_cache.note_status(user_id, 'scheduled')
     
     logger.info(f"🔥 ГАРЯЧИЙ ЛІД! {first_name} хоче консультацію!")
     
     # 👇 НОВЕ: ВІДПРАВЛЯЄМО ЛІДА ТОБІ ТУТ (В МОМЕНТ ЗАПИСУ)
-    await send_lead_to_admin(context, user_data)
+    await send_lead_to_admin(context, lead)
     
     await log_event(user_id, username, "consultation_booked", "Запис на консультацію!")
     
     # Оновлюємо статус в All_Users
-    if SHEETS_ALL_USERS:
-        try:
-            cell = SHEETS_ALL_USERS.find(str(user_id), in_column=2)
-            if cell:
-                SHEETS_ALL_USERS.update_cell(cell.row, 7, "scheduled")
-        except:
-            pass
+    await journal_write('status', {'telegram_id': user_id, 'col': 7, 'value': "scheduled"})
     
     # Webhook в Make (повторно, як подія 'consultation_request')
-    if MAKE_WEBHOOK_URL:
-        try:
-            payload = {
-                'event': 'consultation_request',
-                'telegram_id': user_data.get('telegram_id'),
-                'first_name': first_name,
-                'phone_number': user_data.get('phone_number'),
-                'segment': user_data.get('segment'),
-                'segment_name': user_data.get('segment_name')
-            }
-            # Використовуємо run_in_executor
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, lambda: requests.post(MAKE_WEBHOOK_URL, json=payload, timeout=5))
-        except:
-            pass
+    if make_url(tenant()):
+        await journal_write('make', lead.consultation_payload())
     
-    text = get_consultation_booked_text(first_name, user_data.get('phone_number'))
+    text = tenant().catalog.booked_text(first_name)
     
     await query.edit_message_text(text, parse_mode='HTML')
     
-    # Даємо миттєву цінність + ПОЗИТИВНУ ІНСТРУКЦІЮ
-    await asyncio.sleep(60)
-    await context.bot.send_message(
+    # Даємо миттєву цінність + ПОЗИТИВНУ ІНСТРУКЦІЮ (через хвилину, задачею JobQueue -
+    # обробник не тримає слот обробки апдейтів всю паузу)
+    context.job_queue.run_once(
+        booking_checklist_job,
+        paced(60),
         chat_id=query.message.chat_id,
+        user_id=user_id,
+        name=f"booking_checklist_{user_id}",
+        data=first_name
+    )
+
+async def booking_checklist_job(context: ContextTypes.DEFAULT_TYPE):
+    """Чек-лист '3 головні помилки' через хвилину після запису на консультацію"""
+    job = context.job
+    first_name = job.data
+    await context.bot.send_message(
+        chat_id=job.chat_id,
         text=f"""
 💡 <b>{first_name}, поки ви очікуєте дзвінок</b> (це 15-30 хв), ось чек-лист '3 головні помилки при розлученні':
 
@@ -1319,13 +2906,13 @@ async def book_consultation(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='HTML'
     )
 
-async def contact_support_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def contact_support_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, answer):
     """Клієнт натиснув 'Зв'язатися з нами'"""
     query = update.callback_query
     await query.answer()
     
     user = update.effective_user
-    user_data = context.user_data
+    lead = get_lead(context.user_data)
     
     # 1. Повідомлення Клієнту
     client_text = """
@@ -1339,10 +2926,11 @@ async def contact_support_handler(update: Update, context: ContextTypes.DEFAULT_
     await query.edit_message_text(text=client_text, parse_mode='HTML')
     
     # 2. Повідомлення Адміну
-    if ADMIN_ID:
+    admin_id = tenant().admin_id
+    if admin_id:
         # Формуємо клікабельне посилання на клієнта
         user_link = f"@{user.username}" if user.username else f"<a href='tg://user?id={user.id}'>{user.first_name}</a>"
-        phone = user_data.get('phone_number', 'Не вказано')
+        phone = lead.phone_number if lead else 'Не вказано'
         
         admin_text = f"""
 🙋‍♂️ <b>КЛІЄНТ МАЄ ПИТАННЯ!</b>
@@ -1350,12 +2938,13 @@ async def contact_support_handler(update: Update, context: ContextTypes.DEFAULT_
 
 👤 <b>Хто:</b> {user_link}
 📱 <b>Телефон:</b> <code>{phone}</code>
-📊 <b>Сегмент:</b> {user_data.get('segment_name', 'Не визначено')}
+📊 <b>Сегмент:</b> {lead.segment_name if lead else 'Не визначено'}
 
 👉 <i>Напишіть йому першим!</i>
 """
         try:
-            await context.bot.send_message(chat_id=ADMIN_ID, text=admin_text, parse_mode='HTML')
+            with traffic(ADMIN):
+                await context.bot.send_message(chat_id=admin_id, text=admin_text, parse_mode='HTML')
         except Exception as e:
             logger.error(f"Не вдалося сповістити адміна: {e}")
 
@@ -1366,19 +2955,23 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     
     # 1. Перевірка: чи це номер телефону? (Тільки якщо ми його чекаємо)
-    urgency = context.user_data.get('urgency')
-    phone_exists = context.user_data.get('phone_number')
+    waiting_phone = quiz_state(context.user_data) == QS_PHONE
     
-    phone_pattern = re.compile(r'[\+\(\)\s\-\d]{9,20}')
-    is_potential_phone = phone_pattern.search(text) and len(re.sub(r'[^\d\+]', '', text)) >= 9
+    phone = extract_phone(text) if waiting_phone else None
 
-    if urgency and not phone_exists and is_potential_phone:
-        clean_phone = re.sub(r'[^\d\+]', '', text)
-        await finalize_lead_processing(update, context, clean_phone)
+    if phone:
+        await finalize_lead_processing(update, context, phone)
         return
 
     # 2. Якщо це НЕ номер — значить це питання менеджеру
-    if ADMIN_ID:
+    if not TEXT_LIMITER.allow(user.id):
+        # Спам: адміна не турбуємо, клієнта попереджаємо один раз
+        if TEXT_LIMITER.first_throttle(user.id):
+            await update.message.reply_text("⏳ Ваші повідомлення вже у менеджера. Будь ласка, дочекайтеся відповіді.")
+        return
+
+    admin_id = tenant().admin_id
+    if admin_id:
         # Формуємо посилання на юзера, щоб ти міг йому відписати
         user_link = f"@{user.username}" if user.username else f"<a href='tg://user?id={user.id}'>{user.first_name}</a>"
         
@@ -1395,10 +2988,11 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
 """
         try:
             # Сповіщаємо адміна
-            await context.bot.send_message(chat_id=ADMIN_ID, text=admin_text, parse_mode='HTML')
+            with traffic(ADMIN):
+                await context.bot.send_message(chat_id=admin_id, text=admin_text, parse_mode='HTML')
             
             # Також можна переслати оригінал (щоб бачити контекст/медіа)
-            # await context.bot.forward_message(chat_id=ADMIN_ID, from_chat_id=chat_id, message_id=update.message.message_id)
+            # await context.bot.forward_message(chat_id=admin_id, from_chat_id=chat_id, message_id=update.message.message_id)
 
             # Відповідаємо клієнту, що прийняли
             await update.message.reply_text("✅ Повідомлення прийнято. Менеджер сервісу OPORA отримав ваше питання і зв'яжеться з вами найближчим часом.")
@@ -1409,6 +3003,377 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Якщо адмін не налаштований
         await update.message.reply_text("Вибачте, зараз немає зв'язку з менеджером. Спробуйте пізніше.")
 
+# =====================================================
+# МАРШРУТИЗАЦІЯ КНОПОК
+# =====================================================
+# Один CallbackQueryHandler замість окремого regex-обробника на кожну
+# кнопку: callback_data -> (обробник, відповідь, чи це крок квізу) - один
+# пошук у dict, скільки б кроків не мав квіз.
+
+# Крок, на який веде кнопка -> обробник, що його показує
+QUIZ_HANDLERS = {
+    QS_Q1: question_1,
+    QS_Q1_CLARIFY: question_1_clarify,
+    QS_Q2: question_2_entry,
+    QS_Q3: question_3,
+    QS_Q3_CLARIFY: question_3_clarify,
+    QS_Q4: question_4_entry,
+    QS_Q5: question_5,
+    QS_PHONE: question_6_phone,
+}
+
+def build_callback_routes():
+    routes = {}
+    for (_, data), (next_state, _) in QUIZ_TRANSITIONS.items():
+        routes[data] = (QUIZ_HANDLERS[next_state], data.partition(':')[2], True)
+    routes[CB_RESTART_QUIZ] = (question_1, 'restart', False)
+    routes[CB_BOOK] = (book_consultation, 'book', False)
+    routes[CB_SUPPORT] = (contact_support_handler, 'support', False)
+    return routes
+
+CALLBACK_ROUTES = build_callback_routes()
+
+async def dispatch_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Всі натискання inline-кнопок: перехід квізу застосовується тут, обробник отримує відповідь"""
+    query = update.callback_query
+    data = canonical_callback(query.data)
+    route = CALLBACK_ROUTES.get(data)
+    if route is None:
+        await query.answer()
+        return
+
+    handler, answer, quiz_step = route
+    if quiz_step and not quiz_apply(context.user_data, data):
+        if quiz_state(context.user_data) is None:
+            # Стан втрачено (рестарт без нього): стара кнопка починає квіз заново, а не просуває його
+            quiz_apply(context.user_data, CB_START_QUIZ)
+            await question_1(update, context, 'start')
+            return
+        await query.answer()  # подвійний тап / стара кнопка
+        return
+    await handler(update, context, answer)
+
+# =====================================================
+# АДМІН-КОМАНДИ
+# =====================================================
+
+def is_admin(update: Update, t=None) -> bool:
+    admin_id = (t or tenant()).admin_id
+    return bool(admin_id) and update.effective_user is not None and str(update.effective_user.id) == str(admin_id)
+
+async def admin_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/status <telegram_id> - статус ліда з кешу таблиці (без запиту до Sheets)"""
+    if not is_admin(update):
+        return
+
+    cache = tenant().status_cache
+    if not context.args:
+        refreshed = cache.refreshed_at.strftime('%H:%M:%S') if cache.refreshed_at else 'ще ні'
+        await update.message.reply_text(
+            f"🗂 <b>Кеш статусів v{cache.version}</b>\n"
+            f"Оновлено: {refreshed}\n"
+            f"Лідів: {len(cache.leads)}\n"
+            f"Користувачів: {len(cache.all_users)}\n\n"
+            f"<i>Використання: /status &lt;telegram_id&gt;</i>",
+            parse_mode='HTML'
+        )
+        return
+
+    key = context.args[0]
+    lead = cache.leads.get(key)
+    user = cache.all_users.get(key)
+    if not lead and not user:
+        await update.message.reply_text(f"🤷 {key} немає в кеші (v{cache.version})")
+        return
+
+    lines = [f"🆔 <code>{key}</code>"]
+    if lead:
+        lines.append(f"📊 Leads (рядок {lead[0]}): <b>{lead[1] or '—'}</b>")
+    if user:
+        lines.append(f"👥 {user[3]} (рядок {user[0]}): квіз - {user[1] or '—'}, статус - <b>{user[2] or '—'}</b>")
+    await update.message.reply_text("\n".join(lines), parse_mode='HTML')
+
+PROFILE_MAX_SECONDS = int(os.environ.get('PROFILE_MAX_SECONDS', 120))
+PROFILE_RUNNING = False
+
+async def run_profile_session(bot, chat_id, seconds):
+    """Фонова сесія профайлера: семплює, а потім шле звіт файлом"""
+    global PROFILE_RUNNING
+    profiler = lazy_import('profiler')
+    try:
+        report = await profiler.SamplingProfiler().run(seconds)
+        await bot.send_document(
+            chat_id=chat_id,
+            document=report.encode('utf-8'),
+            filename=f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+            caption=f"⏱ Профіль за {seconds} с"
+        )
+    except Exception as e:
+        logger.error(f"❌ Профайлер: {e}")
+        await bot.send_message(chat_id=chat_id, text=f"❌ Профайлер: {e}")
+    finally:
+        PROFILE_RUNNING = False
+
+async def admin_profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile <seconds> - семплюючий профайлер event loop-а та executor-а"""
+    global PROFILE_RUNNING
+    if not is_admin(update):
+        return
+
+    try:
+        seconds = int(context.args[0]) if context.args else 10
+    except ValueError:
+        await update.message.reply_text("Використання: /profile <секунди>")
+        return
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+
+    if PROFILE_RUNNING:
+        await update.message.reply_text("⏳ Профайлер вже працює")
+        return
+    PROFILE_RUNNING = True
+
+    # Не чекаємо в обробнику - інакше апдейти стоять у черзі весь час профілювання
+    context.application.create_task(run_profile_session(context.bot, update.effective_chat.id, seconds))
+    await update.message.reply_text(f"⏱ Профілюю {seconds} с, звіт прийде файлом")
+
+MEMORY_REPORTER = None
+
+# MEMORY_TRACE=1 - tracemalloc з самого старту main(), а не з першого /memory
+MEMORY_TRACE = os.environ.get('MEMORY_TRACE', '').lower() in ('1', 'true', 'yes')
+
+def get_memory_reporter():
+    global MEMORY_REPORTER
+    if MEMORY_REPORTER is None:
+        memreport = lazy_import('memreport')
+        MEMORY_REPORTER = memreport.MemoryReporter()
+        if MEMORY_TRACE:
+            MEMORY_REPORTER.start_tracing()
+    return MEMORY_REPORTER
+
+def memory_structures(application):
+    """Структури бота, що ростуть з часом: (кількість, об'єкт для deep sizeof)"""
+    t = application.bot_data.get('tenant') or tenant()
+    user_data = dict(application.user_data)
+    return {
+        'user_data': (len(user_data), user_data),
+        'chat_data': (len(application.chat_data), dict(application.chat_data)),
+        'jobs': (len(application.job_queue.jobs()), None),
+        'update_queue': (application.update_queue.qsize(), None),
+        'user_last_seen': (len(t.user_last_seen), t.user_last_seen),
+        'cold_storage_users': (t.cold_storage.count(), None),
+        'status_cache_leads': (len(t.status_cache.leads), t.status_cache.leads),
+        'status_cache_users': (len(t.status_cache.all_users), t.status_cache.all_users),
+        'phone_index': (len(t.phone_index), t.phone_index),
+        'journal_pending': (JOURNAL.snapshot()['pending_commit'], None),
+    }
+
+async def build_memory_report(application, diff=False):
+    """Звіт рахується в потоці loop-а, щоб словники не змінювались під час обходу"""
+    return get_memory_reporter().report(memory_structures(application), diff=diff)
+
+async def admin_memory_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/memory [diff | trace on | trace off] - звіт про пам'ять процесу"""
+    if not is_admin(update):
+        return
+
+    reporter = get_memory_reporter()
+    args = [arg.lower() for arg in context.args]
+    if args[:1] == ['trace']:
+        if args[1:2] == ['off']:
+            reporter.stop_tracing()
+            await update.message.reply_text("🧠 tracemalloc вимкнено")
+        else:
+            reporter.start_tracing()
+            await update.message.reply_text("🧠 tracemalloc увімкнено, перший знімок - наступним /memory")
+        return
+
+    memreport = lazy_import('memreport')
+    report = await build_memory_report(context.application, diff=args[:1] == ['diff'])
+    text = memreport.format_text(report)
+    if len(text) > 3500:
+        await update.message.reply_document(
+            document=text.encode('utf-8'),
+            filename=f"memory_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        )
+    else:
+        await update.message.reply_text(text)
+
+async def admin_catalog_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/catalog [reload] - версія каталогу текстів і цін / примусове перечитування файлу"""
+    if not is_admin(update):
+        return
+
+    if context.args[:1] == ['reload']:
+        try:
+            await reload_catalog(force=True)
+        except lazy_import('catalog').CatalogError as e:
+            await update.message.reply_text(f"❌ Каталог не оновлено, працює v{tenant().catalog.version}:\n{e}")
+            return
+
+    info = tenant().catalog.summary()
+    loaded = datetime.fromtimestamp(info['loaded_at']).strftime('%d.%m %H:%M:%S')
+    await update.message.reply_text(
+        f"📚 Каталог v{info['version']}\n"
+        f"Джерело: {info['source']}\n"
+        f"Завантажено: {loaded}\n"
+        f"Сегментів: {info['segments']}, інсайтів: {info['mini_cases']}, текстів: {info['texts']}\n\n"
+        f"Файл: {tenant().catalog_path} (перевірка кожні {CATALOG_POLL} с)"
+    )
+
+# =====================================================
+# РОЗСИЛКИ
+# =====================================================
+# Отримувачі вибираються з кешу статусів (All_Users / Leads) без запитів до
+# Sheets. Аудиторії:
+#   abandoned      - почали /start, але не завершили квіз і не стали лідом
+#   completed      - завершили квіз
+#   all            - всі
+#   segment:<код>  - ліди сегмента (напр. segment:A або segment:B2)
+# В усіх аудиторіях лише відкриті статуси (клієнти в роботі та blocked - ні).
+
+BROADCAST_RATE = float(os.environ.get('BROADCAST_RATE', 25))  # ліміт Telegram ~30/с (на кожен токен)
+BLOCKED_STATUS = 'blocked'
+
+# Кампанії тенанта лежать у tenant.broadcast_dir, активна - tenant.active_broadcast
+
+def select_recipients(audience):
+    """Список Telegram ID для аудиторії або None, якщо аудиторія невідома"""
+    cache = tenant().status_cache
+    leads, all_users = cache.leads, cache.all_users
+
+    if audience == 'abandoned':
+        ids = [key for key, user in all_users.items() if user[1] != "Так" and key not in leads]
+    elif audience == 'completed':
+        ids = [key for key, user in all_users.items() if user[1] == "Так"]
+    elif audience == 'all':
+        ids = list(all_users.keys() | leads.keys())
+    elif audience.startswith('segment:'):
+        code = audience.split(':', 1)[1].upper()
+        ids = [key for key, (_, _, segment) in leads.items() if segment.upper().startswith(code)] if code else []
+    else:
+        return None
+
+    return sorted(int(key) for key in ids if key.isdigit() and cache.status(key) in OPEN_STATUSES + (None,))
+
+async def broadcast_send(bot, chat_id, text):
+    keyboard = [[InlineKeyboardButton("✅ Пройти тест", callback_data=CB_RESTART_QUIZ)]]
+    await bot.send_message(chat_id=chat_id, text=text, parse_mode='HTML', reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def mark_blocked(chat_id):
+    """403: користувач заблокував бота - більше йому не пишемо"""
+    tenant().status_cache.note_status(chat_id, BLOCKED_STATUS)
+    await journal_write('status', {'telegram_id': chat_id, 'col': 7, 'value': BLOCKED_STATUS})
+
+def start_broadcast(application, campaign, report_chat_id):
+    """Запускає кампанію у фоні (одночасно - лише одна розсилка на тенанта)"""
+    broadcast = lazy_import('broadcast')
+    t = tenant()
+    bot = application.bot
+    t.active_broadcast = broadcast.BroadcastRunner(
+        campaign,
+        send=lambda chat_id: broadcast_send(bot, chat_id, campaign.text),
+        on_blocked=mark_blocked,
+        rate=BROADCAST_RATE
+    )
+    campaign.save()
+    application.create_task(run_broadcast(bot, t.active_broadcast, report_chat_id))
+
+async def run_broadcast(bot, runner, report_chat_id):
+    """Фонова задача розсилки; по завершенню шле адміну звіт"""
+    TRAFFIC_CLASS.set(BACKGROUND)  # лише для цієї задачі: розсилка не займає пул відповідей
+    campaign = runner.campaign
+    logger.info(f"📣 Розсилка {campaign.id}: {campaign.position}/{campaign.total}, {BROADCAST_RATE}/с")
+    try:
+        await runner.run()
+    except Exception as e:
+        logger.error(f"❌ Розсилка {campaign.id}: {e}")
+    finally:
+        tenant().active_broadcast = None
+    await log_event(report_chat_id, None, "broadcast_finished", f"{campaign.id}: {campaign.sent}/{campaign.total}")
+    if report_chat_id:
+        with traffic(ADMIN):
+            await bot.send_message(chat_id=report_chat_id, text=campaign.summary())
+
+def resume_broadcasts(application):
+    """Після рестарту продовжуємо перервані розсилки (по одній)"""
+    broadcast = lazy_import('broadcast')
+    t = tenant()
+    unfinished = broadcast.BroadcastCampaign.unfinished(t.broadcast_dir)
+    if not unfinished:
+        return
+    campaign = unfinished[0]
+    start_broadcast(application, campaign, t.admin_id)
+    logger.info(f"📣 Продовжуємо розсилку {campaign.id} з {campaign.position}/{campaign.total}")
+
+BROADCAST_USAGE = (
+    "Використання:\n"
+    "/broadcast count &lt;аудиторія&gt;\n"
+    "/broadcast start &lt;аудиторія&gt; &lt;текст&gt;\n"
+    "/broadcast status\n"
+    "/broadcast stop\n"
+    "/broadcast resume &lt;id&gt;\n\n"
+    "Аудиторії: abandoned, completed, all, segment:&lt;код&gt;"
+)
+
+async def admin_broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/broadcast ... - розсилка по базі користувачів"""
+    if not is_admin(update):
+        return
+
+    broadcast = lazy_import('broadcast')
+    t = tenant()
+    args = context.args
+    action = args[0].lower() if args else 'status'
+
+    if action == 'status':
+        if t.active_broadcast:
+            await update.message.reply_text(t.active_broadcast.campaign.summary())
+        else:
+            await update.message.reply_text("📣 Активної розсилки немає\n\n" + BROADCAST_USAGE, parse_mode='HTML')
+        return
+
+    if action == 'stop':
+        if t.active_broadcast:
+            t.active_broadcast.stop()
+            await update.message.reply_text(f"⏹ Зупиняю розсилку {t.active_broadcast.campaign.id}")
+        else:
+            await update.message.reply_text("📣 Активної розсилки немає")
+        return
+
+    if action in ('count', 'start') and len(args) >= 2:
+        if t.status_cache.version == 0:
+            await update.message.reply_text("⏳ Кеш користувачів ще не завантажено, спробуйте за хвилину")
+            return
+        recipients = select_recipients(args[1])
+        if recipients is None:
+            await update.message.reply_text(BROADCAST_USAGE, parse_mode='HTML')
+            return
+        if action == 'count':
+            await update.message.reply_text(f"👥 {args[1]}: {len(recipients)} отримувачів (~{len(recipients) / BROADCAST_RATE / 60:.1f} хв)")
+            return
+        text = update.message.text.split(None, 3)[3] if len(args) >= 3 else ''
+        if not text:
+            await update.message.reply_text(BROADCAST_USAGE, parse_mode='HTML')
+            return
+        campaign = broadcast.BroadcastCampaign(t.broadcast_dir, args[1], text, recipients)
+    elif action == 'resume' and len(args) >= 2:
+        try:
+            campaign = broadcast.BroadcastCampaign.load(t.broadcast_dir, args[1])
+        except (OSError, ValueError, KeyError):
+            await update.message.reply_text(f"🤷 Розсилку {args[1]} не знайдено")
+            return
+        campaign.state = 'running'
+    else:
+        await update.message.reply_text(BROADCAST_USAGE, parse_mode='HTML')
+        return
+
+    if t.active_broadcast:
+        await update.message.reply_text(f"⏳ Вже йде розсилка {t.active_broadcast.campaign.id}")
+        return
+
+    start_broadcast(context.application, campaign, update.effective_chat.id)
+    await update.message.reply_text(f"📣 Розсилка {campaign.id}: {campaign.total - campaign.position} отримувачів, {BROADCAST_RATE:.0f}/с")
+
 # =====================================================
 # НАГАДУВАННЯ (ЗБЕРЕЖЕНО З v3.0)
 # =====================================================
@@ -1451,8 +3416,8 @@ async def phone_reminder_callback(context: ContextTypes.DEFAULT_TYPE):
     job = context.job
     user_id = job.user_id
     
-    user_data = context.application.user_data.get(user_id)
-    phone_exists = user_data and 'phone_number' in user_data
+    user_data = await restore_user_data(context, user_id)
+    phone_exists = user_data and 'lead' in user_data
     
     if phone_exists:
         logger.info(f"⏰ Нагадування скасовано (вже є номер)")
@@ -1466,7 +3431,7 @@ async def phone_reminder_callback(context: ContextTypes.DEFAULT_TYPE):
 
     await context.bot.send_message(
         chat_id=job.chat_id,
-        text=TEXT_PHONE_REMINDER,
+        text=tenant().catalog.texts['TEXT_PHONE_REMINDER'],
         parse_mode='HTML',
         reply_markup=reply_markup
     )
@@ -1476,20 +3441,21 @@ async def quiz_reminder_callback(context: ContextTypes.DEFAULT_TYPE):
     job = context.job
     user_id = job.user_id
     
-    user_data = context.application.user_data.get(user_id, {})
-    if 'phone_number' in user_data:
+    user_data = await restore_user_data(context, user_id)
+    if 'lead' in user_data:
         return # Вже пройшов
 
-    # Новий текст: Сервісний, допомагаючий
-    text = """
-👋 <b>Ви не завершили діагностику...</b>
-
-Ми зупинилися на важливому етапі. Без відповідей на останні питання ми не зможемо розрахувати точний бюджет та підібрати стратегію.
+    await context.bot.send_message(chat_id=job.chat_id, text=tenant().catalog.texts['TEXT_QUIZ_REMINDER'], parse_mode='HTML')
 
-👆 <b>Дайте відповідь на питання вище, щоб продовжити з місця зупинки.
-Або натисніть /start, щоб почати спочатку</b>
-"""
-    await context.bot.send_message(chat_id=job.chat_id, text=text, parse_mode='HTML')
+    # Повторюємо питання, на якому зупинився користувач - квіз продовжиться з цього ж кроку
+    state = quiz_state(user_data)
+    if state in QUIZ_TEXTS:
+        await context.bot.send_message(
+            chat_id=job.chat_id,
+            text=tenant().catalog.texts[QUIZ_TEXTS[state]],
+            parse_mode='HTML',
+            reply_markup=quiz_keyboard(state)
+        )
 
 async def offer_reminder_callback(context: ContextTypes.DEFAULT_TYPE):
     """Нагадування через 1 годину"""
@@ -1498,10 +3464,11 @@ async def offer_reminder_callback(context: ContextTypes.DEFAULT_TYPE):
     chat_id = job.chat_id
     first_name = job.data
 
-    user_data = context.application.user_data.get(user_id, {})
-    status = user_data.get('status', 'new')
+    lead = get_lead(await restore_user_data(context, user_id))
+    status = effective_status(user_id, lead)
 
-    if status == 'scheduled':
+    # Замовив або менеджер вже опрацював ліда в таблиці
+    if status not in OPEN_STATUSES:
         return
 
     # Новий текст: Замість "чому не купили" -> "чи потрібна допомога?"
@@ -1524,9 +3491,9 @@ async def send_contact_button_job(context: ContextTypes.DEFAULT_TYPE):
     user_id = job.user_id
     first_name = job.data
 
-    # Перевіряємо, чи юзер вже замовив послугу
-    user_data = context.application.user_data.get(user_id, {})
-    if user_data.get('status') == 'scheduled':
+    # Перевіряємо, чи юзер вже замовив послугу (або менеджер змінив статус у таблиці)
+    lead = get_lead(await restore_user_data(context, user_id))
+    if effective_status(user_id, lead) not in OPEN_STATUSES:
         return
 
     text = f"""
@@ -1535,7 +3502,7 @@ async def send_contact_button_job(context: ContextTypes.DEFAULT_TYPE):
 Можливо, у вас виникли сумніви чи питання щодо процедури?
 Ми на зв'язку і готові підказати.
 """
-    keyboard = [[InlineKeyboardButton("💬 Залишились питання? Звʼяжіться з нами", callback_data='contact_support')]]
+    keyboard = [[InlineKeyboardButton("💬 Залишились питання? Звʼяжіться з нами", callback_data=CB_SUPPORT)]]
     
     await context.bot.send_message(
         chat_id=job.chat_id, 
@@ -1544,6 +3511,240 @@ async def send_contact_button_job(context: ContextTypes.DEFAULT_TYPE):
         reply_markup=InlineKeyboardMarkup(keyboard)
     )
 
+# =====================================================
+# ВИТІСНЕННЯ НЕАКТИВНИХ КОРИСТУВАЧІВ (TTL + LRU)
+# =====================================================
+# application.user_data тримає лише активних користувачів.
+# Ті, хто довго мовчить (завершили або кинули квіз), переїжджають у sqlite
+# і повертаються в пам'ять при наступному апдейті або нагадуванні.
+
+USER_STATE_TTL = int(os.environ.get('USER_STATE_TTL', 6 * 3600))  # сек. простою
+USER_STATE_MAX = int(os.environ.get('USER_STATE_MAX', 5000))  # макс. користувачів у пам'яті (на тенанта)
+COLD_STORAGE_PATH = os.environ.get('COLD_STORAGE_PATH') or os.path.join(DATA_DIR, 'user_state.db')  # тенанта default
+LEGACY_COLD_STORAGE_PATH = 'user_state.db'  # старе значення за замовчуванням (відносно cwd)
+
+class ColdUserStorage:
+    """
+    Холодне сховище user_data (sqlite + pickle).
+
+    sqlite працює в окремому потоці (одне з'єднання, один воркер), щоб не
+    блокувати event loop. Множина ids - хто зараз лежить у сховищі: для
+    решти (напр. кожен перший /start) відомо, що стану немає, і запиту до
+    sqlite не буде.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._ids = None        # None - ще не завантажено з диска
+        self._popping = {}      # user_id -> future pop-у, що вже виконується
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='cold-storage')
+
+    def _db(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_state ("
+                "user_id INTEGER PRIMARY KEY, data BLOB NOT NULL, evicted_at TEXT NOT NULL)"
+            )
+            self._ids = {row[0] for row in self._conn.execute("SELECT user_id FROM user_state")}
+        return self._conn
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def open(self):
+        """Відкриває базу і вантажить ids (інакше - при першому зверненні)"""
+        await self._run(self._db)
+
+    def _put_many_sync(self, items):
+        db = self._db()
+        evicted_at = datetime.now().isoformat()
+        db.executemany(
+            "INSERT OR REPLACE INTO user_state (user_id, data, evicted_at) VALUES (?, ?, ?)",
+            [(user_id, blob, evicted_at) for user_id, blob in items]
+        )
+        db.commit()
+        self._ids.update(user_id for user_id, _ in items)
+
+    async def put_many(self, items):
+        """[(user_id, user_data)] - одна транзакція на всю пачку"""
+        # pickle - в event loop-і: обробники можуть змінювати user_data, поки працює потік
+        blobs = [(user_id, pickle.dumps(dict(user_data), pickle.HIGHEST_PROTOCOL)) for user_id, user_data in items]
+        await self._run(self._put_many_sync, blobs)
+
+    def _discard_many_sync(self, user_ids):
+        db = self._db()
+        db.executemany("DELETE FROM user_state WHERE user_id = ?", [(user_id,) for user_id in user_ids])
+        db.commit()
+        self._ids.difference_update(user_ids)
+
+    async def discard_many(self, user_ids):
+        await self._run(self._discard_many_sync, list(user_ids))
+
+    def _pop_sync(self, user_id):
+        db = self._db()
+        if user_id not in self._ids:
+            return None
+        row = db.execute("SELECT data FROM user_state WHERE user_id = ?", (user_id,)).fetchone()
+        db.execute("DELETE FROM user_state WHERE user_id = ?", (user_id,))
+        db.commit()
+        self._ids.discard(user_id)
+        return pickle.loads(row[0]) if row else None
+
+    async def pop(self, user_id):
+        if self._ids is not None and user_id not in self._ids:
+            return None
+        # Два апдейти одного користувача підряд чекають той самий pop
+        future = self._popping.get(user_id)
+        if future is None:
+            future = asyncio.ensure_future(self._run(self._pop_sync, user_id))
+            self._popping[user_id] = future
+            future.add_done_callback(lambda _: self._popping.pop(user_id, None))
+        return await asyncio.shield(future)
+
+    def count(self):
+        return len(self._ids or ())
+
+# Сховище тенанта - tenant.cold_storage, а tenant.user_last_seen - це
+# user_id -> час останньої активності (від найстарішого до найсвіжішого)
+
+# Звернення до холодного сховища: скільки разів стан шукали для витісненого
+# користувача і скільки разів він там справді був
+USER_STATE_STATS = {'cold_lookups': 0, 'cold_hits': 0}
+
+def touch_user(user_id):
+    last_seen = tenant().user_last_seen
+    last_seen[user_id] = CLOCK.monotonic()
+    last_seen.move_to_end(user_id)
+
+async def restore_user_data(context: ContextTypes.DEFAULT_TYPE, user_id):
+    """Повертає user_data з холодного сховища, якщо користувача було витіснено"""
+    user_data = context.user_data
+    if user_data is None or user_data:
+        return user_data
+    USER_STATE_STATS['cold_lookups'] += 1
+    try:
+        restored = await tenant().cold_storage.pop(user_id)
+    except Exception as e:
+        logger.error(f"❌ Помилка читання холодного сховища: {e}")
+        return user_data
+    # Поки читали, стан міг уже відновити інший апдейт цього ж користувача
+    if restored and not user_data:
+        USER_STATE_STATS['cold_hits'] += 1
+        user_data.update(restored)
+        # Стан знову в пам'яті - під LRU, інакше його вже ніколи не витіснять (напр. відновлення з нагадування)
+        touch_user(user_id)
+        logger.info(f"♻️ Стан користувача {user_id} відновлено з холодного сховища")
+    return user_data
+
+async def track_user_activity(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Група -1: оновлює LRU і піднімає витіснений стан перед основними обробниками"""
+    user = update.effective_user
+    if user is None:
+        return
+    touch_user(user.id)
+    await restore_user_data(context, user.id)
+
+async def evict_inactive_users(context: ContextTypes.DEFAULT_TYPE):
+    """Переносить неактивних користувачів у холодне сховище (одним записом)"""
+    application = context.application
+    t = tenant()
+    last_seen_by_user = t.user_last_seen
+    now = CLOCK.monotonic()
+    overflow = len(last_seen_by_user) - USER_STATE_MAX
+
+    # Користувачів із запланованими нагадуваннями не чіпаємо
+    pending = {job.user_id for job in application.job_queue.jobs()}
+
+    candidates = {}  # user_id -> час останньої активності
+    for user_id, last_seen in last_seen_by_user.items():
+        if overflow <= 0 and now - last_seen < USER_STATE_TTL:
+            break
+        if user_id in pending:
+            continue
+        candidates[user_id] = last_seen
+        overflow -= 1
+    if not candidates:
+        return
+
+    to_store = [(user_id, application.user_data[user_id]) for user_id in candidates if application.user_data.get(user_id)]
+    try:
+        if to_store:
+            await t.cold_storage.put_many(to_store)
+    except Exception as e:
+        logger.error(f"❌ Помилка запису в холодне сховище: {e}")
+        return
+
+    # Хто написав, поки йшов запис, лишається в пам'яті, а його копія в сховищі - зайва
+    stale = []
+    evicted = 0
+    for user_id, last_seen in candidates.items():
+        if last_seen_by_user.get(user_id) != last_seen:
+            stale.append(user_id)
+            continue
+        application.drop_user_data(user_id)
+        if not application.chat_data.get(user_id):
+            application.drop_chat_data(user_id)
+        del last_seen_by_user[user_id]
+        evicted += 1
+    if stale:
+        try:
+            await t.cold_storage.discard_many(stale)
+        except Exception as e:
+            logger.error(f"❌ Помилка запису в холодне сховище: {e}")
+
+    if evicted:
+        logger.info(f"🧊 Витіснено{tenant_label(t)} {evicted} неактивних користувачів (в пам'яті: {len(last_seen_by_user)})")
+
+# =====================================================
+# СТАН ТЕНАНТІВ
+# =====================================================
+
+def default_cold_storage_path():
+    """Сховище тенанта default; старе user_state.db у cwd (до DATA_DIR) не губимо"""
+    if (not os.environ.get('COLD_STORAGE_PATH') and not os.path.exists(COLD_STORAGE_PATH)
+            and os.path.exists(LEGACY_COLD_STORAGE_PATH)):
+        logger.warning(f"⚠️ Холодне сховище: використовую {LEGACY_COLD_STORAGE_PATH} з поточної теки - перенесіть його в {COLD_STORAGE_PATH}")
+        return LEGACY_COLD_STORAGE_PATH
+    return COLD_STORAGE_PATH
+
+def init_tenant_state(t):
+    """Кеші, індекси та сховища, що належать таблиці / боту тенанта"""
+    if t.is_default:
+        t.sheets_breaker = SHEETS_BREAKER
+        t.cold_storage = ColdUserStorage(default_cold_storage_path())
+    else:
+        t.sheets_breaker = CircuitBreaker(
+            f"sheets@{t.name}",
+            failure_threshold=SHEETS_BREAKER.failure_threshold,
+            reset_timeout=SHEETS_BREAKER.reset_timeout,
+            call_timeout=SHEETS_BREAKER.call_timeout
+        )
+        t.cold_storage = ColdUserStorage(os.path.join(t.data_dir, 'user_state.db'))
+    BREAKERS[t.sheets_breaker.name] = t.sheets_breaker
+    t.shards = ShardManifest()
+    t.status_cache = SheetsStatusCache(t.shards)
+    t.status_coalescer = StatusCoalescer(t.status_cache, t.shards)
+    t.phone_index = PhoneIndex()
+    t.user_last_seen = OrderedDict()
+    return t
+
+for _tenant in TENANTS:
+    init_tenant_state(_tenant)
+
+def tenant_snapshot(t):
+    return {
+        "sheets": t.sheets.snapshot() if t.sheets else None,
+        "status_updates": t.status_coalescer.snapshot(),
+        "catalog": t.catalog.summary() if t.catalog else None,
+        "users_in_memory": len(t.user_last_seen),
+        "broadcast": t.active_broadcast.campaign.id if t.active_broadcast else None,
+    }
+
 # =====================================================
 # ОБРОБНИК ПОМИЛОК (Global Error Handler)
 # =====================================================
@@ -1553,7 +3754,8 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     logger.error(msg="Exception while handling an update:", exc_info=context.error)
 
     # Якщо є ADMIN_ID, повідомляємо його про збій
-    if ADMIN_ID:
+    admin_id = tenant().admin_id
+    if admin_id:
         try:
             # Формуємо повідомлення про помилку
             error_message = f"⚠️ <b>У бота сталася помилка!</b>\n\n<code>{context.error}</code>"
@@ -1562,15 +3764,784 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
             if len(error_message) > 2000:
                 error_message = error_message[:2000]
             
-            await context.bot.send_message(chat_id=ADMIN_ID, text=error_message, parse_mode='HTML')
+            with traffic(ADMIN):
+                await context.bot.send_message(chat_id=admin_id, text=error_message, parse_mode='HTML')
         except:
             # Якщо не вдалося відправити повідомлення адміну, просто мовчимо (помилка вже в логах)
             pass
 
+# =====================================================
+# ЕКСПОРТ / БЕКФІЛ ІСТОРІЇ (python bot.py export ...)
+# =====================================================
+# Приклади:
+#   python bot.py export leads --csv leads.csv
+#   python bot.py export events --sheet Analytics --sheet-url https://docs.google.com/...
+# Переривання безпечне: повторний запуск продовжить з останнього чекпоінта, а
+# рядки з ключем журналу, що вже є в цілі, не допишуться вдруге (рядки старих
+# архівів, без ключа, захищає лише чекпоінт).
+# --sheet Analytics пише, як і живі записи, у місячні шарди Analytics_YYYY_MM.
+
+def read_checkpoint(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'offset': 0, 'rows': 0}
+
+def write_checkpoint(path, checkpoint):
+    """Атомарний запис чекпоінта (tmp + rename)"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def iter_archive_chunks(kind, offset, chunk_size):
+    """Стрімить архів шматками: (рядки, байтовий зсув після шматка)"""
+    with open(archive_path(kind), 'rb') as f:
+        f.seek(offset)
+        chunk = []
+        for line in f:
+            offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk, offset
+                chunk = []
+        if chunk:
+            yield chunk, offset
+
+EXPORT_MAX_ATTEMPTS = 8
+EXPORT_RETRY_DELAY = 2
+EXPORT_RETRY_MAX_DELAY = 60
+
+def export_row(kind, row):
+    """Рядок архіву у вигляді живого листа (у старих архівах ще немає ключа журналу)"""
+    width = len(ARCHIVE_HEADERS[kind])
+    return list(row[:width]) + [''] * (width - len(row))
+
+async def export_call(fn, *args):
+    """Запит до Sheets з повтором тимчасових збоїв (429, 5xx, мережа) з наростаючою паузою"""
+    for attempt in range(1, EXPORT_MAX_ATTEMPTS + 1):
+        try:
+            return await fn(*args)
+        except Exception as e:
+            if is_permanent_failure(e) or attempt == EXPORT_MAX_ATTEMPTS:
+                raise
+            delay = min(EXPORT_RETRY_DELAY * 2 ** (attempt - 1), EXPORT_RETRY_MAX_DELAY)
+            logger.warning(f"⏳ Експорт: {type(e).__name__}: {e} - повтор через {delay} с")
+            await asyncio.sleep(delay)
+
+def read_csv_keys(path):
+    """Ключі журналу (остання колонка), що вже є в CSV - для продовження без дублікатів"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return {row[-1] for row in csv.reader(f) if row and row[-1]}
+
+async def open_export_target(args, header, resume):
+    """
+    Повертає корутини write(rows) / close() для CSV або листа Google Sheets.
+    Рядки з ключем журналу, який уже є в цілі, пропускаються: повтор шматка
+    після переривання не дублює рядки
+    """
+    if args.csv:
+        is_new = not resume or not os.path.exists(args.csv)
+        present = set() if is_new else read_csv_keys(args.csv)
+        f = open(args.csv, 'w' if is_new else 'a', encoding='utf-8', newline='')
+        writer = csv.writer(f)
+        if is_new:
+            writer.writerow(header)
+
+        async def write_csv(rows):
+            fresh = [row for row in rows if not row[-1] or row[-1] not in present]
+            writer.writerows(fresh)
+            present.update(row[-1] for row in fresh if row[-1])
+            f.flush()
+
+        async def close_csv():
+            f.close()
+        return write_csv, close_csv
+
+    sheet_url = args.sheet_url or tenant().sheet_url
+    if not sheet_url:
+        raise SystemExit("❌ Вкажіть --sheet-url або GOOGLE_SHEET_URL")
+    client = create_sheets_client(sheet_url)
+    if client is None:
+        raise SystemExit("❌ Google Sheets не налаштовано")
+    sheets_client = lazy_import('sheets_client')
+
+    # Базовий лист із шардами (Analytics) - рядок іде в шард свого місяця, як і живі записи
+    base = args.sheet
+    manifest = None
+    if base in SHARDED_SHEETS:
+        if SHARDED_SHEETS[base] != header:
+            await client.close()
+            raise SystemExit(f"❌ Лист {base} має інші колонки, ніж архів {args.kind}")
+        manifest = ShardManifest()
+        await export_call(manifest.load, client)
+    else:
+        await export_call(client.ensure_sheet, base, header, 1000, max(10, len(header)))
+        await export_call(client.ensure_headers, {base: header})
+
+    key_column = sheets_client.column_letter(len(header))
+    present = {}  # лист -> ключі журналу, що вже є в ньому
+
+    async def keys_in(title):
+        if title not in present:
+            values = await export_call(client.values_get, sheets_client.a1(title, f"{key_column}:{key_column}"))
+            present[title] = {cells[0] for cells in values if cells}
+        return present[title]
+
+    async def write_sheet(rows):
+        # Один values.append на лист (шард) у чанку
+        groups = {}
+        for row in rows:
+            title = await export_call(manifest.ensure, client, base, shard_period(row[0])) if manifest else base
+            groups.setdefault(title, []).append(row)
+        for title, group in groups.items():
+            keys = await keys_in(title)
+            fresh = [row for row in group if not row[-1] or row[-1] not in keys]
+            if fresh:
+                await export_call(client.append_rows, title, fresh)
+                keys.update(row[-1] for row in fresh if row[-1])
+    return write_sheet, client.close
+
+async def run_export(args, checkpoint, checkpoint_path, resume):
+    """Основний цикл експорту (один event loop на весь прогін). Повертає кількість рядків"""
+    write, close = await open_export_target(args, ARCHIVE_HEADERS[args.kind], resume)
+    started = time.monotonic()
+    exported = 0
+    try:
+        for rows, offset in iter_archive_chunks(args.kind, checkpoint['offset'], args.chunk):
+            await write([export_row(args.kind, row) for row in rows])
+            exported += len(rows)
+            checkpoint = {'offset': offset, 'rows': checkpoint['rows'] + len(rows)}
+            write_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.monotonic() - started
+            logger.info(f"📤 {checkpoint['rows']} рядків ({exported / elapsed:.0f} рядків/с)")
+            if args.sheet and args.pause:
+                await asyncio.sleep(args.pause)
+    finally:
+        await close()
+    return exported
+
+def export_main(argv):
+    """CLI: пакетний експорт локального архіву в CSV або Google Sheets"""
+    parser = argparse.ArgumentParser(prog='bot.py export', description="Експорт лідів / подій з локального архіву")
+    parser.add_argument('kind', choices=sorted(ARCHIVE_HEADERS))
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--csv', help="шлях до CSV-файлу")
+    target.add_argument('--sheet', help="назва листа в таблиці (Analytics - по місячних шардах)")
+    parser.add_argument('--sheet-url', help="URL таблиці (за замовчуванням - таблиця тенанта)")
+    parser.add_argument('--tenant', default=TENANTS[0].name, help="чий архів експортувати (TENANTS_FILE)")
+    parser.add_argument('--chunk', type=int, default=1000, help="рядків за один запис")
+    parser.add_argument('--pause', type=float, default=1.0, help="пауза між записами в Sheets, сек (квота)")
+    parser.add_argument('--checkpoint', help="файл чекпоінта")
+    parser.add_argument('--restart', action='store_true', help="почати з початку, ігноруючи чекпоінт")
+    args = parser.parse_args(argv)
+
+    selected = find_tenant(args.tenant)
+    if selected is None:
+        logger.error(f"❌ Тенанта {args.tenant} немає (є: {', '.join(t.name for t in TENANTS)})")
+        return 1
+    CURRENT_TENANT.set(selected)
+
+    if not os.path.exists(archive_path(args.kind)):
+        logger.error(f"❌ Архів {archive_path(args.kind)} не знайдено")
+        return 1
+
+    target_name = os.path.basename(args.csv) if args.csv else args.sheet
+    checkpoint_path = args.checkpoint or os.path.join(selected.data_dir, f"export_{args.kind}_{target_name}.ckpt")
+    checkpoint = {'offset': 0, 'rows': 0} if args.restart else read_checkpoint(checkpoint_path)
+    resume = checkpoint['offset'] > 0
+
+    if resume:
+        logger.info(f"⏯ Продовжую з чекпоінта: {checkpoint['rows']} рядків уже експортовано")
+
+    started = time.monotonic()
+    exported = asyncio.run(run_export(args, checkpoint, checkpoint_path, resume))
+
+    elapsed = time.monotonic() - started
+    logger.info(f"✅ Експорт {args.kind} завершено: {exported} рядків за {elapsed:.1f} с")
+    return 0
+
+# =====================================================
+# СИМУЛЯЦІЯ НАГАДУВАНЬ (python bot.py simulate ...)
+# =====================================================
+# Приклад:
+#   python bot.py simulate --users 10000 --days 2
+# Віртуальні користувачі проходять квіз справжніми обробниками і кидають
+# його на різних кроках. Паузи, нагадування JobQueue та витіснення йдуть
+# у віртуальному часі; Telegram, Sheets і Make не викликаються, журнал і
+# холодне сховище - у тимчасовій папці.
+
+SIM_USER_BASE = 9_000_000_000
+SIM_STEP_NAMES = {
+    QS_Q1: 'Q1', QS_Q1_CLARIFY: 'Q1 (уточнення)', QS_Q2: 'Q2', QS_Q3: 'Q3',
+    QS_Q3_CLARIFY: 'Q3 (уточнення)', QS_Q4: 'Q4', QS_Q5: 'Q5', QS_PHONE: 'телефоні',
+}
+
+async def simulate_user(app, user, rng, args, outcomes):
+    """Один віртуальний користувач: /start, квіз, телефон і (можливо) замовлення"""
+    simulation = lazy_import('simulation')
+    bot = app.bot
+
+    async def send(handler, update):
+        context = app.context(user.id)
+        await track_user_activity(update, context)
+        await handler(update, context)
+
+    async def think(mean):
+        await pace(rng.expovariate(1 / mean))
+
+    async def abandon(step):
+        outcomes[f"кинули на {SIM_STEP_NAMES[step]}"] += 1
+        if rng.random() < args.return_rate:
+            await think(args.return_hours * 3600)
+            outcomes['повернулись через /start'] += 1
+            await send(start, simulation.message_update(bot, user, '/start'))
+
+    try:
+        await pace(rng.uniform(0, args.arrival_hours * 3600))
+        await send(start, simulation.message_update(bot, user, '/start'))
+        await think(args.think)
+        await send(dispatch_callback, simulation.callback_update(bot, user, CB_START_QUIZ))
+
+        while True:
+            state = quiz_state(app.user_data.get(user.id, {}))
+            if state is None:
+                outcomes['стан втрачено'] += 1
+                return
+            if rng.random() < args.abandon:
+                await abandon(state)
+                return
+            if state not in QUIZ_BUTTONS:
+                break
+            await think(args.think)
+            _, data = rng.choice(QUIZ_BUTTONS[state])
+            await send(dispatch_callback, simulation.callback_update(bot, user, data))
+
+        await think(args.think)
+        await send(process_contact, simulation.message_update(bot, user, phone=user.phone))
+        outcomes['лід'] += 1
+
+        if rng.random() < args.book:
+            await think(args.book_minutes * 60)
+            await send(dispatch_callback, simulation.callback_update(bot, user, CB_BOOK))
+            outcomes['замовили'] += 1
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        outcomes[f"помилка {type(e).__name__}"] += 1
+
+async def run_simulation(args):
+    global CLOCK, JOURNAL, MAKE_WEBHOOK_URL
+    clock = lazy_import('clock')
+    simulation = lazy_import('simulation')
+
+    workdir = tempfile.mkdtemp(prefix='bot-simulate-')
+    CLOCK = clock.SimClock()
+    JOURNAL = Journal(os.path.join(workdir, 'journal'), consumers=(), commit_interval=0, durable=False)
+    MAKE_WEBHOOK_URL = ''
+    # Свій тенант без таблиці: кеші та холодне сховище не перетинаються з продовими
+    sim_tenant = init_tenant_state(Tenant(DEFAULT_TENANT, '', catalog_path=TENANTS[0].catalog_path, data_dir=workdir))
+    sim_tenant.cold_storage = ColdUserStorage(':memory:')
+    CURRENT_TENANT.set(sim_tenant)
+    await JOURNAL.start()
+    await sim_tenant.cold_storage.open()
+    try:
+        await reload_catalog(force=True)
+    except lazy_import('catalog').CatalogError:
+        pass  # вже в логах, працюють вбудовані тексти
+
+    job_queue = simulation.SimJobQueue(CLOCK)
+    app = simulation.SimApplication(simulation.SimBot(), job_queue)
+    job_queue.run_repeating(evict_inactive_users, interval=60, first=60, name="evict_inactive_users")
+
+    rng = random.Random(args.seed)
+    outcomes = Counter()
+    for index in range(args.users):
+        user = simulation.SimUser(SIM_USER_BASE + index)
+        CLOCK.spawn(simulate_user(app, user, random.Random(rng.getrandbits(64)), args, outcomes))
+
+    started = time.perf_counter()
+    try:
+        await CLOCK.run(until=args.days * 86400)
+        wall = time.perf_counter() - started
+        await CLOCK.shutdown()
+    finally:
+        await JOURNAL.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    extra = {
+        'Користувачі': f"{args.users} " + ", ".join(f"{name}: {count}" for name, count in sorted(outcomes.items())),
+        'Звернень до холодного сховища': f"{USER_STATE_STATS['cold_lookups']} (знайдено стан: {USER_STATE_STATS['cold_hits']})",
+        'В пам\'яті наприкінці': len(sim_tenant.user_last_seen),
+        'Реальний час': f"{wall:.1f} с (x{CLOCK.elapsed / max(wall, 1e-9):,.0f})",
+    }
+    print(simulation.format_report(job_queue, app.bot, CLOCK, extra))
+    return 0
+
+def simulate_main(argv):
+    """CLI: прогін нагадувань і пауз для тисяч віртуальних користувачів"""
+    parser = argparse.ArgumentParser(prog='bot.py simulate', description="Симуляція нагадувань у віртуальному часі")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--days', type=float, default=2.0, help="скільки віртуального часу проганяти")
+    parser.add_argument('--arrival-hours', type=float, default=12.0, help="вікно, за яке приходять користувачі")
+    parser.add_argument('--abandon', type=float, default=0.12, help="ймовірність кинути квіз на кожному кроці")
+    parser.add_argument('--think', type=float, default=20.0, help="середній час на відповідь, сек")
+    parser.add_argument('--book', type=float, default=0.3, help="частка лідів, що натискають 'Замовити'")
+    parser.add_argument('--book-minutes', type=float, default=30.0, help="середня затримка до замовлення, хв")
+    parser.add_argument('--return-rate', type=float, default=0.2, help="частка тих, хто кинув квіз і повертається")
+    parser.add_argument('--return-hours', type=float, default=12.0, help="середня затримка повернення, год")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    # Тисячі користувачів - не засмічуємо вивід логами обробників
+    logging.getLogger().setLevel(logging.ERROR)
+    return asyncio.run(run_simulation(args))
+
+# =====================================================
+# ТРАСИ АПДЕЙТІВ: ЗАПИС І ВІДТВОРЕННЯ
+# =====================================================
+# TRACE_PATH=traces/prod.jsonl.gz - бот пише знеособлені вхідні апдейти
+# (див. traces.py). `python bot.py replay <траса> --speed 10` подає їх у той
+# самий Application з тими ж обробниками, але на FakeBot / фейкових Sheets /
+# MakeSink - бенчмарк на реальній поведінці користувачів (подвійні натискання,
+# відвал на Q4, телефон текстом).
+
+TRACE_PATH = os.environ.get('TRACE_PATH', '')
+TRACE_SAMPLE = float(os.environ.get('TRACE_SAMPLE', 1.0))  # частка користувачів у трасі
+TRACE_FLUSH_INTERVAL = 10
+
+TRACE_RECORDER = None
+
+async def record_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Група -3: апдейт у трасу до будь-якої обробки"""
+    user = update.effective_user
+    try:
+        TRACE_RECORDER.record(update.to_dict(), user.id if user else None)
+    except Exception as e:
+        logger.error(f"❌ Траса: не вдалося записати апдейт: {e}")
+
+async def flush_trace(context: ContextTypes.DEFAULT_TYPE):
+    """Скидає буфер gzip, щоб при падінні втратився лише хвіст"""
+    TRACE_RECORDER.flush()
+
+def start_trace_recording(application):
+    """Одна траса на процес: апдейти всіх ботів пишуться в той самий файл"""
+    global TRACE_RECORDER
+    if TRACE_RECORDER is None:
+        traces = lazy_import('traces')
+        TRACE_RECORDER = traces.TraceRecorder(TRACE_PATH, sample=TRACE_SAMPLE).open()
+        application.job_queue.run_repeating(flush_trace, interval=TRACE_FLUSH_INTERVAL, first=TRACE_FLUSH_INTERVAL, name="flush_trace")
+        logger.info(f"🎞 Запис траси апдейтів: {TRACE_PATH} (частка користувачів {TRACE_SAMPLE:g})")
+    application.add_handler(TypeHandler(Update, record_update), group=-3)
+
+async def run_replay(args):
+    """Відтворює трасу на фейкових бекендах і друкує звіт"""
+    global CLOCK, JOURNAL, DATA_DIR, TENANTS, FAKE_BACKENDS, MAKE_WEBHOOK_URL
+    clock = lazy_import('clock')
+    fakes = lazy_import('fakes')
+    traces = lazy_import('traces')
+
+    # Все, що бот пише на диск, - у тимчасову теку, а не поруч із продовими даними.
+    # Траса відтворюється одним ботом: тексти - з каталогу першого тенанта
+    workdir = tempfile.mkdtemp(prefix='bot-replay-')
+    DATA_DIR = workdir
+    replay_tenant = init_tenant_state(Tenant(DEFAULT_TENANT, 'replay', catalog_path=TENANTS[0].catalog_path, data_dir=workdir))
+    replay_tenant.cold_storage = ColdUserStorage(os.path.join(workdir, 'user_state.db'))
+    TENANTS = [replay_tenant]
+    JOURNAL = Journal(
+        os.path.join(workdir, 'journal'),
+        consumers=(replay_tenant.sheets_consumer, 'make', 'archive'),
+        commit_interval=JOURNAL.commit_interval
+    )
+    FAKE_BACKENDS = True
+    # Паузи сценарію пришвидшуються разом із трасою; нагадування JobQueue - ні
+    CLOCK = clock.ScaledClock(args.speed)
+
+    sink = fakes.MakeSink(fakes.FaultProfile.from_env('FAKE_MAKE')).start()
+    MAKE_WEBHOOK_URL = sink.url
+    fake_bot = fakes.FakeBot(profile=fakes.FaultProfile.from_env('FAKE_TELEGRAM'))
+    application = build_application(replay_tenant, Application.builder().bot(fake_bot))
+    register_handlers(application)
+
+    errors = Counter()
+
+    async def count_error(update, context):
+        errors[type(context.error).__name__] += 1
+
+    application.add_error_handler(count_error)
+
+    async def feed(data):
+        await application.update_queue.put(Update.de_json(data, application.bot))
+
+    try:
+        await application.initialize()
+        await on_startup(application)
+        await application.start()
+        stats = await traces.play(traces.read_trace(args.trace, args.limit), feed, args.speed)
+        drain_started = time.perf_counter()
+        await application.update_queue.join()
+        drain = time.perf_counter() - drain_started
+        pending_jobs = len(application.job_queue.jobs())
+        await application.stop()
+        await application.shutdown()
+        await on_shutdown(application)
+        journal = JOURNAL.snapshot()
+    finally:
+        sink.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    calls = Counter(name for name, _, _ in fake_bot.calls)
+    lanes = UPDATE_PROCESSOR.snapshot()['lanes']
+    speed = f"x{args.speed:g}" if args.speed > 0 else "без пауз"
+    lines = [
+        f"🎞 Відтворення {args.trace}: {stats['updates']} апдейтів, {stats['trace_seconds']:.1f} с траси ({speed})",
+        f"Реальний час: {stats['wall_seconds']:.1f} с подачі + {drain:.1f} с дообробки",
+    ]
+    if args.speed > 0 and stats['updates']:
+        lines.append(f"Запізнення подачі: сер. {stats['lag_total'] / stats['updates'] * 1000:.1f} мс, макс. {stats['lag_max'] * 1000:.1f} мс")
+    lines += ["", "Черги обробки:"]
+    for name, lane in lanes.items():
+        lines.append(f"  {name:<8} {lane['processed']:>7} апдейтів, очікування сер. {lane['wait_avg_ms']} мс, макс. {lane['wait_max_ms']} мс")
+    lines += ["", "Виклики Telegram API:"]
+    for name, count in calls.most_common():
+        lines.append(f"  {name:<28}{count:>7}")
+    lines += [
+        "",
+        f"Make: {len(sink.received)} payload-ів",
+        f"Журнал: {journal['appended']} записів, {journal['fsyncs']} fsync, не донесено: {journal['backlog_bytes']} байт",
+        f"Помилок в обробниках: {sum(errors.values())}" + (f" {dict(errors)}" if errors else ""),
+        f"Нагадувань, що не встигли спрацювати: {pending_jobs}",
+    ]
+    print("\n".join(lines))
+    return 0
+
+def replay_main(argv):
+    """CLI: відтворення траси апдейтів на фейкових бекендах"""
+    parser = argparse.ArgumentParser(prog='bot.py replay', description="Відтворення траси апдейтів (TRACE_PATH)")
+    parser.add_argument('trace', help="файл траси (.jsonl.gz)")
+    parser.add_argument('--speed', type=float, default=1.0, help="у скільки разів швидше за реальний темп (0 - без пауз)")
+    parser.add_argument('--limit', type=int, default=None, help="відтворити лише перші N апдейтів")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    return asyncio.run(run_replay(args))
+
 # =====================================================
 # ГОЛОВНА ФУНКЦІЯ
 # =====================================================
 
+# =====================================================
+# ПРІОРИТЕТИ ОБРОБКИ АПДЕЙТІВ
+# =====================================================
+# Під час піку /start-ів кроки, що приносять гроші (телефон, "Замовити",
+# "Зв'язатися"), не мають стояти в черзі за новими користувачами.
+
+UPDATE_WORKERS = int(os.environ.get('UPDATE_WORKERS', 8))
+UPDATE_HIGH_RESERVE = int(os.environ.get('UPDATE_HIGH_RESERVE', 2))
+UPDATE_MAX_PENDING = int(os.environ.get('UPDATE_MAX_PENDING', 1000))
+
+HIGH_PRIORITY_CALLBACKS = (CB_BOOK, CB_SUPPORT)
+ADMIN_COMMANDS = ('status', 'profile', 'memory', 'broadcast', 'catalog')
+
+UPDATE_PROCESSOR = None
+
+def update_tenant(update):
+    """Тенант, чий бот отримав апдейт (процесор спільний - контексту тенанта тут ще немає)"""
+    try:
+        bot = update.get_bot()
+    except RuntimeError:
+        return tenant()
+    return next((t for t in TENANTS if t.application is not None and t.application.bot is bot), tenant())
+
+def admin_command(update, text):
+    """/status, /memory ... від адміна тенанта (від будь-кого іншого - звичайний текст)"""
+    command = text[1:].split(maxsplit=1)[0].split('@')[0] if len(text) > 1 else ''
+    return command in ADMIN_COMMANDS and is_admin(update, update_tenant(update))
+
+def classify_update(update):
+    """(смуга, Telegram ID) для PriorityUpdateProcessor"""
+    priority = lazy_import('priority')
+    user = update.effective_user
+    user_key = user.id if user else None
+
+    if update.callback_query:
+        if canonical_callback(update.callback_query.data) in HIGH_PRIORITY_CALLBACKS:
+            return priority.HIGH, user_key
+        return priority.NORMAL, user_key
+
+    message = update.message
+    if message:
+        if message.contact:
+            return priority.HIGH, user_key
+        text = message.text or ''
+        if text.startswith('/start'):
+            return priority.LOW, user_key
+        if text.startswith('/'):
+            return (priority.HIGH if admin_command(update, text) else priority.NORMAL), user_key
+        if extract_phone(text):
+            return priority.HIGH, user_key  # телефон, введений текстом
+    return priority.NORMAL, user_key
+
+def create_update_processor():
+    global UPDATE_PROCESSOR
+    priority = lazy_import('priority')
+    UPDATE_PROCESSOR = priority.PriorityUpdateProcessor(
+        classify_update,
+        workers=UPDATE_WORKERS,
+        high_reserve=UPDATE_HIGH_RESERVE,
+        max_pending=UPDATE_MAX_PENDING
+    )
+    return UPDATE_PROCESSOR
+
+# =====================================================
+# HTTP-ПУЛИ TELEGRAM BOT API ЗА КЛАСАМИ ТРАФІКУ
+# =====================================================
+# Відповіді на апдейти, нагадування / розсилки та сповіщення адміну йдуть
+# через окремі пули (див. request_pools.py): сплеск нагадувань не забирає
+# з'єднання у відповідей на кнопки. Налаштування кожного класу:
+#   TELEGRAM_POOL_<КЛАС>              - з'єднань
+#   TELEGRAM_POOL_<КЛАС>_READ_TIMEOUT - секунд на відповідь Telegram
+#   TELEGRAM_POOL_<КЛАС>_WAIT         - скільки чекати вільне з'єднання
+# Фоновий трафік може почекати, інтерактивний - ні.
+
+def _pool_spec(name, size, read_timeout, wait):
+    prefix = f"TELEGRAM_POOL_{name.upper()}"
+    read_timeout = float(os.environ.get(f"{prefix}_READ_TIMEOUT", read_timeout))
+    return {
+        'size': int(os.environ.get(prefix, size)),
+        'read_timeout': read_timeout,
+        'write_timeout': read_timeout,
+        'connect_timeout': 5.0,
+        'pool_timeout': float(os.environ.get(f"{prefix}_WAIT", wait)),
+    }
+
+TELEGRAM_POOL_SPECS = {
+    # Long polling кожного бота весь час тримає одне з'єднання
+    POLLING: _pool_spec(POLLING, len(TENANTS), 5, 1),
+    INTERACTIVE: _pool_spec(INTERACTIVE, 64, 10, 3),
+    BACKGROUND: _pool_spec(BACKGROUND, 16, 20, 30),
+    ADMIN: _pool_spec(ADMIN, 4, 10, 10),
+}
+TELEGRAM_POOLS = None
+
+def telegram_requests():
+    """Спільні для всіх ботів процесу (request, get_updates_request) поверх пулів TELEGRAM_POOL_SPECS"""
+    global TELEGRAM_POOLS
+    if TELEGRAM_POOLS is None:
+        TELEGRAM_POOLS = TrafficPools(TELEGRAM_POOL_SPECS)
+        logger.info("🔌 Пули Bot API: " + ", ".join(f"{name} x{spec['size']}" for name, spec in TELEGRAM_POOL_SPECS.items()))
+    return RoutedRequest(TELEGRAM_POOLS), RoutedRequest(TELEGRAM_POOLS, fixed=POLLING)
+
+# =====================================================
+# ЖИТТЄВИЙ ЦИКЛ: ТЕНАНТИ ТА СПІЛЬНА ІНФРАСТРУКТУРА
+# =====================================================
+# Один бот - run_polling / run_webhook з post_init / post_shutdown, як і
+# раніше. Кілька ботів (TENANTS_FILE) - run_tenants(): Application кожного
+# тенанта проходить той самий цикл PTB вручну на одному event loop-і.
+# Спільні: HTTP-пули Telegram та Sheets, процесор апдейтів (пріоритети й
+# ліміт черги - на весь процес), журнал з реплеєрами і load shedding.
+# JobQueue у кожного Application своя: PTB прив'язує її до одного бота, а
+# назви задач (phone_reminder_<id>) у різних ботів збігалися б.
+
+APPLICATION = None  # перший бот (для /debug/memory)
+MAIN_LOOP = None
+
+class TenantContext(CallbackContext):
+    """CallbackContext, що робить тенанта свого Application поточним для обробника / задачі"""
+
+    def __init__(self, application, chat_id=None, user_id=None):
+        super().__init__(application, chat_id=chat_id, user_id=user_id)
+        owner = application.bot_data.get('tenant')
+        if owner is not None:
+            CURRENT_TENANT.set(owner)
+
+    @classmethod
+    def from_job(cls, job, application):
+        # Кожна задача JobQueue - окрема asyncio-задача: фоновий пул лише для неї
+        TRAFFIC_CLASS.set(BACKGROUND)
+        return super().from_job(job, application)
+
+@contextmanager
+def bound_tenant(t):
+    """Код старту / зупинки - від імені тенанта (задачі, створені тут, успадкують його)"""
+    token = CURRENT_TENANT.set(t)
+    try:
+        yield t
+    finally:
+        CURRENT_TENANT.reset(token)
+
+def build_application(t, builder):
+    """Application тенанта: спільний процесор апдейтів, контекст з тенантом"""
+    application = (
+        builder
+        .concurrent_updates(UPDATE_PROCESSOR or create_update_processor())
+        .context_types(ContextTypes(context=TenantContext))
+        .build()
+    )
+    application.bot_data['tenant'] = t
+    t.application = application
+    return application
+
+async def start_tenant(t):
+    """Таблиця та каталог тенанта"""
+    with bound_tenant(t):
+        # Підключаємо Google Sheets (клієнт вантажиться лише якщо є змінні)
+        t.sheets = await init_google_sheets()
+        mark_startup('google_sheets')
+
+        try:
+            await t.cold_storage.open()
+        except Exception as e:
+            logger.error(f"❌ Помилка відкриття холодного сховища: {e}")
+
+        try:
+            await reload_catalog(force=True)
+        except lazy_import('catalog').CatalogError:
+            pass  # вже в логах, працюють вбудовані тексти
+        mark_startup('catalog')
+
+async def start_shared():
+    await start_journal()
+    SHEDDER.start()
+
+async def stop_shared():
+    """Дописуємо хвіст журналу на диск і закриваємо клієнти Sheets та трасу"""
+    global SHEETS_HTTP
+    await SHEDDER.stop()
+    await stop_journal()
+    for t in TENANTS:
+        if t.sheets is not None:
+            await t.sheets.close()
+            t.sheets = None
+    if SHEETS_HTTP is not None:
+        await SHEETS_HTTP.aclose()
+        SHEETS_HTTP = None
+    if TRACE_RECORDER is not None:
+        TRACE_RECORDER.close()
+
+async def on_startup(application):
+    """post_init (один бот): Sheets, журнал і його реплеєри стартують разом з ботом"""
+    global APPLICATION, MAIN_LOOP
+    APPLICATION = application
+    MAIN_LOOP = asyncio.get_running_loop()
+
+    await start_tenant(tenant())
+    await start_shared()
+    resume_broadcasts(application)
+
+async def on_shutdown(application):
+    """post_shutdown (один бот)"""
+    await stop_shared()
+
+async def run_tenants(applications):
+    """Кілька ботів на одному event loop-і: initialize / start / stop / shutdown, як у run_polling"""
+    global APPLICATION, MAIN_LOOP
+    APPLICATION = applications[0]
+    MAIN_LOOP = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        MAIN_LOOP.add_signal_handler(sig, stop.set)
+
+    started = []
+    shared = False
+    try:
+        for application in applications:
+            await application.initialize()
+            await start_tenant(application.bot_data['tenant'])
+        await start_shared()
+        shared = True
+
+        for application in applications:
+            with bound_tenant(application.bot_data['tenant']):
+                resume_broadcasts(application)
+                await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+                await application.start()
+            started.append(application)
+        logger.info(f"🚀 Запущено ботів: {len(started)} ({', '.join(t.name for t in TENANTS)})")
+        await stop.wait()
+    finally:
+        logger.info("⏹ Зупинка ботів...")
+        # Спершу всі polling-и (останній getUpdates підтверджує offset), потім обробку
+        for application in started:
+            await application.updater.stop()
+        for application in started:
+            await application.stop()
+        for application in applications:
+            await application.shutdown()
+        if shared:
+            await stop_shared()
+
+async def run_webhook(application):
+    """
+    Один бот у webhook-режимі: initialize / start / stop / shutdown, як у
+    run_webhook PTB, але сервер свій - поруч із /telegram живуть /health,
+    /metrics та /debug/memory (див. create_webhook_app).
+    """
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    server = lazy_import('tornado.httpserver').HTTPServer(create_webhook_app(application))
+    started = False
+    await application.initialize()
+    try:
+        await on_startup(application)
+        await application.start()
+        started = True
+        server.listen(PORT, address='0.0.0.0')
+        await application.bot.set_webhook(
+            f"{WEBHOOK_URL.rstrip('/')}/telegram",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+        await stop.wait()
+    finally:
+        logger.info("⏹ Зупинка бота...")
+        server.stop()
+        if started:
+            await application.stop()
+        await application.shutdown()
+        await on_shutdown(application)
+
+def register_handlers(application):
+    """Обробники та фонові задачі - спільні для бота і відтворення трас"""
+    application.add_handler(TypeHandler(Update, track_first_update), group=-2)
+    application.add_handler(TypeHandler(Update, track_user_activity), group=-1)
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("status", admin_status_command))
+    application.add_handler(CommandHandler("profile", admin_profile_command))
+    application.add_handler(CommandHandler("memory", admin_memory_command))
+    application.add_handler(CommandHandler("broadcast", admin_broadcast_command))
+    application.add_handler(CommandHandler("catalog", admin_catalog_command))
+
+    # Всі inline-кнопки (квіз, "Замовити", "Зв'язатися") - через один диспетчер
+    application.add_handler(CallbackQueryHandler(dispatch_callback))
+    application.add_handler(MessageHandler(filters.CONTACT, process_contact))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+
+    application.add_error_handler(error_handler)
+
+    # Витіснення неактивних користувачів з пам'яті
+    application.job_queue.run_repeating(evict_inactive_users, interval=60, first=60, name="evict_inactive_users")
+
+    # Індекс телефонів для пошуку дублікатів
+    application.job_queue.run_once(load_phone_index, 1, name="load_phone_index")
+
+    # Шарди Analytics / All_Users наступного місяця - заздалегідь
+    application.job_queue.run_repeating(ensure_shards_ahead, interval=6 * 3600, first=3600, name="ensure_shards_ahead")
+
+    # Кеш статусів з таблиці (для нагадувань та /status)
+    application.job_queue.run_repeating(refresh_status_cache, interval=STATUS_CACHE_REFRESH, first=5, name="refresh_status_cache")
+
+    # Каталог текстів і цін: зміна файлу підхоплюється без рестарту
+    application.job_queue.run_repeating(watch_catalog, interval=CATALOG_POLL, first=CATALOG_POLL, name="watch_catalog")
+
 def main():
     """Запуск бота"""
     
@@ -1578,54 +4549,71 @@ def main():
     logger.info("🤖 ЗАПУСК БОТА v3.1 ULTIMATE IMPROVED")
     logger.info("=" * 60)
     
-    # Запускаємо Flask
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    logger.info("🌐 Flask web-server запущено")
-    
-    # Створюємо Application
-    application = Application.builder().token(BOT_TOKEN).build()
-    
-    # Реєструємо обробники
-    application.add_handler(CommandHandler("start", start))
- # === ОНОВЛЕНІ ХЕНДЛЕРИ КВІЗУ ===
-    
-    # 1. Старт квізу
-    application.add_handler(CallbackQueryHandler(question_1, pattern='^start_quiz$'))
-    
-    # 2. Гілка дітей
-    # Якщо "Так, діти є" -> йдемо на уточнення
-    application.add_handler(CallbackQueryHandler(question_1_clarify, pattern='^q1_yes$'))
-    
-    # Перехід на Питання 2 (Згода): спрацьовує якщо дітей немає АБО пройшли уточнення
-    application.add_handler(CallbackQueryHandler(question_2_entry, pattern='^(q1_no|q1_sub_.*)$'))
-    
-    # 3. Питання 3 (Майно)
-    application.add_handler(CallbackQueryHandler(question_3, pattern='^q2_'))
+    mark_startup('main')
+    if MEMORY_TRACE:
+        get_memory_reporter()  # вмикає tracemalloc: алокації старту теж потраплять у звіт
+
+    global MAKE_WEBHOOK_URL
+
+    multi = len(TENANTS) > 1
+    if multi and WEBHOOK_URL:
+        logger.error("❌ WEBHOOK_URL підтримується лише для одного бота; з TENANTS_FILE - тільки polling")
+        return
     
-    # Гілка майна
-    # Якщо "Так, майно є" -> йдемо на уточнення
-    application.add_handler(CallbackQueryHandler(question_3_clarify, pattern='^q3_yes$'))
+    # Запускаємо Flask (у webhook-режимі порт займає PTB)
+    if not WEBHOOK_URL:
+        flask_thread = threading.Thread(target=run_flask, daemon=True)
+        flask_thread.start()
+        logger.info("🌐 Flask web-server запущено")
     
-    # Перехід на Питання 4 (Локація): спрацьовує якщо майна немає АБО пройшли уточнення
-    application.add_handler(CallbackQueryHandler(question_4_entry, pattern='^(q3_no|q3_sub_.*)$'))
+    if FAKE_BACKENDS:
+        fakes = lazy_import('fakes')
+        MAKE_WEBHOOK_URL = fakes.MakeSink(fakes.FaultProfile.from_env('FAKE_MAKE')).start().url
+        logger.info(f"🧪 Фейкові бекенди: Telegram (FakeBot), Make ({MAKE_WEBHOOK_URL})")
+
+    # Створюємо Application кожного тенанта
+    applications = []
+    for t in TENANTS:
+        if FAKE_BACKENDS:
+            builder = Application.builder().bot(fakes.FakeBot(t.token, profile=fakes.FaultProfile.from_env('FAKE_TELEGRAM')))
+        else:
+            request, get_updates_request = telegram_requests()
+            builder = Application.builder().token(t.token).request(request).get_updates_request(get_updates_request)
+        if not multi and not WEBHOOK_URL:
+            builder = builder.post_init(on_startup).post_shutdown(on_shutdown)
+        application = build_application(t, builder)
     
-    # 4. Решта (без змін)
-    application.add_handler(CallbackQueryHandler(question_5, pattern='^q4_'))
-    application.add_handler(CallbackQueryHandler(question_6_phone, pattern='^q5_'))
-    application.add_handler(CallbackQueryHandler(book_consultation, pattern='^book_consultation$'))
-    application.add_handler(CallbackQueryHandler(contact_support_handler, pattern='^contact_support$'))
-    application.add_handler(MessageHandler(filters.CONTACT, process_contact))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
+        # Запис трафіку для бенчмарків (знеособлено, лише з TRACE_PATH)
+        if TRACE_PATH:
+            start_trace_recording(application)
+
+        register_handlers(application)
+        applications.append(application)
+        if multi:
+            logger.info(f"🤖 Тенант {t.name}: таблиця {'є' if t.sheet_url else 'немає'}, адмін {t.admin_id or '—'}, каталог {t.catalog_path}")
 
-    application.add_error_handler(error_handler)
-    
     logger.info("🚀 Бот v3.1 запущено!")
     logger.info("📊 10 сегментів активовано")
     logger.info("💬 Детальні мині-кейси активовано")
     logger.info("=" * 60)
     
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    mark_startup('handlers_ready')
+    if STARTUP_PROFILE:
+        logger.info(startup_report())
+
+    if multi:
+        asyncio.run(run_tenants(applications))
+    elif WEBHOOK_URL:
+        logger.info(f"🌐 Webhook-режим: {WEBHOOK_URL}")
+        asyncio.run(run_webhook(application))
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'export':
+        sys.exit(export_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'simulate':
+        sys.exit(simulate_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'replay':
+        sys.exit(replay_main(sys.argv[2:]))
     main()
@@ -0,0 +1,189 @@
+"""
+Розсилки по базі All_Users (повторне залучення тих, хто кинув квіз).
+
+Отримувачі фіксуються при створенні кампанії і зберігаються разом з
+прогресом у DATA_DIR/broadcasts/<id>.json. Відправка йде пачками по
+RATE повідомлень на секунду (ліміт Telegram для розсилок - ~30/с), після
+кожної пачки прогрес записується на диск, тому після рестарту кампанія
+продовжується з останньої пачки.
+
+- 403 (бота заблоковано) - користувач позначається як blocked
+- 429 (RetryAfter) - вся розсилка чекає retry_after і повторює пачку
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+logger = logging.getLogger(__name__)
+
+class BroadcastCampaign:
+    """Кампанія: текст, зафіксований список отримувачів та прогрес"""
+
+    FIELDS = (
+        'id', 'audience', 'text', 'recipients', 'position', 'state',
+        'sent', 'blocked', 'failed', 'retries', 'created_at', 'finished_at', 'elapsed',
+    )
+
+    def __init__(self, directory, audience, text, recipients, campaign_id=None):
+        self.directory = directory
+        self.id = campaign_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.audience = audience
+        self.text = text
+        self.recipients = list(recipients)
+        self.position = 0
+        self.state = 'running'      # running / stopped / done
+        self.sent = 0
+        self.blocked = 0
+        self.failed = 0
+        self.retries = 0
+        self.created_at = datetime.now().isoformat(timespec='seconds')
+        self.finished_at = None
+        self.elapsed = 0.0          # секунди чистої відправки (без простою між рестартами)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"{self.id}.json")
+
+    @property
+    def total(self):
+        return len(self.recipients)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(self.path + '.tmp', self.path)
+
+    @classmethod
+    def load(cls, directory, campaign_id):
+        with open(os.path.join(directory, f"{campaign_id}.json"), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        campaign = cls(directory, data['audience'], data['text'], data['recipients'], data['id'])
+        for field in cls.FIELDS:
+            setattr(campaign, field, data[field])
+        return campaign
+
+    @classmethod
+    def unfinished(cls, directory):
+        """Кампанії, перервані рестартом (state == running)"""
+        campaigns = []
+        for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+            campaign_id = os.path.basename(path)[:-len('.json')]
+            try:
+                campaign = cls.load(directory, campaign_id)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"❌ Розсилка {campaign_id}: не вдалося прочитати прогрес: {e}")
+                continue
+            if campaign.state == 'running':
+                campaigns.append(campaign)
+        return campaigns
+
+    def summary(self):
+        rate = self.sent / self.elapsed if self.elapsed else 0.0
+        return (
+            f"📣 Розсилка {self.id} ({self.audience}): {self.state}\n"
+            f"Прогрес: {self.position}/{self.total}\n"
+            f"✅ Надіслано: {self.sent}\n"
+            f"🚫 Заблокували бота: {self.blocked}\n"
+            f"❌ Помилки: {self.failed}\n"
+            f"⏳ Повтори після 429: {self.retries}\n"
+            f"⚡️ Швидкість: {rate:.1f} повідомл./с за {self.elapsed:.0f} с"
+        )
+
+class BroadcastRunner:
+    """
+    Відправляє кампанію пачками. send(chat_id) - корутина відправки,
+    on_blocked(chat_id) - виклик для користувачів, що заблокували бота.
+    """
+
+    def __init__(self, campaign, send, on_blocked, rate=25):
+        self.campaign = campaign
+        self.send = send
+        self.on_blocked = on_blocked
+        self.rate = rate
+        self._stopping = False
+
+    def stop(self):
+        self._stopping = True
+
+    async def _send_one(self, chat_id):
+        """'sent' / 'blocked' / 'failed' або RetryAfter нагору"""
+        try:
+            await self.send(chat_id)
+            return 'sent'
+        except Forbidden:
+            return 'blocked'
+        except BadRequest as e:
+            # "Chat not found" і т.п. - користувач видалив акаунт
+            logger.warning(f"⚠️ Розсилка → {chat_id}: {e}")
+            return 'failed'
+        except RetryAfter:
+            raise
+        except TelegramError as e:
+            logger.warning(f"⚠️ Розсилка → {chat_id}: {e}")
+            return 'failed'
+
+    async def run(self):
+        campaign = self.campaign
+        batch_size = max(1, int(self.rate))
+        while campaign.position < campaign.total and not self._stopping:
+            started = time.monotonic()
+            batch = campaign.recipients[campaign.position:campaign.position + batch_size]
+            results = await asyncio.gather(*(self._send_one(chat_id) for chat_id in batch), return_exceptions=True)
+
+            retry_after = [r for r in results if isinstance(r, RetryAfter)]
+            if retry_after:
+                # Частину пачки вже доставлено - їх не повторюємо, решту переносимо вперед
+                delivered = [chat_id for chat_id, r in zip(batch, results) if not isinstance(r, RetryAfter)]
+                postponed = [chat_id for chat_id, r in zip(batch, results) if isinstance(r, RetryAfter)]
+                end = campaign.position + len(batch)
+                campaign.recipients[campaign.position:end] = delivered + postponed
+                results = [r for r in results if not isinstance(r, RetryAfter)]
+                batch = delivered
+
+            for chat_id, result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"❌ Розсилка → {chat_id}: {result}")
+                    campaign.failed += 1
+                elif result == 'blocked':
+                    campaign.blocked += 1
+                    await self.on_blocked(chat_id)
+                else:
+                    setattr(campaign, result, getattr(campaign, result) + 1)
+            campaign.position += len(batch)
+
+            if retry_after:
+                campaign.retries += 1
+                pause = max(_retry_seconds(r) for r in retry_after)
+                logger.warning(f"⏳ Розсилка {campaign.id}: flood control, пауза {pause} с")
+                campaign.save()
+                await asyncio.sleep(pause)
+                campaign.elapsed += time.monotonic() - started
+                continue
+
+            # Тримаємо темп: пачка з N повідомлень не частіше ніж раз на N/RATE секунд
+            spent = time.monotonic() - started
+            await asyncio.sleep(max(0.0, len(batch) / self.rate - spent))
+            campaign.elapsed += time.monotonic() - started
+            campaign.save()
+
+        if campaign.position >= campaign.total:
+            campaign.state = 'done'
+            campaign.finished_at = datetime.now().isoformat(timespec='seconds')
+        elif self._stopping:
+            campaign.state = 'stopped'
+        campaign.save()
+        return campaign
+
+def _retry_seconds(error):
+    retry_after = error.retry_after
+    seconds = retry_after.total_seconds() if hasattr(retry_after, 'total_seconds') else retry_after
+    return float(seconds) + 1
@@ -0,0 +1,203 @@
+"""
+Каталог контенту та цін: сегменти (назва, бюджет, строки), тексти
+результатів, інсайти (мині-кейси) та тексти квізу.
+
+Вбудовані значення з bot.py - дефолти, а JSON-файл CATALOG_PATH може
+перевизначити будь-яку їх частину. Файл перевіряється і компілюється в
+готові до відправки тексти: шаблони результатів форматуються для кожного
+сегмента одразу, тож обробники повідомлень нічого не парсять і не
+форматують.
+
+Компіляція - звичайна синхронна функція (бот викликає її в executor-і),
+а результат - незмінний Catalog, який бот замінює цілком одним
+присвоєнням. Обробник бачить або старий каталог, або новий, але ніколи
+їх суміш.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import string
+import time
+from types import MappingProxyType
+
+TELEGRAM_TEXT_LIMIT = 4096
+# {disclaimer} - за бажанням шаблону: дисклеймер додається лише туди, де він є
+RESULT_FIELDS = {'segment_name', 'cost', 'time', 'disclaimer'}
+BOOKED_FIELDS = {'first_name'}
+SEGMENT_FIELDS = ('code', 'name', 'cost', 'time')
+SECTIONS = ('segments', 'results', 'fallback_result', 'disclaimer', 'mini_cases', 'texts', 'booked')
+
+HTML_TAG_RE = re.compile(r'<(/?)(b|i|u|s|code|pre)>')
+
+class CatalogError(ValueError):
+    """Каталог не пройшов перевірку (старий каталог лишається в роботі)"""
+
+def _fields(template, where):
+    try:
+        return {name for _, name, _, _ in string.Formatter().parse(template) if name is not None}
+    except ValueError as e:
+        raise CatalogError(f"{where}: некоректний шаблон ({e})")
+
+def _check_text(text, where, fields=frozenset()):
+    """Текст - непорожній рядок, з дозволеними {полями} та збалансованими HTML-тегами"""
+    if not isinstance(text, str) or not text.strip():
+        raise CatalogError(f"{where}: очікується непорожній рядок")
+    unknown = _fields(text, where) - set(fields)
+    if unknown:
+        raise CatalogError(f"{where}: невідомі поля {sorted(unknown)}")
+    open_tags = []
+    for closing, tag in HTML_TAG_RE.findall(text):
+        if not closing:
+            open_tags.append(tag)
+        elif not open_tags or open_tags.pop() != tag:
+            raise CatalogError(f"{where}: незбалансований тег </{tag}>")
+    if open_tags:
+        raise CatalogError(f"{where}: незакритий тег <{open_tags[-1]}>")
+
+def _check_length(text, where):
+    if len(text) > TELEGRAM_TEXT_LIMIT:
+        raise CatalogError(f"{where}: {len(text)} символів, Telegram приймає до {TELEGRAM_TEXT_LIMIT}")
+
+def _check_keys(section, overrides, defaults):
+    if not isinstance(overrides, dict):
+        raise CatalogError(f"{section}: очікується об'єкт")
+    unknown = set(overrides) - set(defaults)
+    if unknown:
+        raise CatalogError(f"{section}: невідомі ключі {sorted(unknown)}")
+
+def merge(defaults, overrides):
+    """Дефолти + файл: словникові секції оновлюються по ключах, решта замінюється"""
+    unknown = set(overrides) - set(SECTIONS)
+    if unknown:
+        raise CatalogError(f"невідомі секції {sorted(unknown)}")
+    data = {}
+    for section in SECTIONS:
+        value = defaults[section]
+        if section not in overrides:
+            data[section] = value
+        elif isinstance(value, dict):
+            _check_keys(section, overrides[section], value)
+            data[section] = {**value, **overrides[section]}
+        else:
+            data[section] = overrides[section]
+    return data
+
+class Catalog:
+    """Скомпільований каталог. Лише читання - після створення не змінюється"""
+
+    def __init__(self, data, source, version):
+        self.source = source
+        self.version = version
+        self.loaded_at = time.time()
+
+        segments = {}
+        for key, info in data['segments'].items():
+            if not isinstance(info, dict) or set(info) != set(SEGMENT_FIELDS):
+                raise CatalogError(f"segments.{key}: потрібні поля {list(SEGMENT_FIELDS)}")
+            for field in SEGMENT_FIELDS:
+                _check_text(info[field], f"segments.{key}.{field}")
+            segments[key] = tuple(info[field] for field in SEGMENT_FIELDS)
+        self.segments = MappingProxyType(segments)
+
+        disclaimer = data['disclaimer']
+        _check_text(disclaimer, 'disclaimer')
+        templates = data['results']
+        for code, template in templates.items():
+            _check_text(template, f"results.{code}", RESULT_FIELDS)
+        fallback = data['fallback_result']
+        if not isinstance(fallback, str) or fallback not in templates:
+            raise CatalogError(f"fallback_result: немає шаблону {fallback!r}")
+        self._templates = templates
+        self._fallback = fallback
+        self._disclaimer = disclaimer
+
+        # Результат для кожного сегмента - готовий текст
+        results = {}
+        for key, segment in segments.items():
+            text = self._render(*segment)
+            _check_length(text, f"results для segments.{key}")
+            results[segment] = text
+        self.results = MappingProxyType(results)
+
+        mini_cases = {}
+        for key, cases in data['mini_cases'].items():
+            if not isinstance(cases, list) or not cases:
+                raise CatalogError(f"mini_cases.{key}: очікується непорожній список")
+            for index, text in enumerate(cases):
+                _check_text(text, f"mini_cases.{key}[{index}]")
+                _check_length(text, f"mini_cases.{key}[{index}]")
+            mini_cases[key] = tuple(cases)
+        if 'default' not in mini_cases:
+            raise CatalogError("mini_cases: потрібен ключ 'default'")
+        self.mini_cases = MappingProxyType(mini_cases)
+
+        for name, text in data['texts'].items():
+            _check_text(text, f"texts.{name}")
+            _check_length(text, f"texts.{name}")
+        self.texts = MappingProxyType(dict(data['texts']))
+
+        _check_text(data['booked'], 'booked', BOOKED_FIELDS)
+        self._booked = data['booked']
+
+    def _render(self, code, name, cost, duration):
+        template = self._templates.get(code, self._templates[self._fallback])
+        return template.format(segment_name=name, cost=cost, time=duration, disclaimer=self._disclaimer)
+
+    def segment(self, key):
+        """(код, назва, бюджет, строки)"""
+        return self.segments[key]
+
+    def result_text(self, code, name, cost, duration):
+        text = self.results.get((code, name, cost, duration))
+        if text is None:
+            # Сегмент з попередньої версії каталогу (нагадування, збережений стан)
+            text = self._render(code, name, cost, duration)
+        return text
+
+    def mini_case(self, key):
+        return random.choice(self.mini_cases.get(key) or self.mini_cases['default'])
+
+    def booked_text(self, first_name):
+        return self._booked.format(first_name=first_name)
+
+    def summary(self):
+        return {
+            'version': self.version,
+            'source': self.source,
+            'loaded_at': self.loaded_at,
+            'segments': len(self.segments),
+            'mini_cases': sum(len(cases) for cases in self.mini_cases.values()),
+            'texts': len(self.texts),
+        }
+
+def file_stamp(path):
+    """(mtime_ns, size) файлу або None - дешева перевірка, чи файл змінився"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def load_catalog(path, defaults):
+    """
+    Читає, перевіряє і компілює каталог (блокуюча функція - для executor-а).
+    Без файлу - каталог з дефолтів. Помилки - CatalogError.
+    """
+    overrides = {}
+    raw = b''
+    source = 'built-in'
+    if path and os.path.exists(path):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        try:
+            overrides = json.loads(raw.decode('utf-8'))
+        except ValueError as e:
+            raise CatalogError(f"{path}: некоректний JSON ({e})")
+        if not isinstance(overrides, dict):
+            raise CatalogError(f"{path}: очікується JSON-об'єкт")
+        source = path
+    version = hashlib.sha1(raw).hexdigest()[:8] if raw else 'built-in'
+    return Catalog(merge(defaults, overrides), source, version)
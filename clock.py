@@ -0,0 +1,135 @@
+"""
+Годинник для пауз сценарію та нагадувань.
+
+RealClock - звичайний час (прод). ScaledClock - прискорений реальний час
+для відтворення трас (python bot.py replay). SimClock - віртуальний час для
+симуляції (python bot.py simulate): sleep() не чекає по-справжньому, а
+ставить таймер у купу, і годинник перескакує до найближчого таймера, щойно
+всі задачі симуляції або сплять, або завершились. Доба нагадувань для
+тисяч користувачів проганяється за секунди, а порядок подій такий самий,
+як у реальному часі.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+
+class RealClock:
+    def now(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+class ScaledClock(RealClock):
+    """Реальний час, пришвидшений у speed разів (speed <= 0 - паузи не чекаються взагалі)"""
+
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self._wall_start = time.time()
+        self._mono_start = time.monotonic()
+
+    def _scale(self, elapsed):
+        return elapsed * self.speed if self.speed > 0 else elapsed
+
+    def now(self):
+        return self._wall_start + self._scale(time.time() - self._wall_start)
+
+    def monotonic(self):
+        return self._mono_start + self._scale(time.monotonic() - self._mono_start)
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds / self.speed if self.speed > 0 else 0)
+
+class SimClock:
+    """
+    Віртуальний час. Задачі, що використовують sleep(), треба запускати через
+    spawn() - годинник рахує активні задачі і рухає час лише тоді, коли
+    жодна з них не виконується (інакше подія могла б "проскочити" вперед).
+    """
+
+    def __init__(self, start=None):
+        self._now = time.time() if start is None else start
+        self._started_at = self._now
+        self._timers = []             # heap: (час, порядковий номер, future)
+        self._order = itertools.count()
+        self._active = 0              # задачі, що зараз виконуються (не сплять)
+        self._idle = asyncio.Event()
+        self._tasks = set()
+        self.wakeups = 0
+
+    def now(self):
+        return self._now
+
+    def monotonic(self):
+        return self._now
+
+    @property
+    def elapsed(self):
+        return self._now - self._started_at
+
+    def _set_active(self, delta):
+        self._active += delta
+        if self._active == 0:
+            self._idle.set()
+
+    async def sleep(self, seconds):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._timers, (self._now + max(0.0, seconds), next(self._order), future))
+        self._set_active(-1)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                self._set_active(+1)  # задачу скасували під час сну - вона знову "активна", поки не завершиться
+            raise
+
+    def spawn(self, coro):
+        """Запускає задачу, яку годинник враховує при просуванні часу"""
+        self._set_active(+1)
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        self._set_active(-1)
+
+    async def _wait_idle(self):
+        while self._active:
+            self._idle.clear()
+            await self._idle.wait()
+
+    async def run(self, until=None):
+        """Проганяє час до останнього таймера (або до until секунд від старту)"""
+        deadline = None if until is None else self._started_at + until
+        while True:
+            await self._wait_idle()
+            while self._timers and self._timers[0][2].cancelled():
+                heapq.heappop(self._timers)
+            if not self._timers:
+                return
+            at = self._timers[0][0]
+            if deadline is not None and at > deadline:
+                self._now = deadline
+                return
+            self._now = max(self._now, at)
+            # Будимо всі таймери на цю мить разом
+            while self._timers and self._timers[0][0] <= self._now:
+                _, _, future = heapq.heappop(self._timers)
+                if not future.cancelled():
+                    self._set_active(+1)
+                    future.set_result(None)
+                    self.wakeups += 1
+
+    async def shutdown(self):
+        """Скасовує задачі, що лишились (напр. після run(until=...))"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
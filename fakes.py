@@ -0,0 +1,364 @@
+"""
+Локальні замінники зовнішніх сервісів для бенчмарків і офлайн-прогонів.
+
+- FakeWorksheet / FakeSpreadsheet - in-memory аналог таблиці
+- FakeSheetsClient - той самий інтерфейс, що й sheets_client.SheetsClient
+- FakeBot - Bot, який нікуди не ходить, а записує всі виклики API
+- MakeSink - локальний HTTP-сервер замість MAKE_WEBHOOK_URL
+
+Кожен має FaultProfile: затримка, частка помилок та квота запитів на хвилину.
+Вмикається в bot.py змінною FAKE_BACKENDS=1.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telegram.error import NetworkError, RetryAfter
+from telegram.ext import ExtBot
+
+# =====================================================
+# ПРОФІЛЬ ЗБОЇВ
+# =====================================================
+
+class FakeBackendError(Exception):
+    """Штучна помилка бекенда (аналог 5xx)"""
+
+class FakeQuotaExceeded(FakeBackendError):
+    """Перевищено квоту запитів (аналог 429)"""
+
+class FaultProfile:
+    """Затримка, частка помилок і квота для фейкового бекенда"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, quota_per_minute=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota_per_minute = quota_per_minute
+        self._random = random.Random(seed)
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, prefix):
+        """Напр. FAKE_SHEETS_LATENCY=0.3, FAKE_SHEETS_ERROR_RATE=0.05, FAKE_SHEETS_QUOTA=60"""
+        quota = os.environ.get(f'{prefix}_QUOTA')
+        return cls(
+            latency=float(os.environ.get(f'{prefix}_LATENCY', 0)),
+            jitter=float(os.environ.get(f'{prefix}_JITTER', 0)),
+            error_rate=float(os.environ.get(f'{prefix}_ERROR_RATE', 0)),
+            quota_per_minute=int(quota) if quota else None,
+        )
+
+    def delay(self):
+        if not self.latency and not self.jitter:
+            return 0.0
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def check(self, operation):
+        """Кидає FakeQuotaExceeded / FakeBackendError згідно з профілем"""
+        with self._lock:
+            if self.quota_per_minute is not None:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= 60:
+                    self._calls.popleft()
+                if len(self._calls) >= self.quota_per_minute:
+                    raise FakeQuotaExceeded(f"{operation}: quota of {self.quota_per_minute}/min exceeded")
+                self._calls.append(now)
+            if self.error_rate and self._random.random() < self.error_rate:
+                raise FakeBackendError(f"{operation}: injected failure")
+
+# =====================================================
+# GOOGLE SHEETS
+# =====================================================
+
+_A1_RE = re.compile(r'^([A-Z]*)(\d*)$')
+
+def _column_index(letters):
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - ord('A') + 1)
+    return index
+
+def parse_a1_range(a1):
+    """'F12' / 'B2:B' / 'F:G' / 'Leads!A1:C3' -> (row1, col1, row2, col2); None = без межі"""
+    if '!' in a1:
+        a1 = a1.split('!', 1)[1]
+    start, _, end = a1.partition(':')
+    end = end or start
+
+    def cell(ref):
+        letters, digits = _A1_RE.match(ref.upper()).groups()
+        return (int(digits) if digits else None), (_column_index(letters) if letters else None)
+
+    row1, col1 = cell(start)
+    row2, col2 = cell(end)
+    return row1 or 1, col1 or 1, row2, col2
+
+class FakeWorksheet:
+    """In-memory лист: рядки значень, з якими працює FakeSheetsClient (під _lock)"""
+
+    def __init__(self, title, header=None):
+        self.title = title
+        self.rows = [list(header)] if header else []
+        self._lock = threading.Lock()
+
+    def _set(self, row, col, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        while len(cells) < col:
+            cells.append('')
+        cells[col - 1] = str(value)
+
+    def _get(self, a1):
+        row1, col1, row2, col2 = parse_a1_range(a1)
+        row2 = row2 or len(self.rows)
+        col2 = col2 or max((len(row) for row in self.rows), default=0)
+        result = [row[col1 - 1:col2] for row in self.rows[row1 - 1:row2]]
+        # Як і Sheets API: без порожніх хвостів
+        while result and not any(result[-1]):
+            result.pop()
+        return [values if any(values) else [] for values in result]
+
+class FakeSpreadsheet:
+    """Набір фейкових листів, що ділять один профіль збоїв"""
+
+    def __init__(self, profile=None):
+        self.profile = profile or FaultProfile()
+        self._worksheets = {}
+
+    def add_worksheet(self, title, rows=1000, cols=26, header=None):
+        worksheet = FakeWorksheet(title, header=header)
+        self._worksheets[title] = worksheet
+        return worksheet
+
+    def worksheet(self, title):
+        try:
+            return self._worksheets[title]
+        except KeyError:
+            raise KeyError(f"Worksheet {title!r} not found") from None
+
+    def worksheets(self):
+        return list(self._worksheets.values())
+
+def split_range(range_a1):
+    """"'All_Users'!F12" -> ('All_Users', 'F12')"""
+    title, _, cells = range_a1.rpartition('!')
+    if title.startswith("'") and title.endswith("'"):
+        title = title[1:-1].replace("''", "'")
+    return title, cells
+
+class FakeSheetsClient:
+    """Асинхронний клієнт над FakeSpreadsheet (затримка - asyncio.sleep, без потоків)"""
+
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+        self.stats = {'requests': 0, 'errors': 0}
+
+    async def _io(self, operation):
+        self.stats['requests'] += 1
+        profile = self.spreadsheet.profile
+        delay = profile.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        try:
+            profile.check(operation)
+        except FakeBackendError:
+            self.stats['errors'] += 1
+            raise
+
+    async def values_get(self, range_a1):
+        await self._io('values_get')
+        title, cells = split_range(range_a1)
+        worksheet = self.spreadsheet.worksheet(title)
+        with worksheet._lock:
+            return worksheet._get(cells)
+
+    async def values_batch_get(self, ranges):
+        await self._io('values_batch_get')
+        result = []
+        for range_a1 in ranges:
+            title, cells = split_range(range_a1)
+            worksheet = self.spreadsheet.worksheet(title)
+            with worksheet._lock:
+                result.append(worksheet._get(cells))
+        return result
+
+    async def append_rows(self, sheet, rows, value_input_option='RAW'):
+        await self._io('append_rows')
+        worksheet = self.spreadsheet.worksheet(sheet)
+        with worksheet._lock:
+            first_row = len(worksheet.rows) + 1
+            worksheet.rows.extend([str(v) for v in row] for row in rows)
+        return first_row
+
+    async def batch_update(self, data, value_input_option='RAW'):
+        if not data:
+            return
+        await self._io('batch_update')
+        for item in data:
+            title, cells = split_range(item['range'])
+            worksheet = self.spreadsheet.worksheet(title)
+            row1, col1, _, _ = parse_a1_range(cells)
+            with worksheet._lock:
+                for r, values in enumerate(item['values']):
+                    for c, value in enumerate(values):
+                        worksheet._set(row1 + r, col1 + c, value)
+
+    async def sheet_titles(self):
+        await self._io('sheet_titles')
+        return [worksheet.title for worksheet in self.spreadsheet.worksheets()]
+
+    async def ensure_sheet(self, title, header, rows=1000, cols=10, existing=None):
+        if existing is None:
+            existing = await self.sheet_titles()
+        if title in existing:
+            return False
+        self.spreadsheet.add_worksheet(title, rows=rows, cols=cols, header=header)
+        return True
+
+    async def ensure_headers(self, headers):
+        await self._io('ensure_headers')
+        migrated = []
+        for title, header in headers.items():
+            worksheet = self.spreadsheet.worksheet(title)
+            with worksheet._lock:
+                row = worksheet.rows[0] if worksheet.rows else []
+                if row and len(row) < len(header) and row == list(header[:len(row)]):
+                    row.extend(header[len(row):])
+                    migrated.append(title)
+        return migrated
+
+    async def close(self):
+        pass
+
+    def snapshot(self):
+        return dict(self.stats)
+
+# =====================================================
+# TELEGRAM BOT
+# =====================================================
+
+class FakeBot(ExtBot):
+    """
+    Bot без мережі: кожен виклик API записується в self.calls і отримує
+    правдоподібну відповідь. Апдейти для getUpdates можна підкинути через inject_update().
+    """
+
+    def __init__(self, token='123456:FAKE', profile=None, **kwargs):
+        super().__init__(token, **kwargs)
+        # PTB заморожує Bot наприкінці __init__ - власні атрибути лише так
+        with self._unfrozen():
+            self.profile = profile or FaultProfile()
+            self.calls = []
+            self._message_ids = itertools.count(1)
+            self._update_ids = itertools.count(1)
+            self._pending_updates = deque()
+
+    def inject_update(self, update_dict):
+        """Додає сирий апдейт (dict) в чергу getUpdates"""
+        update_dict.setdefault('update_id', next(self._update_ids))
+        self._pending_updates.append(update_dict)
+
+    def calls_to(self, endpoint):
+        return [data for name, data, _ in self.calls if name == endpoint]
+
+    def _fake_message(self, data):
+        chat_id = data.get('chat_id', 0)
+        if isinstance(chat_id, str) and chat_id.lstrip('-').isdigit():
+            chat_id = int(chat_id)
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': data.get('text', ''),
+        }
+
+    async def _do_post(self, endpoint, data, *args, **kwargs):
+        if endpoint == 'getUpdates':
+            if not self._pending_updates:
+                await asyncio.sleep(min(float(data.get('timeout') or 1), 1.0))
+            updates = list(self._pending_updates)
+            self._pending_updates.clear()
+            return updates
+
+        self.calls.append((endpoint, dict(data), time.monotonic()))
+
+        delay = self.profile.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        try:
+            self.profile.check(endpoint)
+        except FakeQuotaExceeded:
+            raise RetryAfter(1)
+        except FakeBackendError as e:
+            raise NetworkError(str(e))
+
+        if endpoint == 'getMe':
+            return {'id': 123456, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+        if endpoint.startswith('send') and endpoint != 'sendChatAction':
+            return self._fake_message(data)
+        if endpoint.startswith('edit') and 'chat_id' in data:
+            return self._fake_message(data)
+        return True
+
+# =====================================================
+# MAKE.COM WEBHOOK
+# =====================================================
+
+class MakeSink:
+    """Локальний HTTP-приймач для MAKE_WEBHOOK_URL, зберігає всі payload-и"""
+
+    def __init__(self, profile=None, host='127.0.0.1', port=0):
+        self.profile = profile or FaultProfile()
+        self.received = []
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                delay = sink.profile.delay()
+                if delay:
+                    time.sleep(delay)
+                try:
+                    sink.profile.check('make')
+                except FakeQuotaExceeded:
+                    self.send_response(429)
+                    self.end_headers()
+                    return
+                except FakeBackendError:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                sink.received.append(json.loads(body or b'null'))
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b'Accepted')
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/make"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,345 @@
+"""
+Локальний write-ahead журнал для лідів, статусів та подій аналітики.
+
+Запис підтверджується лише після fsync, але fsync робиться один раз на
+групу записів (group commit): всі append() за COMMIT_INTERVAL потрапляють
+на диск одним послідовним write + fsync.
+
+Журнал складається з сегментів journal.<N>.log (JSON на рядок). Кожен
+споживач (реплеєр у Sheets, Make, архів) має власний курсор (сегмент, зсув);
+сегменти, які пройшли всі споживачі, видаляються.
+
+Файл journal.id - випадковий id журналу. Разом із seq запису він дає ключ
+ідемпотентності ("<id>:<seq>"), унікальний і тоді, коли теку журналу
+втрачено (ефемерний диск) і seq почався з 1 заново.
+
+Якщо write / fsync падає посеред пачки (напр. ENOSPC), сегмент обрізається
+до початку пачки. Рядок, який все одно не читається як JSON, читачі
+переносять у journal.quarantine і пропускають.
+
+Запис, який споживач так і не зміг обробити (постійна помилка або вичерпані
+спроби), відкладається в deadletter.<споживач>.jsonl, і курсор іде далі -
+один зіпсований запис не блокує всі наступні.
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class Journal:
+    def __init__(self, directory, consumers, segment_bytes=16 * 1024 * 1024,
+                 commit_interval=0.02, max_batch=1000, durable=True):
+        self.directory = directory
+        self.consumers = tuple(consumers)
+        self.segment_bytes = segment_bytes
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.durable = durable        # False - без fsync (симуляція, тести)
+
+        self._pending = []            # [(рядок, future)]
+        self._has_pending = None
+        self._new_data = None
+        self._flusher = None
+        self._file = None
+        self._segment = 0
+        self._seq = 0
+        self._cursors = {}
+        self.id = None
+        self.dead_letters = {}        # споживач -> записів у dead-letter файлі
+        self._quarantined = set()     # (сегмент, зсув) битих рядків, уже відкладених
+        self.stats = {'appended': 0, 'batches': 0, 'fsyncs': 0, 'write_failures': 0, 'quarantined': 0}
+
+    # ---------- файли ----------
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"journal.{segment:06d}.log")
+
+    def _cursor_path(self, consumer):
+        return os.path.join(self.directory, f"journal.{consumer}.cursor")
+
+    def _load_id(self):
+        path = os.path.join(self.directory, 'journal.id')
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            journal_id = os.urandom(4).hex()
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(journal_id)
+            os.replace(path + '.tmp', path)
+            return journal_id
+
+    def _quarantine_path(self):
+        return os.path.join(self.directory, 'journal.quarantine')
+
+    def _dead_letter_path(self, consumer):
+        return os.path.join(self.directory, f"deadletter.{consumer}.jsonl")
+
+    def _count_dead_letters(self, consumer):
+        try:
+            with open(self._dead_letter_path(consumer), 'rb') as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+    def _segments(self):
+        paths = glob.glob(os.path.join(self.directory, "journal.*.log"))
+        return sorted(int(os.path.basename(path).split('.')[1]) for path in paths)
+
+    def _open_segment(self, segment):
+        if self._file:
+            self._file.close()
+        self._segment = segment
+        self._file = open(self._segment_path(segment), 'ab')
+
+    def _last_seq(self, segment):
+        """Номер останнього повного запису в сегменті"""
+        last = 0
+        with open(self._segment_path(segment), 'rb') as f:
+            for line in f:
+                if line.endswith(b"\n"):
+                    try:
+                        last = json.loads(line)['seq']
+                    except (ValueError, KeyError, TypeError):
+                        pass  # битий рядок - його відкладе read()
+        return last
+
+    def _repair_tail(self, segment):
+        """Обрізає недописаний останній рядок (процес впав посеред запису)"""
+        path = self._segment_path(segment)
+        with open(path, 'rb+') as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                f.truncate(end)
+                logger.warning(f"📓 Журнал: обрізано недописаний запис у {path}")
+
+    def _load_cursor(self, consumer, first_segment):
+        try:
+            with open(self._cursor_path(consumer), 'r', encoding='utf-8') as f:
+                segment, offset = json.load(f)
+                return segment, offset
+        except FileNotFoundError:
+            return first_segment, 0
+
+    # ---------- життєвий цикл ----------
+
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.id = self._load_id()
+        segments = self._segments()
+        if segments:
+            self._repair_tail(segments[-1])
+        for segment in reversed(segments):
+            self._seq = self._last_seq(segment)
+            if self._seq:
+                break
+        current = segments[-1] if segments else 1
+        self._open_segment(current)
+        self._cursors = {name: self._load_cursor(name, segments[0] if segments else current) for name in self.consumers}
+        self.dead_letters = {name: self._count_dead_letters(name) for name in self.consumers}
+
+        self._has_pending = asyncio.Event()
+        self._new_data = {name: asyncio.Event() for name in self.consumers}
+        self._flusher = asyncio.create_task(self._flush_loop())
+        logger.info(f"📓 Журнал: сегмент {current}, seq {self._seq}")
+
+    async def close(self):
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        while self._pending:
+            await self._commit_batch()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    # ---------- запис ----------
+
+    async def append(self, kind, data, tenant=None):
+        """Записує подію і повертається лише після того, як вона на диску (tenant - поле 'tenant' запису)"""
+        if self._flusher is None:
+            raise RuntimeError("Journal is not started")
+        self._seq += 1
+        record = {'seq': self._seq, 'ts': datetime.now().isoformat(), 'kind': kind, 'data': data}
+        if tenant:
+            record['tenant'] = tenant
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((line, future))
+        self._has_pending.set()
+        await future
+        return record['seq']
+
+    def _write_sync(self, payload):
+        start = self._file.tell()
+        try:
+            self._file.write(payload)
+            self._file.flush()
+            if self.durable:
+                os.fsync(self._file.fileno())
+        except Exception:
+            self._rollback(start)
+            raise
+        if self._file.tell() >= self.segment_bytes:
+            self._open_segment(self._segment + 1)
+
+    def _rollback(self, start):
+        """Пачка не записалась: прибираємо її частину з сегмента, щоб наступна не доклеїлась до обрізка"""
+        self.stats['write_failures'] += 1
+        path = self._segment_path(self._segment)
+        try:
+            self._file.close()  # недописаний буфер відкидається разом з файлом
+        except OSError:
+            pass
+        try:
+            os.truncate(path, start)
+        except OSError as e:
+            logger.error(f"📓 Журнал: не вдалося обрізати {path} до {start}: {e}")
+        self._file = open(path, 'ab')
+
+    async def _commit_batch(self):
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if not self._pending:
+            self._has_pending.clear()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_sync, b"".join(line for line, _ in batch))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.stats['appended'] += len(batch)
+        self.stats['batches'] += 1
+        self.stats['fsyncs'] += 1
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+        for event in self._new_data.values():
+            event.set()
+
+    async def _flush_loop(self):
+        while True:
+            await self._has_pending.wait()
+            # Вікно групового коміту: збираємо всі записи, що прийдуть за цей час
+            await asyncio.sleep(self.commit_interval)
+            await self._commit_batch()
+
+    # ---------- читання ----------
+
+    def read(self, consumer, limit=100):
+        """До limit записів після курсора споживача: [(запис, позиція_після_нього)]"""
+        if self._new_data:
+            self._new_data[consumer].clear()  # все, що закомічено до цього моменту, буде прочитано
+        segment, offset = self._cursors[consumer]
+        records = []
+        while len(records) < limit:
+            path = self._segment_path(segment)
+            if not os.path.exists(path):
+                if segment < self._segment:
+                    segment, offset = segment + 1, 0
+                    continue
+                break
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # недописаний рядок (ще пишеться або обрізаний при збої)
+                    start, offset = offset, offset + len(line)
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        self._quarantine(segment, start, line)
+                        continue
+                    records.append((record, (segment, offset)))
+                    if len(records) >= limit:
+                        break
+            if len(records) >= limit or segment >= self._segment:
+                break
+            segment, offset = segment + 1, 0
+        return records
+
+    def _quarantine(self, segment, offset, line):
+        """Битий рядок сегмента -> journal.quarantine (один раз на процес; споживачі його пропускають)"""
+        if (segment, offset) in self._quarantined:
+            return
+        self._quarantined.add((segment, offset))
+        self.stats['quarantined'] += 1
+        logger.error(f"📓 Журнал: битий рядок у сегменті {segment} (зсув {offset}) - в карантин")
+        entry = {'segment': segment, 'offset': offset, 'line': line.decode('utf-8', errors='replace')}
+        try:
+            with open(self._quarantine_path(), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error(f"📓 Журнал: не вдалося записати карантин: {e}")
+
+    def commit(self, consumer, position):
+        """Зсуває курсор споживача і прибирає повністю оброблені сегменти"""
+        self._cursors[consumer] = position
+        path = self._cursor_path(consumer)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(list(position), f)
+        os.replace(path + '.tmp', path)
+
+        oldest = min(segment for segment, _ in self._cursors.values())
+        for segment in self._segments():
+            if segment >= oldest or segment >= self._segment:
+                break
+            os.remove(self._segment_path(segment))
+
+    def dead_letter(self, consumer, record, error, attempts):
+        """Відкладає запис, який споживач не зміг обробити (курсор після цього можна зсувати)"""
+        entry = {
+            'failed_at': datetime.now().isoformat(),
+            'consumer': consumer,
+            'attempts': attempts,
+            'error': error,
+            'record': record,
+        }
+        with open(self._dead_letter_path(consumer), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            if self.durable:
+                os.fsync(f.fileno())
+        self.dead_letters[consumer] = self.dead_letters.get(consumer, 0) + 1
+
+    def key(self, record):
+        """Ключ ідемпотентності запису для зовнішніх систем"""
+        return f"{self.id}:{record['seq']}"
+
+    async def wait_for_new(self, consumer, timeout):
+        """Чекає записів, закомічених після останнього read() споживача (або таймауту)"""
+        try:
+            await asyncio.wait_for(self._new_data[consumer].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def backlog(self, consumer):
+        """Приблизна кількість байтів, які споживачу ще треба обробити"""
+        segment, offset = self._cursors[consumer]
+        pending = 0
+        for number in self._segments():
+            if number < segment:
+                continue
+            size = os.path.getsize(self._segment_path(number))
+            pending += size - offset if number == segment else size
+        return pending
+
+    def snapshot(self):
+        return {
+            'segment': self._segment,
+            'seq': self._seq,
+            'pending_commit': len(self._pending),
+            'backlog_bytes': {name: self.backlog(name) for name in self.consumers},
+            'dead_letters': dict(self.dead_letters),
+            **self.stats,
+        }
@@ -0,0 +1,164 @@
+"""
+Звіт про пам'ять процесу (адмін-команда /memory та /debug/memory).
+
+- RSS процесу
+- розміри структур бота (user_data, задачі JobQueue, черги, кеші) - deep sizeof
+- топ алокацій tracemalloc та різниця між двома знімками
+
+tracemalloc сповільнює алокації, тому за замовчуванням вимкнений і
+вмикається командою (/memory trace on) або змінною MEMORY_TRACE=1.
+"""
+
+import gc
+import sys
+import tracemalloc
+from collections import deque
+from datetime import datetime
+
+def rss_bytes():
+    """Поточний RSS (Linux /proc), інакше пікове значення з getrusage"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return None
+
+def deep_sizeof(obj, seen=None):
+    """Приблизний розмір об'єкта разом з вмістом контейнерів (без спільних об'єктів двічі)"""
+    if seen is None:
+        seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        elif isinstance(item, (str, bytes, int, float, bool, type(None))):
+            continue
+        else:
+            if hasattr(item, '__dict__'):
+                stack.append(item.__dict__)
+            for slot in getattr(type(item), '__slots__', ()):
+                value = getattr(item, slot, None)
+                if value is not None:
+                    stack.append(value)
+    return total
+
+def human(size):
+    if size is None:
+        return '—'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+class MemoryReporter:
+    """Тримає попередній знімок tracemalloc, щоб показувати приріст між звітами"""
+
+    def __init__(self, top=15):
+        self.top = top
+        self._last_snapshot = None
+        self._last_taken_at = None
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def start_tracing(self, frames=1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    def stop_tracing(self):
+        tracemalloc.stop()
+        self._last_snapshot = None
+        self._last_taken_at = None
+
+    def _snapshot(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        return snapshot
+
+    def report(self, structures, diff=False):
+        """
+        structures: {назва: (кількість, об'єкт_для_deep_sizeof або None)}
+        diff=True - порівняти з попереднім знімком (і зберегти поточний як новий)
+        """
+        result = {
+            'taken_at': datetime.now().isoformat(timespec='seconds'),
+            'rss_bytes': rss_bytes(),
+            'gc_objects': len(gc.get_objects()),
+            'structures': {},
+            'tracing': self.tracing,
+        }
+        for name, (count, obj) in structures.items():
+            result['structures'][name] = {
+                'count': count,
+                'bytes': deep_sizeof(obj) if obj is not None else None,
+            }
+
+        if not self.tracing:
+            return result
+
+        current, peak = tracemalloc.get_traced_memory()
+        result['traced_bytes'] = current
+        result['traced_peak_bytes'] = peak
+
+        snapshot = self._snapshot()
+        result['top_allocators'] = [
+            {'where': str(stat.traceback[0]), 'bytes': stat.size, 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:self.top]
+        ]
+
+        if diff and self._last_snapshot is not None:
+            result['diff_since'] = self._last_taken_at
+            result['top_growth'] = [
+                {'where': str(stat.traceback[0]), 'size_diff': stat.size_diff, 'count_diff': stat.count_diff}
+                for stat in snapshot.compare_to(self._last_snapshot, 'lineno')[:self.top]
+            ]
+        if diff or self._last_snapshot is None:
+            self._last_snapshot = snapshot
+            self._last_taken_at = result['taken_at']
+        return result
+
+def format_text(report):
+    """Текстова версія звіту для Telegram / файлу"""
+    lines = [
+        f"🧠 Пам'ять ({report['taken_at']})",
+        f"RSS: {human(report['rss_bytes'])}, gc-об'єктів: {report['gc_objects']}",
+        "",
+        "Структури:",
+    ]
+    for name, info in report['structures'].items():
+        size = f", ~{human(info['bytes'])}" if info['bytes'] is not None else ""
+        lines.append(f"  {name}: {info['count']}{size}")
+
+    if not report['tracing']:
+        lines += ["", "tracemalloc вимкнено (/memory trace on)"]
+        return "\n".join(lines)
+
+    lines += ["", f"tracemalloc: {human(report['traced_bytes'])} (пік {human(report['traced_peak_bytes'])})", "Топ алокацій:"]
+    for item in report['top_allocators']:
+        lines.append(f"  {human(item['bytes']):>9}  {item['count']:>7}  {item['where']}")
+
+    if 'top_growth' in report:
+        lines += ["", f"Приріст з {report['diff_since']}:"]
+        for item in report['top_growth']:
+            lines.append(f"  {item['size_diff'] / 1024:+10.1f} KB  {item['count_diff']:+7d}  {item['where']}")
+    return "\n".join(lines)
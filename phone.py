@@ -0,0 +1,85 @@
+"""
+Нормалізація номерів телефону та індекс дублікатів лідів.
+
+Всі номери приводяться до E.164 (+380XXXXXXXXX для України), тому один і той
+самий клієнт, що вводить номер по-різному або з різних Telegram-акаунтів,
+потрапляє в індекс під одним ключем.
+"""
+
+import re
+
+# Компілюються один раз при імпорті
+PHONE_CANDIDATE_RE = re.compile(r'[\+\(\)\s\-\d]{9,20}')
+NON_DIGITS_RE = re.compile(r'\D')
+
+UA_COUNTRY_CODE = '380'
+
+def normalize_phone(raw):
+    """Повертає номер у форматі E.164 або None, якщо це не схоже на телефон"""
+    if not raw:
+        return None
+
+    raw = raw.strip()
+    has_plus = raw.startswith('+')
+    digits = NON_DIGITS_RE.sub('', raw)
+
+    # Міжнародний префікс 00 = '+'
+    if not has_plus and digits.startswith('00'):
+        digits = digits[2:]
+        has_plus = True
+
+    # Україна: +380XXXXXXXXX / 380XXXXXXXXX / 80XXXXXXXXX / 0XXXXXXXXX / XXXXXXXXX
+    if len(digits) == 12 and digits.startswith(UA_COUNTRY_CODE):
+        return '+' + digits
+    if not has_plus:
+        if len(digits) == 10 and digits.startswith('0'):
+            return '+38' + digits
+        if len(digits) == 11 and digits.startswith('80'):
+            return '+3' + digits
+        if len(digits) == 9:
+            return '+' + UA_COUNTRY_CODE + digits
+
+    # Іноземні номери: код країни + номер, до 15 цифр (Telegram віддає їх без '+')
+    if 8 <= len(digits) <= 15 and (has_plus or len(digits) >= 11):
+        return '+' + digits
+
+    return None
+
+def extract_phone(text):
+    """Шукає номер телефону у вільному тексті і нормалізує його (перший кандидат, що схожий на номер)"""
+    if not text:
+        return None
+    # Перед номером може бути дата чи сума, які теж схожі на кандидата
+    for match in PHONE_CANDIDATE_RE.finditer(text):
+        phone = normalize_phone(match.group())
+        if phone:
+            return phone
+    return None
+
+class PhoneIndex:
+    """Нормалізований телефон -> Telegram ID першого ліда з цим номером"""
+
+    __slots__ = ('_owners',)
+
+    def __init__(self):
+        self._owners = {}
+
+    def bulk_load(self, pairs):
+        """Завантажує пари (telegram_id, телефон), напр. з колонок листа Leads"""
+        loaded = 0
+        for telegram_id, raw_phone in pairs:
+            phone = normalize_phone(raw_phone)
+            if phone and phone not in self._owners:
+                self._owners[phone] = str(telegram_id)
+                loaded += 1
+        return loaded
+
+    def lookup(self, phone):
+        """Telegram ID, під яким цей номер уже є серед лідів, або None"""
+        return self._owners.get(phone)
+
+    def add(self, phone, telegram_id):
+        self._owners.setdefault(phone, str(telegram_id))
+
+    def __len__(self):
+        return len(self._owners)
@@ -0,0 +1,158 @@
+"""
+Пріоритетна обробка апдейтів (смуги high / normal / low).
+
+PTB створює задачу на кожен апдейт, а цей процесор вирішує, хто з них
+отримає один з WORKERS слотів обробки:
+
+- слоти видаються з купи (heap) за смугою, всередині смуги - FIFO
+- HIGH_RESERVE слотів доступні лише смузі high, тож телефон чи
+  "Замовити" не чекають, навіть коли всі інші слоти зайняті /start-ами
+- апдейти одного користувача обробляються строго по черзі (user_data
+  не змінюється з двох обробників одночасно)
+
+Обробник тримає слот, поки не завершиться, тож паузи сценарію (хвилина
+перед чек-листом після запису тощо) йдуть окремими задачами, а не в ньому.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+
+from telegram.ext import BaseUpdateProcessor
+
+HIGH, NORMAL, LOW = 0, 1, 2
+LANE_NAMES = {HIGH: 'high', NORMAL: 'normal', LOW: 'low'}
+
+class PriorityGate:
+    """Семафор з пріоритетами та резервом слотів для смуги high"""
+
+    def __init__(self, slots, high_reserve):
+        self.slots = slots
+        self.high_reserve = min(high_reserve, slots - 1)
+        self._free = slots
+        self._waiters = []            # heap: (смуга, порядковий номер, future)
+        self._order = itertools.count()
+
+    @property
+    def in_use(self):
+        return self.slots - self._free
+
+    def _can_run(self, lane):
+        return self._free > (0 if lane == HIGH else self.high_reserve)
+
+    async def acquire(self, lane):
+        if not self._waiters and self._can_run(lane):
+            self._free -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (lane, next(self._order), future))
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # слот видали, але задачу скасували до старту
+            raise
+
+    def release(self):
+        self._free += 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters:
+            lane, _, future = self._waiters[0]
+            if future.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_run(lane):
+                break
+            heapq.heappop(self._waiters)
+            self._free -= 1
+            future.set_result(None)
+
+    def waiting(self):
+        counts = dict.fromkeys(LANE_NAMES.values(), 0)
+        for lane, _, future in self._waiters:
+            if not future.done():
+                counts[LANE_NAMES[lane]] += 1
+        return counts
+
+class PriorityUpdateProcessor(BaseUpdateProcessor):
+    """
+    classify(update) -> (смуга, ключ_користувача або None).
+    max_pending - скільки апдейтів одночасно можуть чекати в процесорі
+    (понад це PTB притримує їх у власній черзі).
+    """
+
+    def __init__(self, classify, workers=8, high_reserve=2, max_pending=1000):
+        super().__init__(max_concurrent_updates=max_pending)
+        self.classify = classify
+        self.gate = PriorityGate(workers, high_reserve)
+        self._user_locks = {}         # ключ -> [Lock, кількість апдейтів, що його тримають/чекають]
+        self.stats = {
+            name: {'processed': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+            for name in LANE_NAMES.values()
+        }
+
+    async def do_process_update(self, update, coroutine):
+        lane, user_key = self.classify(update)
+        queued_at = time.monotonic()
+
+        entry = None
+        if user_key is not None:
+            entry = self._user_locks.setdefault(user_key, [asyncio.Lock(), 0])
+            entry[1] += 1
+        started = False
+        try:
+            # Спершу черга користувача, потім слот - щоб не тримати слот, чекаючи на себе ж
+            if entry:
+                await entry[0].acquire()
+            try:
+                await self.gate.acquire(lane)
+                try:
+                    self._record_wait(lane, time.monotonic() - queued_at)
+                    started = True
+                    await coroutine
+                finally:
+                    self.gate.release()
+            finally:
+                if entry:
+                    entry[0].release()
+        finally:
+            if not started:
+                coroutine.close()  # скасовано в черзі (зупинка бота)
+            if entry:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._user_locks.pop(user_key, None)
+
+    def _record_wait(self, lane, waited):
+        stats = self.stats[LANE_NAMES[lane]]
+        stats['processed'] += 1
+        stats['wait_total'] += waited
+        stats['wait_max'] = max(stats['wait_max'], waited)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def snapshot(self):
+        lanes = {}
+        for name, stats in self.stats.items():
+            processed = stats['processed']
+            lanes[name] = {
+                'processed': processed,
+                'wait_avg_ms': round(stats['wait_total'] / processed * 1000, 1) if processed else 0.0,
+                'wait_max_ms': round(stats['wait_max'] * 1000, 1),
+            }
+        return {
+            'workers': self.gate.slots,
+            'high_reserve': self.gate.high_reserve,
+            'in_use': self.gate.in_use,
+            'waiting': self.gate.waiting(),
+            'users_in_flight': len(self._user_locks),
+            'lanes': lanes,
+        }
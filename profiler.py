@@ -0,0 +1,160 @@
+"""
+Семплюючий профайлер для живого процесу (адмін-команда /profile).
+
+Фоновий потік кожні INTERVAL секунд знімає стеки всіх потоків
+(sys._current_frames): головного з event loop-ом та воркерів executor-а
+(requests, журнал, резолвінг DNS). Паралельно всередині loop-а семплюються
+asyncio-задачі: на чому саме "висить" кожна задача, що чекає на I/O.
+
+Накладні витрати - один прохід по стеках раз на INTERVAL, код бота не
+інструментується, тому профайлер можна вмикати в проді без рестарту.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Модулі stdlib, у верхньому кадрі яких потік просто чекає (не їсть CPU):
+# select() loop-а, queue.get() воркерів executor-а, accept() Flask-сервера
+IDLE_MODULES = {'selectors.py', 'threading.py', 'queue.py', 'thread.py', 'socket.py', 'socketserver.py', 'ssl.py'}
+
+# Категорії очікування для asyncio-задач (за шляхом до модуля)
+AWAIT_CATEGORIES = (
+    ('sheets_client', 'Google Sheets'),
+    ('httpx', 'Telegram API / HTTP'),
+    ('telegram', 'Telegram API / HTTP'),
+    ('requests', 'Make / HTTP (executor)'),
+    ('journal', 'Журнал (fsync)'),
+    ('concurrent', 'Executor'),
+    ('queues', 'Черга апдейтів'),
+    ('tasks', 'asyncio.sleep / таймер'),
+)
+
+def frame_key(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno} {code.co_name}"
+
+def await_point(frame):
+    """Рядок, на якому призупинена корутина (конкретний await)"""
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+
+def await_category(frame):
+    path = frame.f_code.co_filename.replace('\\', '/')
+    for marker, category in AWAIT_CATEGORIES:
+        if f"/{marker}" in path:
+            return category
+    return 'Інше'
+
+class SamplingProfiler:
+    """Одна сесія профілювання: start() -> (чекаємо) -> stop() -> report()"""
+
+    def __init__(self, interval=0.005, task_interval=0.02):
+        self.interval = interval
+        self.task_interval = task_interval
+        self.samples = Counter()       # потік -> кількість семплів
+        self.busy = Counter()          # потік -> семпли, коли потік не чекав
+        self.self_time = Counter()     # (потік, функція) -> семпли на верхівці стеку
+        self.total_time = Counter()    # функція -> семпли будь-де в стеку
+        self.awaiting = Counter()      # (категорія, кадр) -> семпли очікування задач
+        self.task_samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._task = None
+
+    # ---------- семплювання ----------
+
+    def _sample_threads(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            thread = names.get(ident, str(ident))
+            self.samples[thread] += 1
+            if os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                continue
+            self.busy[thread] += 1
+            self.self_time[(thread, frame_key(frame))] += 1
+            seen = set()
+            while frame is not None:
+                key = frame_key(frame)
+                if key not in seen:
+                    seen.add(key)
+                    self.total_time[key] += 1
+                frame = frame.f_back
+
+    def _thread_loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample_threads()
+
+    async def _task_loop(self):
+        current = asyncio.current_task()
+        while not self._stop.is_set():
+            for task in asyncio.all_tasks():
+                if task is current or task.done():
+                    continue
+                stack = task.get_stack()
+                if not stack:
+                    continue
+                innermost = stack[-1]
+                self.awaiting[(await_category(innermost), await_point(innermost))] += 1
+            self.task_samples += 1
+            await asyncio.sleep(self.task_interval)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._thread_loop, name='profiler', daemon=True)
+        self._thread.start()
+        self._task = asyncio.get_running_loop().create_task(self._task_loop())
+
+    async def stop(self):
+        self._stop.set()
+        self.duration = time.monotonic() - self.started_at
+        self._thread.join()
+        await self._task
+
+    async def run(self, seconds):
+        self.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await self.stop()
+        return self.report()
+
+    # ---------- звіт ----------
+
+    def report(self, top=30):
+        lines = [
+            f"Профіль: {self.duration:.1f} с, інтервал {self.interval * 1000:.0f} мс",
+            "",
+            "ЗАВАНТАЖЕНІСТЬ ПОТОКІВ (не в очікуванні)",
+        ]
+        for thread, count in self.samples.most_common():
+            busy = self.busy[thread]
+            lines.append(f"  {busy / count * 100:5.1f}%  {thread}  ({busy}/{count})")
+
+        lines += ["", f"ТОП-{top} ГАРЯЧИХ ФУНКЦІЙ (self)"]
+        for (thread, key), count in self.self_time.most_common(top):
+            lines.append(f"  {count:6d}  {key}  [{thread}]")
+
+        lines += ["", f"ТОП-{top} ЗА ВКЛЮЧНИМ ЧАСОМ (total)"]
+        for key, count in self.total_time.most_common(top):
+            lines.append(f"  {count:6d}  {key}")
+
+        lines += ["", f"ОЧІКУВАННЯ ASYNCIO-ЗАДАЧ ({self.task_samples} семплів)"]
+        by_category = Counter()
+        for (category, _), count in self.awaiting.items():
+            by_category[category] += count
+        total = sum(by_category.values()) or 1
+        for category, count in by_category.most_common():
+            lines.append(f"  {count / total * 100:5.1f}%  {category}")
+        lines.append("")
+        for (category, key), count in self.awaiting.most_common(top):
+            lines.append(f"  {count:6d}  {key}  [{category}]")
+
+        return "\n".join(lines) + "\n"
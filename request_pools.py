@@ -0,0 +1,170 @@
+"""
+Окремі HTTP-пули Telegram Bot API для різних класів трафіку.
+
+PTB за замовчуванням шле все, крім getUpdates, через один пул з'єднань:
+сплеск нагадувань чи розсилка займає всі з'єднання, і відповідь на
+натискання кнопки чекає в черзі за ними. Тут кожен клас має свій
+HTTPXRequest (розмір пулу, таймаути), а RoutedRequest - BaseRequest, який
+PTB бачить як один request бота, - обирає пул за contextvar TRAFFIC_CLASS:
+
+- polling     - лише getUpdates (окремий RoutedRequest з fixed=POLLING)
+- interactive - відповіді на апдейти (за замовчуванням)
+- background  - задачі JobQueue (нагадування) та розсилки
+- admin       - сповіщення адміну (ліди, питання клієнтів, помилки)
+
+Для кожного пулу рахуються запити, помилки, відмови через зайнятий пул
+(pool timeout), запити в польоті, пік, середнє навантаження та затримка.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+from telegram.error import TimedOut
+from telegram.request import BaseRequest, HTTPXRequest
+
+POLLING = 'polling'
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+ADMIN = 'admin'
+
+TRAFFIC_CLASS = contextvars.ContextVar('traffic_class', default=INTERACTIVE)
+
+@contextmanager
+def traffic(name):
+    """Запити Bot API всередині блоку йдуть через пул name"""
+    token = TRAFFIC_CLASS.set(name)
+    try:
+        yield
+    finally:
+        TRAFFIC_CLASS.reset(token)
+
+class PoolStats:
+    def __init__(self, size):
+        self.size = size
+        self.requests = 0
+        self.errors = 0
+        self.pool_timeouts = 0
+        self.in_flight = 0             # разом з тими, що чекають вільне з'єднання
+        self.peak = 0
+        self.seconds_total = 0.0
+        self.seconds_max = 0.0
+        self._started = time.monotonic()
+        self._changed = self._started
+        self._busy_area = 0.0          # інтеграл in_flight по часу
+
+    def _advance(self, now):
+        self._busy_area += self.in_flight * (now - self._changed)
+        self._changed = now
+
+    def begin(self):
+        now = time.monotonic()
+        self._advance(now)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        return now
+
+    def end(self, started, error=None):
+        now = time.monotonic()
+        self._advance(now)
+        self.in_flight -= 1
+        self.requests += 1
+        elapsed = now - started
+        self.seconds_total += elapsed
+        self.seconds_max = max(self.seconds_max, elapsed)
+        if error is not None:
+            self.errors += 1
+            if isinstance(error, TimedOut) and str(error).startswith('Pool timeout'):
+                self.pool_timeouts += 1
+
+    def snapshot(self):
+        now = time.monotonic()
+        self._advance(now)
+        elapsed = max(now - self._started, 1e-9)
+        return {
+            'size': self.size,
+            'in_flight': self.in_flight,
+            'peak': self.peak,
+            # Середнє запитів у польоті / розмір пулу; > 1 - запити чекали на з'єднання
+            'load_avg': round(self._busy_area / elapsed / self.size, 4),
+            'requests': self.requests,
+            'errors': self.errors,
+            'pool_timeouts': self.pool_timeouts,
+            'latency_avg_ms': round(self.seconds_total / self.requests * 1000, 1) if self.requests else 0.0,
+            'latency_max_ms': round(self.seconds_max * 1000, 1),
+        }
+
+class TrafficPools:
+    """
+    specs: клас -> {'size', 'read_timeout', 'write_timeout', 'connect_timeout', 'pool_timeout'}.
+    Один набір на процес - його ділять всі боти (тенанти).
+    """
+
+    def __init__(self, specs):
+        self.specs = specs
+        self.requests = {
+            name: HTTPXRequest(
+                connection_pool_size=spec['size'],
+                read_timeout=spec['read_timeout'],
+                write_timeout=spec['write_timeout'],
+                connect_timeout=spec['connect_timeout'],
+                pool_timeout=spec['pool_timeout'],
+            )
+            for name, spec in specs.items()
+        }
+        self.stats = {name: PoolStats(spec['size']) for name, spec in specs.items()}
+
+    def pick(self, name):
+        return name if name in self.requests else INTERACTIVE
+
+    async def initialize(self):
+        for request in self.requests.values():
+            await request.initialize()
+
+    async def shutdown(self):
+        for request in self.requests.values():
+            await request.shutdown()
+
+    def snapshot(self):
+        return {
+            name: {
+                **self.stats[name].snapshot(),
+                'read_timeout': self.specs[name]['read_timeout'],
+                'pool_timeout': self.specs[name]['pool_timeout'],
+            }
+            for name in self.requests
+        }
+
+class RoutedRequest(BaseRequest):
+    """BaseRequest бота: кожен виклик - у пул поточного класу трафіку (або завжди у fixed)"""
+
+    def __init__(self, pools, fixed=None):
+        self.pools = pools
+        self.fixed = fixed
+
+    def _name(self):
+        return self.pools.pick(self.fixed or TRAFFIC_CLASS.get())
+
+    @property
+    def read_timeout(self):
+        # PTB додає його до long polling таймауту getUpdates
+        return self.pools.requests[self._name()].read_timeout
+
+    async def initialize(self):
+        await self.pools.initialize()
+
+    async def shutdown(self):
+        # Пули спільні: закриваються, коли зупиняється перший бот - після того, як зупинились усі
+        await self.pools.shutdown()
+
+    async def do_request(self, url, method, request_data=None, **timeouts):
+        name = self._name()
+        stats = self.pools.stats[name]
+        started = stats.begin()
+        try:
+            result = await self.pools.requests[name].do_request(url, method, request_data, **timeouts)
+        except Exception as e:
+            stats.end(started, e)
+            raise
+        stats.end(started)
+        return result
@@ -0,0 +1,126 @@
+"""
+Скидання необов'язкової роботи під навантаженням (load shedding).
+
+Контролер раз на INTERVAL секунд знімає сигнали тиску - черга апдейтів,
+хвіст журналу до Sheets, затримка event loop-а - і тримає рівень
+деградації (tier). Бот сам вирішує, що саме відкидати на кожному рівні;
+тут лише рівень, гістерезис і лічильники.
+
+Гістерезис:
+- вгору - одразу, щойно будь-який сигнал перетнув поріг вищого рівня
+- вниз - на один рівень за раз і лише після того, як УСІ сигнали протягом
+  cooldown секунд трималися нижче exit_ratio * поріг поточного рівня
+Так рівень не "блимає" на межі порогу.
+"""
+
+import asyncio
+import time
+from collections import Counter
+
+class LoadShedder:
+    """
+    signals: назва -> функція без аргументів, що повертає поточне значення.
+    thresholds: назва -> пороги входу на рівні 1..N (за зростанням).
+    Сигнал 'loop_lag' (секунди) контролер міряє сам.
+    """
+
+    def __init__(self, signals, thresholds, tier_names, exit_ratio=0.5, cooldown=30.0, interval=1.0, on_change=None):
+        self.signals = signals
+        self.thresholds = {name: tuple(levels) for name, levels in thresholds.items()}
+        self.tier_names = tier_names
+        self.exit_ratio = exit_ratio
+        self.cooldown = cooldown
+        self.interval = interval
+        self.on_change = on_change
+        self.tier = 0
+        self.values = {}
+        self.shed = Counter()          # що саме відкинуто: назва дії -> разів
+        self.transitions = 0
+        self._calm_since = None
+        self._tier_since = time.monotonic()
+        self._time_in_tier = Counter()
+        self._task = None
+
+    def level(self, name, value, ratio=1.0):
+        """Найвищий рівень, поріг якого value перетнуло"""
+        level = 0
+        for tier, threshold in enumerate(self.thresholds.get(name, ()), start=1):
+            if value >= threshold * ratio:
+                level = tier
+        return level
+
+    def observe(self, values, now=None):
+        """Новий замір сигналів -> можливо, новий рівень"""
+        now = time.monotonic() if now is None else now
+        self.values = values
+        pressure = max((self.level(name, value) for name, value in values.items()), default=0)
+        if pressure > self.tier:
+            self._set_tier(pressure, now)
+            return
+        # Нижче рівня лише тоді, коли всі сигнали під порогом виходу поточного рівня
+        calm = max((self.level(name, value, self.exit_ratio) for name, value in values.items()), default=0) < self.tier
+        if not calm:
+            self._calm_since = None
+        elif self._calm_since is None:
+            self._calm_since = now
+        elif now - self._calm_since >= self.cooldown:
+            self._set_tier(self.tier - 1, now)
+
+    def _set_tier(self, tier, now):
+        old = self.tier
+        self._time_in_tier[old] += now - self._tier_since
+        self._tier_since = now
+        self._calm_since = now if tier else None  # наступний крок униз - знову після cooldown
+        self.tier = tier
+        self.transitions += 1
+        if self.on_change:
+            self.on_change(old, tier, self.values)
+
+    def count(self, action, amount=1):
+        self.shed[action] += amount
+
+    # ---------- фонова задача ----------
+
+    def _sample(self, loop_lag):
+        values = {'loop_lag': loop_lag}
+        for name, read in self.signals.items():
+            try:
+                values[name] = read()
+            except Exception:
+                values[name] = 0
+        return values
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            # Наскільки пізніше, ніж просили, loop повернувся до цієї задачі
+            self.observe(self._sample(max(0.0, loop.time() - started - self.interval)))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self):
+        now = time.monotonic()
+        time_in_tier = Counter(self._time_in_tier)
+        time_in_tier[self.tier] += now - self._tier_since
+        return {
+            'tier': self.tier,
+            'tier_name': self.tier_names[self.tier],
+            'values': {name: round(value, 3) for name, value in self.values.items()},
+            'thresholds': self.thresholds,
+            'transitions': self.transitions,
+            'seconds_in_tier': {self.tier_names[tier]: round(seconds, 1) for tier, seconds in sorted(time_in_tier.items())},
+            'shed': dict(self.shed),
+        }
@@ -0,0 +1,235 @@
+"""
+Асинхронний клієнт Google Sheets (REST API v4) поверх httpx.
+
+Всі запити йдуть через один httpx.AsyncClient з HTTP/2, тож десятки
+одночасних записів мультиплексуються в одне TCP/TLS-з'єднання, а потоки
+executor-а для Sheets більше не потрібні.
+
+Авторизація - сервісний акаунт: JWT підписується ключем з oauth2client.crypt
+і міняється на access token, який кешується до закінчення терміну дії.
+"""
+
+import asyncio
+import re
+import time
+from urllib.parse import quote
+
+import httpx
+from oauth2client import crypt
+
+SHEETS_API = "https://sheets.googleapis.com/v4/spreadsheets"
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+SCOPES = ("https://www.googleapis.com/auth/spreadsheets",)
+
+SPREADSHEET_ID_RE = re.compile(r'/spreadsheets/d/([a-zA-Z0-9-_]+)')
+RANGE_START_ROW_RE = re.compile(r'!\$?[A-Z]+\$?(\d+)')
+
+class SheetsApiError(Exception):
+    """Відповідь Sheets API з кодом помилки"""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+def spreadsheet_id_from_url(url):
+    match = SPREADSHEET_ID_RE.search(url or '')
+    if not match:
+        raise ValueError(f"Не схоже на URL Google таблиці: {url!r}")
+    return match.group(1)
+
+def new_http_client(timeout=10.0, max_connections=10):
+    """HTTP/2-пул до Sheets API (можна ділити між кількома SheetsClient)"""
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    )
+
+def a1(sheet, cells):
+    """'All_Users', 'F12' -> "'All_Users'!F12" """
+    return "'" + sheet.replace("'", "''") + "'!" + cells
+
+def range_start_row(range_a1):
+    """"'All_Users'!A5001:G5003" -> 5001 (None, якщо рядка немає)"""
+    match = RANGE_START_ROW_RE.search(range_a1 or '')
+    return int(match.group(1)) if match else None
+
+def column_letter(col):
+    """6 -> 'F', 27 -> 'AA'"""
+    letters = ''
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(ord('A') + rem) + letters
+    return letters
+
+class ServiceAccountToken:
+    """Access token сервісного акаунта (JWT bearer grant) з кешуванням"""
+
+    def __init__(self, client_email, private_key, private_key_id=None, token_uri=TOKEN_URI, scopes=SCOPES):
+        self._signer = crypt.Signer.from_string(private_key)
+        self.client_email = client_email
+        self.private_key_id = private_key_id
+        self.token_uri = token_uri
+        self.scopes = scopes
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _assertion(self):
+        now = int(time.time())
+        payload = {
+            'iss': self.client_email,
+            'scope': ' '.join(self.scopes),
+            'aud': self.token_uri,
+            'iat': now,
+            'exp': now + 3600,
+        }
+        return crypt.make_signed_jwt(self._signer, payload, key_id=self.private_key_id).decode('ascii')
+
+    async def get(self, http):
+        if self._token and time.monotonic() < self._expires_at:
+            return self._token
+        async with self._lock:
+            if self._token and time.monotonic() < self._expires_at:
+                return self._token
+            response = await http.post(self.token_uri, data={
+                'grant_type': 'urn:ietf:params:oauth:grant-type:jwt-bearer',
+                'assertion': self._assertion(),
+            })
+            if response.status_code != 200:
+                raise SheetsApiError(response.status_code, f"token: {response.text[:200]}")
+            data = response.json()
+            self._token = data['access_token']
+            # Оновлюємо за хвилину до закінчення
+            self._expires_at = time.monotonic() + int(data.get('expires_in', 3600)) - 60
+            return self._token
+
+class SheetsClient:
+    """Корутини над values.* та spreadsheets.batchUpdate однієї таблиці"""
+
+    def __init__(self, spreadsheet_id, token, timeout=10.0, max_connections=10, http=None):
+        """http - спільний httpx.AsyncClient кількох таблиць; тоді close() його не закриває"""
+        self.spreadsheet_id = spreadsheet_id
+        self.token = token
+        self._owns_http = http is None
+        self.http = http or new_http_client(timeout, max_connections)
+        self.stats = {'requests': 0, 'errors': 0}
+
+    @classmethod
+    def from_service_account(cls, sheet_url, creds, **kwargs):
+        """creds - словник сервісного акаунта (як JSON-ключ)"""
+        token = ServiceAccountToken(
+            creds['client_email'],
+            creds['private_key'],
+            creds.get('private_key_id'),
+            creds.get('token_uri') or TOKEN_URI,
+        )
+        return cls(spreadsheet_id_from_url(sheet_url), token, **kwargs)
+
+    async def close(self):
+        if self._owns_http:
+            await self.http.aclose()
+
+    async def _request(self, method, path, **kwargs):
+        token = await self.token.get(self.http)
+        self.stats['requests'] += 1
+        response = await self.http.request(
+            method, f"{SHEETS_API}/{self.spreadsheet_id}{path}",
+            headers={'Authorization': f"Bearer {token}"}, **kwargs
+        )
+        if response.status_code >= 400:
+            self.stats['errors'] += 1
+            raise SheetsApiError(response.status_code, response.text[:300])
+        return response.json()
+
+    # ---------- значення ----------
+
+    async def values_get(self, range_a1):
+        """Значення діапазону: список рядків (без порожніх хвостів)"""
+        data = await self._request('GET', f"/values/{quote(range_a1, safe='')}")
+        return data.get('values', [])
+
+    async def values_batch_get(self, ranges):
+        """Кілька діапазонів одним запитом"""
+        data = await self._request('GET', "/values:batchGet", params=[('ranges', r) for r in ranges])
+        return [value_range.get('values', []) for value_range in data.get('valueRanges', [])]
+
+    async def append_rows(self, sheet, rows, value_input_option='RAW'):
+        """Дописує рядки в кінець листа одним запитом. Повертає номер першого доданого рядка"""
+        data = await self._request(
+            'POST', f"/values/{quote(a1(sheet, 'A1'), safe='')}:append",
+            params={'valueInputOption': value_input_option, 'insertDataOption': 'INSERT_ROWS'},
+            json={'values': rows},
+        )
+        return range_start_row(data.get('updates', {}).get('updatedRange'))
+
+    async def batch_update(self, data, value_input_option='RAW'):
+        """data: [{'range': "'All_Users'!F12", 'values': [['Так']]}, ...] - одним запитом"""
+        if not data:
+            return
+        await self._request(
+            'POST', "/values:batchUpdate",
+            json={'valueInputOption': value_input_option, 'data': data},
+        )
+
+    # ---------- структура таблиці ----------
+
+    async def sheet_titles(self):
+        data = await self._request('GET', "", params={'fields': 'sheets.properties.title'})
+        return [sheet['properties']['title'] for sheet in data.get('sheets', [])]
+
+    async def ensure_sheet(self, title, header, rows=1000, cols=10, existing=None):
+        """Створює лист із заголовком, якщо його ще немає. True - створено"""
+        if existing is None:
+            existing = await self.sheet_titles()
+        if title in existing:
+            return False
+        await self._request('POST', ":batchUpdate", json={'requests': [{'addSheet': {'properties': {
+            'title': title,
+            'gridProperties': {'rowCount': rows, 'columnCount': cols},
+        }}}]})
+        await self.append_rows(title, [header])
+        return True
+
+    async def ensure_headers(self, headers):
+        """
+        headers: {лист: заголовок}. Дописує в рядок 1 колонки, яких бракує в кінці
+        заголовка (лист створено до того, як заголовок розширили), і за потреби
+        розширює сітку. Повертає листи, де заголовок дописано
+        """
+        titles = list(headers)
+        if not titles:
+            return []
+        first_rows = await self.values_batch_get([a1(title, '1:1') for title in titles])
+        missing = {}  # лист -> скільки колонок заголовка вже є
+        for title, values in zip(titles, first_rows):
+            row = values[0] if values else []
+            header = headers[title]
+            # Чужий або порожній заголовок не чіпаємо
+            if row and len(row) < len(header) and row == header[:len(row)]:
+                missing[title] = len(row)
+        if not missing:
+            return []
+
+        data = await self._request('GET', "", params={'fields': 'sheets.properties(sheetId,title,gridProperties.columnCount)'})
+        grow = []
+        for sheet in data.get('sheets', []):
+            properties = sheet['properties']
+            title = properties['title']
+            if title not in missing:
+                continue
+            columns = properties.get('gridProperties', {}).get('columnCount', 0)
+            if columns < len(headers[title]):
+                grow.append({'appendDimension': {
+                    'sheetId': properties['sheetId'], 'dimension': 'COLUMNS', 'length': len(headers[title]) - columns,
+                }})
+        if grow:
+            await self._request('POST', ":batchUpdate", json={'requests': grow})
+        await self.batch_update([
+            {'range': a1(title, f"{column_letter(start + 1)}1"), 'values': [headers[title][start:]]}
+            for title, start in missing.items()
+        ])
+        return list(missing)
+
+    def snapshot(self):
+        return dict(self.stats)
@@ -0,0 +1,251 @@
+"""
+Симуляція нагадувань та пауз сценарію у віртуальному часі.
+
+Справжні обробники бота працюють з тими ж інтерфейсами, що й у PTB
+(context.job_queue, context.bot, update.callback_query...), але:
+
+- SimJobQueue планує задачі на SimClock (run_once / run_repeating /
+  get_jobs_by_name / schedule_removal)
+- SimBot нічого не відправляє, а лише рахує повідомлення - окремо для
+  обробників та для кожного виду нагадувань
+- SimApplication тримає user_data / chat_data як Application
+
+Статистика: скільки нагадувань надіслано, скасовано до спрацювання і
+скільки спрацювало вхолосту (користувач вже пройшов далі).
+"""
+
+import contextvars
+from collections import Counter
+from types import SimpleNamespace
+
+# Задача JobQueue, всередині якої виконується код (None - обробник апдейту)
+CURRENT_JOB = contextvars.ContextVar('sim_job', default=None)
+
+class SimJob:
+    def __init__(self, queue, callback, name, chat_id=None, user_id=None, data=None):
+        self.queue = queue
+        self.callback = callback
+        self.name = name
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.data = data
+        self.removed = False
+        self.finished = False
+        self.sent = 0
+
+    @property
+    def kind(self):
+        return self.callback.__name__
+
+    def schedule_removal(self):
+        if not self.removed and not self.finished:
+            self.queue.stats['cancelled'][self.kind] += 1
+        self.removed = True
+
+class SimJobQueue:
+    """Підмножина telegram.ext.JobQueue, яку використовує бот, на віртуальному годиннику"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.application = None
+        self._jobs = {}               # назва -> {SimJob: None} (упорядкована множина)
+        self.stats = {
+            'scheduled': Counter(),
+            'cancelled': Counter(),
+            'fired': Counter(),
+            'idle': Counter(),        # спрацювали, але нічого не надіслали
+            'errors': Counter(),
+        }
+
+    def set_application(self, application):
+        self.application = application
+
+    def run_once(self, callback, when, chat_id=None, user_id=None, name=None, data=None, **kwargs):
+        job = SimJob(self, callback, name or callback.__name__, chat_id, user_id, data)
+        self._jobs.setdefault(job.name, {})[job] = None
+        self.stats['scheduled'][job.kind] += 1
+        self.clock.spawn(self._run(job, when))
+        return job
+
+    def run_repeating(self, callback, interval, first=None, name=None, data=None, **kwargs):
+        job = SimJob(self, callback, name or callback.__name__, data=data)
+        self._jobs.setdefault(job.name, {})[job] = None
+        self.clock.spawn(self._repeat(job, interval, interval if first is None else first))
+        return job
+
+    async def _run(self, job, when):
+        await self.clock.sleep(when)
+        if not job.removed:
+            await self._fire(job)
+        job.finished = True
+        same_name = self._jobs[job.name]
+        del same_name[job]
+        if not same_name:
+            del self._jobs[job.name]
+
+    async def _repeat(self, job, interval, first):
+        """Службові задачі (витіснення тощо) - без статистики нагадувань"""
+        await self.clock.sleep(first)
+        while not job.removed:
+            try:
+                await job.callback(self.application.context(None, job=job))
+            except Exception:
+                self.stats['errors'][job.kind] += 1
+            await self.clock.sleep(interval)
+
+    async def _fire(self, job):
+        self.stats['fired'][job.kind] += 1
+        sent_before = job.sent
+        CURRENT_JOB.set(job)
+        try:
+            await job.callback(self.application.context(job.user_id, job=job))
+        except Exception:
+            self.stats['errors'][job.kind] += 1
+        if job.sent == sent_before:
+            self.stats['idle'][job.kind] += 1
+
+    def get_jobs_by_name(self, name):
+        return tuple(job for job in self._jobs.get(name, ()) if not job.removed)
+
+    def jobs(self):
+        return tuple(job for jobs in self._jobs.values() for job in jobs if not job.removed)
+
+class SimBot:
+    """Замість Telegram: лічильники відправлених повідомлень"""
+
+    def __init__(self):
+        self.sent = Counter()          # 'handler' або вид нагадування -> повідомлень
+        self.edited = 0
+        self.chat_actions = 0
+        self._message_id = 0
+
+    def message(self, chat_id):
+        self._message_id += 1
+        return SimpleNamespace(message_id=self._message_id, chat_id=chat_id, chat=SimpleNamespace(id=chat_id))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        job = CURRENT_JOB.get()
+        if job is None:
+            self.sent['handler'] += 1
+        else:
+            self.sent[job.kind] += 1
+            job.sent += 1
+        return self.message(chat_id)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        return await self.send_message(chat_id, '', **kwargs)
+
+    async def send_chat_action(self, chat_id, action, **kwargs):
+        self.chat_actions += 1
+        return True
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.edited += 1
+        return True
+
+class SimContext:
+    """Те, що обробники беруть з CallbackContext"""
+
+    def __init__(self, application, user_id, job=None):
+        self.application = application
+        self.bot = application.bot
+        self.job_queue = application.job_queue
+        self.job = job
+        self.args = []
+        self.user_data = application.user_data.setdefault(user_id, {}) if user_id is not None else None
+        self.chat_data = application.chat_data.setdefault(user_id, {}) if user_id is not None else None
+
+class SimApplication:
+    def __init__(self, bot, job_queue):
+        self.bot = bot
+        self.job_queue = job_queue
+        self.user_data = {}
+        self.chat_data = {}
+        job_queue.set_application(self)
+
+    def context(self, user_id, job=None):
+        return SimContext(self, user_id, job)
+
+    def drop_user_data(self, user_id):
+        self.user_data.pop(user_id, None)
+
+    def drop_chat_data(self, chat_id):
+        self.chat_data.pop(chat_id, None)
+
+    def create_task(self, coro, **kwargs):
+        return self.job_queue.clock.spawn(coro)
+
+# ---------- апдейти віртуальних користувачів ----------
+
+class SimUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.username = f"sim{user_id}"
+        self.first_name = f"Sim{user_id}"
+        self.last_name = ''
+        self.phone = f"+38067{user_id % 10_000_000:07d}"
+
+class _Query:
+    def __init__(self, bot, user, data):
+        self.bot = bot
+        self.data = data
+        self.from_user = user
+        self.message = bot.message(user.id)
+
+    async def answer(self, *args, **kwargs):
+        return True
+
+    async def edit_message_text(self, text, **kwargs):
+        return await self.bot.edit_message_text(text, chat_id=self.message.chat_id)
+
+class _Message:
+    def __init__(self, bot, user, text=None, contact=None):
+        self.bot = bot
+        self.text = text
+        self.contact = contact
+        self.chat_id = user.id
+        self.from_user = user
+
+    async def reply_text(self, text, **kwargs):
+        return await self.bot.send_message(self.chat_id, text, **kwargs)
+
+def message_update(bot, user, text=None, phone=None):
+    contact = SimpleNamespace(phone_number=phone, user_id=user.id) if phone else None
+    return SimpleNamespace(
+        effective_user=user,
+        effective_chat=SimpleNamespace(id=user.id),
+        message=_Message(bot, user, text, contact),
+        callback_query=None,
+    )
+
+def callback_update(bot, user, data):
+    return SimpleNamespace(
+        effective_user=user,
+        effective_chat=SimpleNamespace(id=user.id),
+        message=None,
+        callback_query=_Query(bot, user, data),
+    )
+
+def format_report(job_queue, bot, clock, extra):
+    """Текстовий звіт симуляції"""
+    stats = job_queue.stats
+    lines = [
+        f"🧪 Симуляція: {clock.elapsed / 3600:.1f} год віртуального часу, {clock.wakeups} пробуджень таймерів",
+        "",
+        f"{'нагадування':<28}{'заплан.':>9}{'скасов.':>9}{'спрацюв.':>10}{'вхолосту':>10}{'надісл.':>9}",
+    ]
+    kinds = sorted(set(stats['scheduled']) | set(stats['fired']))
+    for kind in kinds:
+        lines.append(
+            f"{kind:<28}{stats['scheduled'][kind]:>9}{stats['cancelled'][kind]:>9}"
+            f"{stats['fired'][kind]:>10}{stats['idle'][kind]:>10}{bot.sent[kind]:>9}"
+        )
+    errors = sum(stats['errors'].values())
+    lines += [
+        "",
+        f"Повідомлень з обробників: {bot.sent['handler']}, редагувань: {bot.edited}, chat action: {bot.chat_actions}",
+        f"Помилок у задачах: {errors}" + (f" {dict(stats['errors'])}" if errors else ""),
+    ]
+    for name, value in extra.items():
+        lines.append(f"{name}: {value}")
+    return "\n".join(lines)
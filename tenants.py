@@ -0,0 +1,140 @@
+"""
+Кілька ботів (брендів / міст) в одному процесі.
+
+TENANTS_FILE - JSON-список тенантів:
+
+    [
+      {"name": "default", "token_env": "BOT_TOKEN"},
+      {"name": "lviv", "token_env": "LVIV_BOT_TOKEN", "sheet_url": "https://...",
+       "admin_id": "123456", "catalog": "data/tenants/lviv/catalog.json"}
+    ]
+
+Кожен тенант - свій Application (токен), своя таблиця, адмін, каталог
+текстів і цін та за бажанням свій Make webhook. Спільні - event loop,
+HTTP-пули Telegram і Sheets, журнал записів, процесор апдейтів, Flask та
+load shedding.
+
+Тенант поточного апдейту чи задачі JobQueue лежить у contextvar
+CURRENT_TENANT: його ставить контекст обробника (TenantContext у bot.py),
+тож обробники, нагадування і задачі, які вони створюють, бачать "свого"
+тенанта без передавання через аргументи.
+
+Тенант "default" - це бот з env (BOT_TOKEN, GOOGLE_SHEET_URL, ADMIN_ID,
+CATALOG_PATH): поля, яких немає у файлі, він бере звідти, а його дані,
+курсор журналу та холодне сховище лишаються на старих місцях. Тож перехід
+з одного бота на кілька нічого не мігрує.
+"""
+
+import contextvars
+import json
+import os
+import re
+
+DEFAULT_TENANT = 'default'
+NAME_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,31}$')
+CONFIG_FIELDS = {'name', 'token', 'token_env', 'sheet_url', 'admin_id', 'catalog', 'make_webhook_url'}
+
+# Тенант, у контексті якого виконується код (None - поза апдейтами/задачами)
+CURRENT_TENANT = contextvars.ContextVar('tenant', default=None)
+
+class TenantConfigError(ValueError):
+    """Некоректний TENANTS_FILE"""
+
+def tenant_data_dir(base_dir, name):
+    """Тека з архівом, розсилками та сховищем тенанта"""
+    return base_dir if name == DEFAULT_TENANT else os.path.join(base_dir, 'tenants', name)
+
+class Tenant:
+    def __init__(self, name, token, sheet_url=None, admin_id=None, catalog_path=None,
+                 make_webhook_url=None, data_dir='data'):
+        self.name = name
+        self.token = token
+        self.sheet_url = sheet_url
+        self.admin_id = admin_id
+        self.catalog_path = catalog_path
+        self.make_webhook_url = make_webhook_url
+        self.data_dir = data_dir
+
+        # Стан тенанта - заповнює bot.py (init_tenant_state / старт)
+        self.application = None
+        self.sheets = None
+        self.sheets_retry_at = 0.0
+        self.sheets_retry_delay = 0
+        self.sheets_breaker = None
+        self.shards = None
+        self.status_cache = None
+        self.status_coalescer = None
+        self.phone_index = None
+        self.catalog = None
+        self.catalog_stamp = None
+        self.cold_storage = None
+        self.user_last_seen = None
+        self.active_broadcast = None
+
+    @property
+    def is_default(self):
+        return self.name == DEFAULT_TENANT
+
+    @property
+    def journal_name(self):
+        """Поле 'tenant' у записах журналу (у записів default його немає - як і до тенантів)"""
+        return None if self.is_default else self.name
+
+    @property
+    def sheets_consumer(self):
+        """Споживач журналу, що доносить записи тенанта в його таблицю"""
+        return 'sheets' if self.is_default else f"sheets@{self.name}"
+
+    @property
+    def broadcast_dir(self):
+        return os.path.join(self.data_dir, 'broadcasts')
+
+    def __repr__(self):
+        return f"Tenant({self.name!r})"
+
+def load_tenants(path, base_dir, defaults):
+    """
+    Читає TENANTS_FILE. defaults - значення з env для тенанта 'default'
+    (token, sheet_url, admin_id, catalog, make_webhook_url).
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+    except (OSError, ValueError) as e:
+        raise TenantConfigError(f"{path}: {e}")
+    if not isinstance(entries, list) or not entries:
+        raise TenantConfigError(f"{path}: очікується непорожній JSON-список")
+
+    result = []
+    seen = set()
+    for index, entry in enumerate(entries):
+        where = f"{path}[{index}]"
+        if not isinstance(entry, dict):
+            raise TenantConfigError(f"{where}: очікується об'єкт")
+        unknown = set(entry) - CONFIG_FIELDS
+        if unknown:
+            raise TenantConfigError(f"{where}: невідомі поля {sorted(unknown)}")
+        name = entry.get('name')
+        if not isinstance(name, str) or not NAME_RE.match(name):
+            raise TenantConfigError(f"{where}: name - малі латинські літери, цифри, '-' або '_'")
+        if name in seen:
+            raise TenantConfigError(f"{where}: тенант {name} вже є")
+        seen.add(name)
+
+        fallback = defaults if name == DEFAULT_TENANT else {}
+        token = entry.get('token') or (os.environ.get(entry['token_env']) if entry.get('token_env') else None)
+        token = token or fallback.get('token')
+        if not token:
+            raise TenantConfigError(f"{where}: немає токена (token або token_env)")
+
+        data_dir = tenant_data_dir(base_dir, name)
+        result.append(Tenant(
+            name,
+            token,
+            sheet_url=entry.get('sheet_url') or fallback.get('sheet_url'),
+            admin_id=str(entry['admin_id']) if entry.get('admin_id') else fallback.get('admin_id'),
+            catalog_path=entry.get('catalog') or fallback.get('catalog') or os.path.join(data_dir, 'catalog.json'),
+            make_webhook_url=entry.get('make_webhook_url') or fallback.get('make_webhook_url'),
+            data_dir=data_dir,
+        ))
+    return result
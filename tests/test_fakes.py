@@ -0,0 +1,19 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fakes import FakeBot
+
+def test_fake_bot_send_message():
+    async def run():
+        bot = FakeBot()
+        async with bot:
+            message = await bot.send_message(42, "Привіт")
+        return bot, message
+
+    bot, message = asyncio.run(run())
+    assert message.text == "Привіт"
+    assert message.chat.id == 42
+    assert bot.calls_to('sendMessage') == [{'chat_id': 42, 'text': "Привіт"}]
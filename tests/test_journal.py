@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import Journal
+
+def run(coro):
+    return asyncio.run(coro)
+
+def new_journal(directory, **kwargs):
+    kwargs.setdefault('consumers', ('sheets', 'archive'))
+    kwargs.setdefault('commit_interval', 0)
+    kwargs.setdefault('durable', False)
+    return Journal(str(directory), **kwargs)
+
+def test_group_commit_writes_concurrent_appends_in_one_batch(tmp_path):
+    async def scenario():
+        journal = new_journal(tmp_path, commit_interval=0.01)
+        await journal.start()
+        seqs = await asyncio.gather(*(journal.append('event', [i]) for i in range(50)))
+        records = journal.read('sheets', limit=100)
+        await journal.close()
+        return journal, seqs, records
+
+    journal, seqs, records = run(scenario())
+    assert sorted(seqs) == list(range(1, 51))
+    assert journal.stats['appended'] == 50
+    assert journal.stats['batches'] < 50
+    assert [record['seq'] for record, _ in records] == list(range(1, 51))
+
+def test_cursors_are_per_consumer_and_survive_restart(tmp_path):
+    async def first_run():
+        journal = new_journal(tmp_path)
+        await journal.start()
+        for i in range(3):
+            await journal.append('lead', [i])
+        records = journal.read('sheets')
+        journal.commit('sheets', records[1][1])
+        await journal.close()
+
+    async def second_run():
+        journal = new_journal(tmp_path)
+        await journal.start()
+        sheets = journal.read('sheets')
+        archive = journal.read('archive')
+        seq = await journal.append('lead', [3])
+        await journal.close()
+        return sheets, archive, seq
+
+    run(first_run())
+    sheets, archive, seq = run(second_run())
+    assert [record['data'] for record, _ in sheets] == [[2]]
+    assert [record['data'] for record, _ in archive] == [[0], [1], [2]]
+    assert seq == 4
+
+def test_fully_consumed_segments_are_removed(tmp_path):
+    async def scenario():
+        journal = new_journal(tmp_path, consumers=('sheets',), segment_bytes=100)
+        await journal.start()
+        for i in range(5):
+            await journal.append('event', ['x' * 40, i])
+        before = journal._segments()
+        records = journal.read('sheets')
+        journal.commit('sheets', records[-1][1])
+        after = journal._segments()
+        await journal.close()
+        return before, after, records[-1][1][0]
+
+    before, after, cursor_segment = run(scenario())
+    assert len(before) > 2
+    # Курсор стоїть у кінці свого сегмента: він лишається, старіші видалено
+    assert after == [segment for segment in before if segment >= cursor_segment]
+    assert after[0] > before[0]
+
+def test_partial_tail_is_repaired_on_start(tmp_path):
+    async def first_run():
+        journal = new_journal(tmp_path)
+        await journal.start()
+        await journal.append('lead', ['ok'])
+        path = journal._segment_path(journal._segment)
+        await journal.close()
+        with open(path, 'ab') as f:
+            f.write(b'{"seq": 2, "kind": "lead", "da')  # процес упав посеред запису
+
+    async def second_run():
+        journal = new_journal(tmp_path)
+        await journal.start()
+        seq = await journal.append('lead', ['next'])
+        records = journal.read('sheets')
+        await journal.close()
+        return seq, records
+
+    run(first_run())
+    seq, records = run(second_run())
+    assert seq == 2
+    assert [record['data'] for record, _ in records] == [['ok'], ['next']]
+
+class FailingFile:
+    """Файл сегмента, на якому write падає посеред пачки (напр. ENOSPC)"""
+
+    def __init__(self, f):
+        self._f = f
+
+    def tell(self):
+        return self._f.tell()
+
+    def write(self, payload):
+        self._f.write(payload[:len(payload) // 2])
+        self._f.flush()
+        raise OSError(28, 'No space left on device')
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+def test_failed_write_is_rolled_back(tmp_path):
+    async def scenario():
+        journal = new_journal(tmp_path)
+        await journal.start()
+        await journal.append('lead', ['before'])
+        journal._file = FailingFile(journal._file)
+        try:
+            await journal.append('lead', ['lost'])
+            failed = False
+        except OSError:
+            failed = True
+        await journal.append('lead', ['after'])
+        records = journal.read('sheets')
+        await journal.close()
+        return journal, failed, records
+
+    journal, failed, records = run(scenario())
+    assert failed
+    assert journal.stats['write_failures'] == 1
+    assert [record['data'] for record, _ in records] == [['before'], ['after']]
+
+def test_corrupt_line_is_quarantined_not_raised(tmp_path):
+    async def scenario():
+        journal = new_journal(tmp_path)
+        await journal.start()
+        await journal.append('lead', [1])
+        with open(journal._segment_path(journal._segment), 'ab') as f:
+            f.write(b'{not json\n')
+        await journal.append('lead', [2])
+        first = journal.read('sheets')
+        second = journal.read('archive')
+        await journal.close()
+        return journal, first, second
+
+    journal, first, second = run(scenario())
+    assert [record['data'] for record, _ in first] == [[1], [2]]
+    assert [record['data'] for record, _ in second] == [[1], [2]]
+    assert journal.stats['quarantined'] == 1
+    with open(tmp_path / 'journal.quarantine', encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry['line'] for entry in entries] == ['{not json\n']
+
+def test_close_commits_everything_pending(tmp_path):
+    async def scenario():
+        journal = new_journal(tmp_path, max_batch=2, commit_interval=10)
+        await journal.start()
+        appends = [asyncio.ensure_future(journal.append('event', [i])) for i in range(5)]
+        await asyncio.sleep(0)
+        await journal.close()
+        seqs = await asyncio.gather(*appends)
+
+        reopened = new_journal(tmp_path)
+        await reopened.start()
+        records = reopened.read('sheets')
+        await reopened.close()
+        return seqs, records
+
+    seqs, records = run(scenario())
+    assert seqs == [1, 2, 3, 4, 5]
+    assert [record['data'] for record, _ in records] == [[i] for i in range(5)]
+
+def test_dead_letters_are_written_and_counted_after_restart(tmp_path):
+    async def first_run():
+        journal = new_journal(tmp_path)
+        await journal.start()
+        await journal.append('lead', ['bad'])
+        record, position = journal.read('sheets')[0]
+        journal.dead_letter('sheets', record, 'SheetsApiError: 400', attempts=1)
+        journal.commit('sheets', position)
+        await journal.close()
+        return record
+
+    async def second_run():
+        journal = new_journal(tmp_path)
+        await journal.start()
+        snapshot = journal.snapshot()
+        await journal.close()
+        return snapshot
+
+    record = run(first_run())
+    snapshot = run(second_run())
+    assert snapshot['dead_letters'] == {'sheets': 1, 'archive': 0}
+    with open(tmp_path / 'deadletter.sheets.jsonl', encoding='utf-8') as f:
+        entry = json.loads(f.readline())
+    assert entry['record'] == record
+    assert entry['error'] == 'SheetsApiError: 400'
+
+def test_idempotency_key_is_stable_across_restarts(tmp_path):
+    async def key_of_first():
+        journal = new_journal(tmp_path)
+        await journal.start()
+        if not journal.read('sheets'):
+            await journal.append('lead', ['x'])
+        record, _ = journal.read('sheets')[0]
+        await journal.close()
+        return journal.key(record)
+
+    first = run(key_of_first())
+    assert first == run(key_of_first())
+    assert first.endswith(':1')
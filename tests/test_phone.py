@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from phone import PhoneIndex, extract_phone, normalize_phone
+
+@pytest.mark.parametrize('raw', [
+    '+380671234567',
+    '380671234567',
+    '80671234567',
+    '0671234567',
+    '671234567',
+    '+38 (067) 123-45-67',
+    '00380671234567',
+    ' 067 123 45 67 ',
+])
+def test_ukrainian_formats_normalize_to_e164(raw):
+    assert normalize_phone(raw) == '+380671234567'
+
+@pytest.mark.parametrize('raw, expected', [
+    ('+48 601 234 567', '+48601234567'),
+    ('4915112345678', '+4915112345678'),  # Telegram віддає контакт без '+'
+    ('+1 (202) 555-0143', '+12025550143'),
+])
+def test_foreign_numbers_keep_country_code(raw, expected):
+    assert normalize_phone(raw) == expected
+
+@pytest.mark.parametrize('raw', [None, '', '12345', '12-05-2024', '1234567890123456', 'телефон'])
+def test_not_a_phone(raw):
+    assert normalize_phone(raw) is None
+
+@pytest.mark.parametrize('text, expected', [
+    ('Мій номер 067 123 45 67, дзвоніть', '+380671234567'),
+    ('12-05-2024, мій номер 0671234567', '+380671234567'),
+    ('сума 15000, тел. +380501112233', '+380501112233'),
+    ('дата 12-05-2024', None),
+    ('просто питання', None),
+    (None, None),
+])
+def test_extract_phone_from_free_text(text, expected):
+    assert extract_phone(text) == expected
+
+def test_index_keeps_first_owner_of_a_number():
+    index = PhoneIndex()
+    loaded = index.bulk_load([(1, '0671234567'), (2, '+38 067 123 45 67'), (3, 'n/a'), (4, '0501112233')])
+    assert loaded == 2
+    assert len(index) == 2
+    assert index.lookup('+380671234567') == '1'
+
+    index.add('+380671234567', 5)
+    index.add('+380931234567', 6)
+    assert index.lookup('+380671234567') == '1'
+    assert index.lookup('+380931234567') == '6'
+    assert index.lookup('+380000000000') is None
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot
+import catalog
+
+def press(user_data, *buttons):
+    return [bot.quiz_apply(user_data, data) for data in buttons]
+
+def test_full_quiz_packs_every_answer():
+    user_data = {}
+    assert press(user_data, bot.CB_START_QUIZ, 'q1:yes', 'q1c:conflict', 'q2:no',
+                 'q3:yes', 'q3c:peace', 'q4:abroad', 'q5:high') == [True] * 8
+    assert bot.quiz_state(user_data) == bot.QS_PHONE
+    assert bot.quiz_answers(user_data) == {
+        'has_children': 'yes',
+        'conflict_children': 'yes',
+        'spouse_consent': 'no',
+        'property_dispute': 'yes',
+        'conflict_property': 'no',
+        'spouse_location': 'abroad',
+        'urgency': 'high',
+    }
+
+def test_no_branch_fills_implied_answers():
+    user_data = {}
+    press(user_data, bot.CB_START_QUIZ, 'q1:no', 'q2:yes', 'q3:no')
+    assert bot.quiz_state(user_data) == bot.QS_Q4
+    answers = bot.quiz_answers(user_data)
+    assert answers['conflict_children'] == 'no'
+    assert answers['conflict_property'] == 'no'
+
+def test_double_tap_and_old_buttons_are_rejected():
+    user_data = {}
+    press(user_data, bot.CB_START_QUIZ, 'q1:no')
+    packed = user_data['quiz']
+    assert press(user_data, 'q1:no', 'q1:yes', 'q3:yes') == [False, False, False]
+    assert user_data['quiz'] == packed
+
+def test_missing_state_accepts_only_start():
+    user_data = {}
+    assert press(user_data, 'q2:yes', 'q5:low') == [False, False]
+    assert bot.quiz_state(user_data) is None
+    assert press(user_data, bot.CB_START_QUIZ) == [True]
+    assert bot.quiz_state(user_data) == bot.QS_Q1
+
+def test_reset_clears_answers():
+    user_data = {}
+    press(user_data, bot.CB_START_QUIZ, 'q1:yes', 'q1c:peace')
+    bot.quiz_reset(user_data)
+    assert bot.quiz_state(user_data) == bot.QS_IDLE
+    assert bot.quiz_answers(user_data) == {}
+
+class StubJobQueue:
+    def __init__(self):
+        self.scheduled = []
+
+    def get_jobs_by_name(self, name):
+        return []
+
+    def run_once(self, callback, when, **kwargs):
+        self.scheduled.append((callback.__name__, kwargs.get('name')))
+
+class StubQuery:
+    def __init__(self, data):
+        self.data = data
+        self.message = SimpleNamespace(chat_id=1)
+        self.answered = 0
+        self.edits = []
+
+    async def answer(self, *args, **kwargs):
+        self.answered += 1
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append((text, kwargs.get('reply_markup')))
+
+def dispatch(user_data, data):
+    query = StubQuery(data)
+    update = SimpleNamespace(callback_query=query, effective_user=SimpleNamespace(id=1, username='u'))
+    context = SimpleNamespace(user_data=user_data, job_queue=StubJobQueue())
+    compiled = catalog.load_catalog(None, bot.CATALOG_DEFAULTS)
+
+    async def scenario():
+        token = bot.CURRENT_TENANT.set(bot.TENANTS[0])
+        previous = bot.TENANTS[0].catalog
+        bot.TENANTS[0].catalog = compiled
+        try:
+            await bot.dispatch_callback(update, context)
+        finally:
+            bot.TENANTS[0].catalog = previous
+            bot.CURRENT_TENANT.reset(token)
+
+    asyncio.run(scenario())
+    return query, compiled, context.job_queue.scheduled
+
+def test_stale_button_without_state_restarts_the_quiz():
+    user_data = {}
+    query, compiled, scheduled = dispatch(user_data, 'q3:yes')
+    assert bot.quiz_state(user_data) == bot.QS_Q1
+    assert bot.quiz_answers(user_data) == {}
+    assert [text for text, _ in query.edits] == [compiled.texts['TEXT_Q1']]
+    assert [callback for callback, _ in scheduled] == ['quiz_reminder_callback']
+
+def test_stale_button_mid_quiz_is_ignored():
+    user_data = {}
+    press(user_data, bot.CB_START_QUIZ, 'q1:no')
+    packed = user_data['quiz']
+    query, _, scheduled = dispatch(user_data, 'q1:yes')
+    assert user_data['quiz'] == packed
+    assert query.answered == 1
+    assert query.edits == []
+    assert scheduled == []
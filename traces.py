@@ -0,0 +1,227 @@
+"""
+Траси апдейтів: запис живого трафіку і відтворення його на фейкових бекендах.
+
+Запис (TRACE_PATH=...): кожен вхідний Update знеособлюється і дописується
+рядком JSON у gzip-файл разом зі зміщенням від початку запису:
+
+    {"trace": 1, "started": "2026-10-19T12:00"}      <- заголовок кожного запуску
+    {"t": 12.345, "u": {...Update.to_dict()...}}
+
+Знеособлення:
+- Telegram ID користувачів і чатів -> псевдоніми (ключований хеш із
+  випадковим ключем запису, тож траси різних запусків не зв'язати між собою)
+- імена, username, назви чатів, файли - прибираються або замінюються
+- телефони (контакт і введені текстом) - останні 7 цифр замінюються, але
+  формат і префікс лишаються: номер так само нормалізується, а однаковий
+  номер дає однакову маску (повторні ліди видно і в трасі)
+- вільний текст - букви -> 'x', цифри -> '0' (довжина та форма зберігаються)
+- команди та callback data лишаються як є - це структура сценарію
+
+Відтворення (python bot.py replay) - play(): апдейти подаються в тому ж
+темпі, що й у трасі, або прискорено (speed=10 - в 10 разів швидше).
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+from phone import PHONE_CANDIDATE_RE
+
+TRACE_VERSION = 1
+
+LETTER_RE = re.compile(r'[^\W\d_]')
+DIGIT_RE = re.compile(r'\d')
+
+# Об'єкти, у яких 'id' - Telegram ID людини або чату
+PERSON_KEYS = {'from', 'chat', 'user', 'sender_chat', 'forward_from', 'forward_from_chat', 'sender_user'}
+# Поля, які не потрібні для відтворення і можуть містити персональні дані
+DROP_KEYS = {'last_name', 'username', 'title', 'bio', 'vcard', 'file_id', 'file_unique_id', 'thumbnail'}
+TEXT_KEYS = {'text', 'caption'}
+PHONE_MASKED_DIGITS = 7
+
+class TraceRecorder:
+    """Дописує знеособлені апдейти в gzip JSONL. Блокуючий, але дешевий запис у буфер gzip"""
+
+    def __init__(self, path, sample=1.0, key=None):
+        self.path = path
+        self.sample = sample
+        self._key = key or os.urandom(16)
+        self._file = None
+        self._started = None
+        self.stats = {'recorded': 0, 'skipped': 0, 'errors': 0}
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 'a' - кожен запуск дописує свій gzip-член зі своїм заголовком
+        self._file = gzip.open(self.path, 'at', encoding='utf-8')
+        self._started = time.monotonic()
+        self._write({'trace': TRACE_VERSION, 'started': datetime.now().strftime('%Y-%m-%dT%H:%M')})
+        return self
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+
+    def _digest(self, value, size):
+        return hashlib.blake2b(str(value).encode(), digest_size=size, key=self._key).digest()
+
+    # ---------- знеособлення ----------
+
+    def pseudonym(self, telegram_id):
+        """Стабільний у межах запису псевдонім ID (знак зберігається: групи < 0)"""
+        value = int.from_bytes(self._digest(telegram_id, 5), 'big') % 10**10 + 1
+        return -value if telegram_id < 0 else value
+
+    def sampled(self, user_id):
+        """Частка користувачів у трасі - цілими сесіями, а не окремими апдейтами"""
+        if self.sample >= 1 or user_id is None:
+            return True
+        return int.from_bytes(self._digest(user_id, 4), 'big') < self.sample * 2**32
+
+    def mask_phone(self, raw):
+        digits = DIGIT_RE.findall(raw)
+        keep = max(0, len(digits) - PHONE_MASKED_DIGITS)
+        fake = str(int.from_bytes(self._digest(''.join(digits[-PHONE_MASKED_DIGITS:]), 8), 'big')).zfill(PHONE_MASKED_DIGITS)
+        replacement = iter(digits[:keep] + list(fake[:len(digits) - keep]))
+        return DIGIT_RE.sub(lambda _: next(replacement), raw)
+
+    def mask_text(self, text):
+        if text.startswith('/'):
+            command, _, args = text.partition(' ')
+            return command + (' ' + self._mask_free_text(args) if args else '')
+        return self._mask_free_text(text)
+
+    def _mask_free_text(self, text):
+        parts = []
+        position = 0
+        for match in PHONE_CANDIDATE_RE.finditer(text):
+            if sum(ch.isdigit() for ch in match.group()) < 9:
+                continue
+            parts.append(self._mask_plain(text[position:match.start()]))
+            parts.append(self.mask_phone(match.group()))
+            position = match.end()
+        parts.append(self._mask_plain(text[position:]))
+        return ''.join(parts)
+
+    @staticmethod
+    def _mask_plain(text):
+        return DIGIT_RE.sub('0', LETTER_RE.sub('x', text))
+
+    def anonymize(self, value, key=None):
+        if isinstance(value, list):
+            return [self.anonymize(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        result = {}
+        for name, item in value.items():
+            if name in DROP_KEYS:
+                continue
+            if name == 'id' and key in PERSON_KEYS and isinstance(item, int):
+                result[name] = self.pseudonym(item)
+            elif name == 'user_id' and isinstance(item, int):
+                result[name] = self.pseudonym(item)
+            elif name == 'first_name':
+                result[name] = 'User'
+            elif name == 'phone_number' and isinstance(item, str):
+                result[name] = self.mask_phone(item)
+            elif name in TEXT_KEYS and isinstance(item, str):
+                result[name] = self.mask_text(item)
+            elif name == 'chat_instance':
+                result[name] = self._digest(item, 8).hex()
+            elif name == 'date':
+                result[name] = 0  # реальний час не зберігаємо, є зміщення 't'
+            else:
+                result[name] = self.anonymize(item, name)
+        return result
+
+    # ---------- запис ----------
+
+    def record(self, update_dict, user_id):
+        if self._file is None:
+            return
+        if not self.sampled(user_id):
+            self.stats['skipped'] += 1
+            return
+        try:
+            self._write({'t': round(time.monotonic() - self._started, 3), 'u': self.anonymize(update_dict)})
+            self.stats['recorded'] += 1
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def snapshot(self):
+        return {'path': self.path, 'sample': self.sample, **self.stats}
+
+# =====================================================
+# ЧИТАННЯ ТА ВІДТВОРЕННЯ
+# =====================================================
+
+def read_trace(path, limit=None):
+    """(зміщення, сирий апдейт) по порядку; запуски, дописані в один файл, йдуть один за одним"""
+    base = 0.0
+    last = 0.0
+    count = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'trace' in record:
+                if record['trace'] > TRACE_VERSION:
+                    raise ValueError(f"{path}: траса версії {record['trace']}, підтримується до {TRACE_VERSION}")
+                base = last
+                continue
+            last = base + record['t']
+            yield last, record['u']
+            count += 1
+            if limit is not None and count >= limit:
+                return
+
+def restamp(value, now):
+    """Проставляє 'date' (у трасі - 0) поточним часом, щоб Update.de_json бачив свіжі повідомлення"""
+    if isinstance(value, list):
+        for item in value:
+            restamp(item, now)
+    elif isinstance(value, dict):
+        for name, item in value.items():
+            if name == 'date':
+                value[name] = now
+            else:
+                restamp(item, now)
+    return value
+
+async def play(records, feed, speed=1.0):
+    """
+    Подає апдейти в темпі траси: speed=1 - як у житті, 10 - вдесятеро швидше,
+    0 - без пауз. feed(сирий апдейт) - корутина. Повертає статистику подачі.
+    """
+    stats = {'updates': 0, 'trace_seconds': 0.0, 'lag_max': 0.0, 'lag_total': 0.0}
+    started = time.monotonic()
+    for offset, update in records:
+        if speed > 0:
+            delay = offset / speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lag = time.monotonic() - started - offset / speed
+            stats['lag_max'] = max(stats['lag_max'], lag)
+            stats['lag_total'] += max(lag, 0.0)
+        await feed(restamp(update, int(time.time())))
+        stats['updates'] += 1
+        stats['trace_seconds'] = offset
+    stats['wall_seconds'] = time.monotonic() - started
+    return stats